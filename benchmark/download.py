@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Memory and throughput benchmark of
+enclosure downloads.
+
+Compares the previous download path (whole body
+buffered in memory, written in 4 KiB chunks) with
+the streaming HttpLoader. Every variant runs in
+its own process, so peak RSS is not shared.
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from resource import RUSAGE_SELF, getrusage
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath('podcast_catcher')))
+
+from fake_server import FakeServer  # noqa: E402
+
+VARIANTS = ['legacy', 'streaming']
+
+MIB = 1024 * 1024
+
+
+def peak_rss_mib() -> float:
+  """
+  Peak resident set size of this process.
+  """
+  return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(variant: str, url: str, target: str, buffer_size: int) -> dict:
+  """
+  Download url to target with the given
+  variant (runs in the child process).
+  """
+  import requests
+  from http_loader import HttpLoader
+
+  loader = HttpLoader(buffer_size=buffer_size)
+  rss_before = peak_rss_mib()
+  start = perf_counter()
+  if variant == 'legacy':
+    request = requests.get(url)
+    with open(target, 'wb') as fd:
+      for chunk in request.iter_content(chunk_size=4096):
+        fd.write(chunk)
+  else:
+    loader.download(source=url, target=target)
+  duration = perf_counter() - start
+  size = Path(target).stat().st_size
+  return {
+    'variant': variant,
+    'size_mib': size / MIB,
+    'seconds': duration,
+    'mib_per_second': size / MIB / duration,
+    'peak_rss_mib': peak_rss_mib(),
+    'peak_rss_growth_mib': peak_rss_mib() - rss_before,
+  }
+
+
+def main() -> None:
+  """
+  Run all variants against a local server
+  and print results as JSON.
+  """
+  parser = ArgumentParser(description=__doc__)
+  parser.add_argument('--size-mib', type=int, default=256)
+  parser.add_argument('--buffer-size', type=int, default=MIB)
+  parser.add_argument('--child', nargs=3, metavar=('VARIANT', 'URL', 'TARGET'))
+  args = parser.parse_args()
+
+  if args.child is not None:
+    variant, url, target = args.child
+    print(json.dumps(run_variant(variant, url, target, args.buffer_size)))
+    return
+
+  results = []
+  with FakeServer() as server, TemporaryDirectory() as temp_dir:
+    url = server.url(f'/enclosure?size={args.size_mib * MIB}')
+    for variant in VARIANTS:
+      target = str(Path(temp_dir).joinpath(f'{variant}.mp3'))
+      output = subprocess.run(
+        [
+          sys.executable,
+          __file__,
+          '--buffer-size',
+          str(args.buffer_size),
+          '--child',
+          variant,
+          url,
+          target,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+      ).stdout
+      results.append(json.loads(output))
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
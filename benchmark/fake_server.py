@@ -0,0 +1,275 @@
+"""
+Local HTTP server serving synthetic
+feeds and enclosures for benchmarks.
+"""
+
+from datetime import UTC, datetime
+from email.utils import formatdate
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from struct import pack
+from threading import Thread
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class FakeServer:
+  """
+  Serve synthetic files on localhost in a
+  background thread.
+
+  GET /enclosure[.ext]?size=<bytes> returns <size>
+  bytes of data (Range requests supported).
+  With format=mp3 or format=m4a, the data is a
+  (silent) MP3 or M4A file mutagen can tag.
+
+  GET /feed?items=<n>&format=<rss|atom> returns a
+  feed with n items, newest first. Their enclosures
+  use enclosure_size and enclosure_format, show
+  notes are SHOW_NOTES repeated notes times.
+  """
+
+  CHUNK = b'\xa5' * (64 * 1024)
+
+  # MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417 bytes per frame
+  MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+
+  # First episode is published at this timestamp, one per day
+  FEED_START = 1_000_000_000
+
+  SHOW_NOTES = 'Lorem ipsum dolor sit amet. ' * 20
+
+  CONTENT_TYPES = {
+    'raw': 'application/octet-stream',
+    'mp3': 'audio/mpeg',
+    'm4a': 'audio/mp4',
+  }
+
+  class Handler(BaseHTTPRequestHandler):
+    """
+    Request handler of the fake server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args) -> None:
+      """
+      Keep benchmark output clean.
+      """
+      pass
+
+    def do_GET(self) -> None:  # noqa: N802
+      """
+      Dispatch GET requests.
+      """
+      url = urlparse(self.path)
+      query = {key: values[0] for key, values in parse_qs(url.query).items()}
+      if url.path.startswith('/enclosure'):
+        self.send_enclosure(
+          int(query.get('size', '1048576')), query.get('format', 'raw')
+        )
+      elif url.path == '/feed':
+        self.send_feed(query)
+      else:
+        self.send_error(404)
+
+    def send_feed(self, query: dict[str, str]) -> None:
+      """
+      Send a synthetic RSS or Atom feed.
+      """
+      feed_format = query.get('format', 'rss')
+      body = FakeServer.feed(
+        base_url=f'http://{self.headers.get("Host")}',
+        items=int(query.get('items', '100')),
+        feed_format=feed_format,
+        enclosure_size=int(query.get('enclosure_size', '1048576')),
+        enclosure_format=query.get('enclosure_format', 'mp3'),
+        notes_repeat=int(query.get('notes', '1')),
+      )
+      self.send_response(200)
+      self.send_header('Content-Type', f'application/{feed_format}+xml; charset=utf-8')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def send_enclosure(self, size: int, enclosure_format: str = 'raw') -> None:
+      """
+      Send size bytes, honoring simple
+      'bytes=<start>-' ranges.
+      """
+      start = 0
+      range_header = self.headers.get('Range')
+      if range_header is not None and range_header.startswith('bytes='):
+        start = int(range_header[6:].split('-')[0])
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+      else:
+        self.send_response(200)
+      self.send_header('Content-Type', FakeServer.CONTENT_TYPES[enclosure_format])
+      self.send_header('Content-Length', str(size - start))
+      self.send_header('ETag', f'"{enclosure_format}-{size}"')
+      self.end_headers()
+      header, pattern = FakeServer.enclosure_layout(size, enclosure_format)
+      doubled = pattern * 2
+      position = start
+      while position < size:
+        if position < len(header):
+          chunk = header[position : min(size, len(header))]
+        else:
+          # Pattern is repeated, starting at
+          # its beginning right after header
+          offset = (position - len(header)) % len(pattern)
+          chunk = doubled[offset : offset + min(len(pattern), size - position)]
+        self.wfile.write(chunk)
+        position += len(chunk)
+
+  @staticmethod
+  @lru_cache(maxsize=16)
+  def enclosure_layout(size: int, enclosure_format: str) -> tuple[bytes, bytes]:
+    """
+    Header and repeated payload pattern
+    of a synthetic enclosure.
+    """
+    if enclosure_format == 'mp3':
+      # About 64 KiB of whole frames
+      return b'', FakeServer.MP3_FRAME * 157
+    if enclosure_format == 'm4a':
+      return FakeServer.m4a_header(size), FakeServer.CHUNK
+    return b'', FakeServer.CHUNK
+
+  @staticmethod
+  def m4a_header(size: int) -> bytes:
+    """
+    Minimal MP4 structure (ftyp, moov with a sound
+    track) followed by the header of an mdat atom
+    holding the rest of the size bytes.
+    """
+
+    def atom(name: bytes, data: bytes) -> bytes:
+      return pack('>I', 8 + len(data)) + name + data
+
+    # version/flags, pre_defined, handler type, reserved, name
+    hdlr = atom(b'hdlr', b'\x00' * 8 + b'soun' + b'\x00' * 12 + b'sound\x00')
+    # version/flags, creation/modification time, time scale, duration, language
+    mdhd = atom(b'mdhd', b'\x00' * 12 + pack('>II', 44100, 44100 * 60) + b'\x00' * 4)
+    moov = atom(b'moov', atom(b'trak', atom(b'mdia', mdhd + hdlr)))
+    ftyp = atom(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom')
+    header = ftyp + moov
+    return header + pack('>I', size - len(header)) + b'mdat'
+
+  @staticmethod
+  @lru_cache(maxsize=16)
+  def feed(
+    base_url: str,
+    items: int,
+    feed_format: str,
+    enclosure_size: int,
+    enclosure_format: str,
+    notes_repeat: int = 1,
+  ) -> bytes:
+    """
+    Synthetic feed with items from newest
+    to oldest, encoded as UTF-8. Show notes
+    are SHOW_NOTES repeated notes_repeat times.
+    """
+    content_type = FakeServer.CONTENT_TYPES[enclosure_format]
+    show_notes = FakeServer.SHOW_NOTES * notes_repeat
+    entries = []
+    for index in range(items, 0, -1):
+      published = FakeServer.FEED_START + index * 86400
+      query = urlencode(
+        {
+          'size': enclosure_size,
+          'format': enclosure_format,
+          'id': f'{feed_format}{index}',
+        }
+      ).replace('&', '&amp;')
+      enclosure = f'{base_url}/enclosure.{enclosure_format}?{query}'
+      if feed_format == 'atom':
+        entries.append(
+          '<entry>'
+          f'<title>Episode {index}</title>'
+          f'<id>urn:episode:{feed_format}:{index}</id>'
+          f'<link rel="alternate" href="{base_url}/episode/{index}"/>'
+          f'<link rel="enclosure" type="{content_type}"'
+          f' length="{enclosure_size}" href="{enclosure}"/>'
+          f'<author><name>Host {index % 7}</name></author>'
+          f'<updated>{FakeServer.iso_date(published)}</updated>'
+          f'<published>{FakeServer.iso_date(published)}</published>'
+          f'<summary>Episode {index}. {show_notes}</summary>'
+          '<category term="benchmark"/>'
+          '</entry>'
+        )
+      else:
+        entries.append(
+          '<item>'
+          f'<title>Episode {index}</title>'
+          f'<link>{base_url}/episode/{index}</link>'
+          f'<guid>urn:episode:{feed_format}:{index}</guid>'
+          f'<author>Host {index % 7}</author>'
+          f'<pubDate>{formatdate(published, usegmt=True)}</pubDate>'
+          f'<enclosure url="{enclosure}"'
+          f' length="{enclosure_size}" type="{content_type}"/>'
+          f'<description>Episode {index}. {show_notes}</description>'
+          '<category>benchmark</category>'
+          '</item>'
+        )
+    updated = FakeServer.FEED_START + items * 86400
+    if feed_format == 'atom':
+      text = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f'<title>Benchmark feed ({items} items)</title>'
+        '<subtitle>Synthetic feed</subtitle>'
+        f'<link rel="alternate" href="{base_url}/"/>'
+        f'<updated>{FakeServer.iso_date(updated)}</updated>'
+        f'{"".join(entries)}'
+        '</feed>'
+      )
+    else:
+      text = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0"><channel>'
+        f'<title>Benchmark feed ({items} items)</title>'
+        '<description>Synthetic feed</description>'
+        f'<link>{base_url}/</link>'
+        f'<lastBuildDate>{formatdate(updated, usegmt=True)}</lastBuildDate>'
+        f'{"".join(entries)}'
+        '</channel></rss>'
+      )
+    return text.encode()
+
+  @staticmethod
+  def iso_date(timestamp: int) -> str:
+    """
+    ISO 8601 date (Atom) of a timestamp.
+    """
+    return datetime.fromtimestamp(timestamp, tz=UTC).isoformat()
+
+  def __init__(self, handler: type[BaseHTTPRequestHandler] = Handler):
+    """
+    CTOR for FakeServer, binds to a free port.
+    """
+    self.__server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    self.__server.daemon_threads = True
+    self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+
+  def __enter__(self) -> 'FakeServer':
+    """
+    Start serving.
+    """
+    self.__thread.start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    """
+    Stop serving.
+    """
+    self.__server.shutdown()
+    self.__server.server_close()
+
+  def url(self, path: str) -> str:
+    """
+    Absolute URL for path on this server.
+    """
+    host, port = self.__server.server_address[:2]
+    return f'http://{host}:{port}{path}'
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of a parsed feed with a
+large back catalogue.
+
+Parses a synthetic RSS feed (show notes of a
+few KB per item) and reports the memory the
+Feed keeps alive, compared with the previous
+Entry representation (attributes in a per
+instance dict, summaries as plain strings).
+Also reports parse time and the time to decode
+all summaries.
+"""
+
+import gc
+import json
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath('podcast_catcher')))
+
+from fake_server import FakeServer  # noqa: E402
+from feed import Entry, Feed  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+class LegacyEntry:
+  """
+  Entry as stored before: all fields
+  in the instance dict.
+  """
+
+  def __init__(
+    self,
+    author: str,
+    enclosure: str,
+    link: str,
+    published: datetime,
+    summary: str,
+    title: str,
+    tags: list[str],
+  ):
+    """
+    CTOR for LegacyEntry.
+    """
+    self.__author = author
+    self.__enclosure = enclosure
+    self.__link = link
+    self.__published = published
+    self.__summary = summary
+    self.__title = title
+    self.__tags = tags
+
+
+def copy(text: str) -> str:
+  """
+  Copy of a string, so it is
+  accounted to the new owner.
+  """
+  return text.encode().decode()
+
+
+def legacy_entries(entries: list[Entry]) -> list[LegacyEntry]:
+  """
+  Previous representation of entries.
+  """
+  return [
+    LegacyEntry(
+      author=copy(entry.author()),
+      enclosure=copy(entry.enclosure()),
+      link=copy(entry.link()),
+      published=entry.published().replace(),
+      summary=entry.summary(),
+      title=copy(entry.title()),
+      tags=[copy(tag) for tag in entry.tags()],
+    )
+    for entry in entries
+  ]
+
+
+def traced(build) -> tuple[object, int, int]:
+  """
+  Build an object and return it with the
+  memory it keeps alive and the peak
+  memory while building it (bytes).
+  """
+  gc.collect()
+  tracemalloc.start()
+  try:
+    result = build()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return result, retained, peak
+
+
+def main() -> None:
+  """
+  Run benchmark and print results as JSON.
+  """
+  parser = ArgumentParser(description=__doc__)
+  parser.add_argument('--items', type=int, default=5000)
+  parser.add_argument(
+    '--notes', type=int, default=8, help='Show notes repetitions per item'
+  )
+  args = parser.parse_args()
+
+  feed_text = FakeServer.feed(
+    'http://127.0.0.1', args.items, 'rss', 1024 * 1024, 'mp3', args.notes
+  ).decode()
+
+  start = perf_counter()
+  Feed(feed_text=feed_text)
+  parse_seconds = perf_counter() - start
+
+  feed, retained, peak = traced(lambda: Feed(feed_text=feed_text))
+  entries = feed.entries()
+  legacy, legacy_retained, _ = traced(lambda: legacy_entries(entries))
+
+  start = perf_counter()
+  summary_chars = sum(len(entry.summary()) for entry in entries)
+  decode_seconds = perf_counter() - start
+
+  print(
+    json.dumps(
+      {
+        'items': len(entries),
+        'feed_text_mib': len(feed_text) / MIB,
+        'summary_mib': summary_chars / MIB,
+        'parse_seconds': parse_seconds,
+        'parse_peak_mib': peak / MIB,
+        'retained_mib': retained / MIB,
+        'bytes_per_entry': retained / len(entries),
+        'legacy_retained_mib': legacy_retained / MIB,
+        'legacy_bytes_per_entry': legacy_retained / len(legacy),
+        'decode_all_summaries_seconds': decode_seconds,
+      },
+      indent=2,
+    )
+  )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of Replacer on a large backfill.
+
+Compares the previous implementation (every
+placeholder computed and replaced for every
+template) with compiled templates.
+"""
+
+import json
+import sys
+from argparse import ArgumentParser
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath('podcast_catcher')))
+
+from feed import Entry, Feed  # noqa: E402
+from replacer import Replacer  # noqa: E402
+
+FEED_TEXT = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel>
+<title>Benchmark feed</title>
+<description>Synthetic feed</description>
+<link>https://example.com/</link>
+</channel></rss>"""
+
+# Filename and tags of the example config
+TEMPLATES = [
+  '%episode_date%-%episode_url_basename%%episode_url_extension%',
+  '%episode_title%',
+  '%episode_author%',
+  '%feed_title%',
+  '%episode_date%',
+  '%episode_link%',
+]
+
+
+def create_entries(count: int) -> list[Entry]:
+  """
+  Synthetic entries with long show notes.
+  """
+  start = datetime(2000, 1, 1, tzinfo=UTC)
+  return [
+    Entry(
+      author=f'Author {index}',
+      enclosure=f'https://cdn.example.com/media/episode-{index}.mp3?source=rss',
+      link=f'https://example.com/episode/{index}',
+      published=start + timedelta(days=index),
+      summary='<p>Show notes</p>' * 200,
+      title=f'Episode {index}: A "long" title/with <illegal> characters?',
+      tags=['podcast', 'benchmark'],
+    )
+    for index in range(count)
+  ]
+
+
+def legacy_replace(name: str, feed: Feed, entry: Entry, template: str) -> str:
+  """
+  Replacer.replace before templates were compiled.
+  """
+  for key, value in Replacer.PLACEHOLDER_ITEMS.items():
+    template = template.replace(key, value(name, feed, entry))
+  return template
+
+
+def run_legacy(feed: Feed, entries: list[Entry]) -> list[str]:
+  """
+  Expand all templates for all entries (legacy).
+  """
+  return [
+    legacy_replace('benchmark', feed, entry, template)
+    for entry in entries
+    for template in TEMPLATES
+  ]
+
+
+def run_compiled(feed: Feed, entries: list[Entry]) -> list[str]:
+  """
+  Expand all templates for all entries (compiled).
+  """
+  replacer = Replacer()
+  replacer.update_name('benchmark')
+  replacer.update_feed(feed)
+  results = []
+  for entry in entries:
+    replacer.update_entry(entry)
+    results.extend(replacer.replace(template) for template in TEMPLATES)
+  return results
+
+
+def main() -> None:
+  """
+  Run both variants and print results as JSON.
+  """
+  parser = ArgumentParser(description=__doc__)
+  parser.add_argument('--entries', type=int, default=5000)
+  args = parser.parse_args()
+
+  feed = Feed(feed_text=FEED_TEXT)
+  entries = create_entries(args.entries)
+  results = {}
+  outputs = {}
+  for variant, func in [('legacy', run_legacy), ('compiled', run_compiled)]:
+    start = perf_counter()
+    outputs[variant] = func(feed, entries)
+    duration = perf_counter() - start
+    results[variant] = {
+      'seconds': duration,
+      'templates_per_second': len(outputs[variant]) / duration,
+    }
+  if outputs['legacy'] != outputs['compiled']:
+    raise RuntimeError('Compiled templates differ from legacy results')
+  results['speedup'] = results['legacy']['seconds'] / results['compiled']['seconds']
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark of the CLI subcommands.
+
+Runs each subcommand in a fresh interpreter with
+'-X importtime' and reports wall time, total import
+time, the slowest top-level imports and which heavy
+third-party modules got loaded.
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+MAIN_CLI = Path(__file__).parent.parent.joinpath('podcast_catcher', 'main_cli.py')
+
+# Subcommands which don't need network access
+COMMANDS = [
+  'version',
+  'list_feeds',
+  'list_feeds --cached',
+]
+
+HEAVY_MODULES = ['asyncio', 'feedparser', 'jsonschema', 'mutagen', 'requests']
+
+CONFIG = {
+  'settings': {
+    'download_dir': 'download',
+    'data_dir': 'data',
+    'filename': '%episode_title%%episode_url_extension%',
+    'tags': [],
+  },
+  'feeds': [
+    {'name': 'Benchmark', 'url': 'http://127.0.0.1:9/feed'},
+  ],
+}
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int]]:
+  """
+  Parse '-X importtime' output into
+  (module, self us, cumulative us), only
+  top-level imports.
+  """
+  imports = []
+  for line in output.splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_us, cumulative_us, module = line.removeprefix('import time:').split('|')
+    # Nested imports are indented below their parent
+    if module.startswith('  '):
+      continue
+    imports.append((module.strip(), int(self_us), int(cumulative_us)))
+  return imports
+
+
+def run_command(command: str, config_file: Path) -> dict:
+  """
+  Run a subcommand once and collect timings.
+  """
+  start = perf_counter()
+  process = subprocess.run(
+    [
+      sys.executable,
+      '-X',
+      'importtime',
+      str(MAIN_CLI),
+      '--config',
+      str(config_file),
+      *command.split(),
+    ],
+    capture_output=True,
+    text=True,
+    cwd=config_file.parent,
+  )
+  wall = perf_counter() - start
+  imports = parse_importtime(process.stderr)
+  loaded = {line.split('|')[-1].strip() for line in process.stderr.splitlines()}
+  return {
+    'wall_ms': wall * 1000,
+    'import_ms': sum(cumulative for _, _, cumulative in imports) / 1000,
+    'imports': imports,
+    'heavy_modules': [module for module in HEAVY_MODULES if module in loaded],
+  }
+
+
+def main() -> None:
+  """
+  Run all subcommands and print results as JSON.
+  """
+  parser = ArgumentParser(description=__doc__)
+  parser.add_argument('--runs', type=int, default=5)
+  parser.add_argument('--top', type=int, default=5)
+  parser.add_argument('--command', action='append', dest='commands')
+  args = parser.parse_args()
+
+  results = {}
+  with TemporaryDirectory() as temp_dir:
+    config_file = Path(temp_dir).joinpath('config.json')
+    config_file.write_text(json.dumps(CONFIG))
+    for command in args.commands or COMMANDS:
+      runs = [run_command(command, config_file) for _ in range(args.runs)]
+      slowest = sorted(runs[-1]['imports'], key=lambda i: i[2], reverse=True)
+      results[command] = {
+        'wall_ms': median(run['wall_ms'] for run in runs),
+        'import_ms': median(run['import_ms'] for run in runs),
+        'slowest_imports_ms': {
+          module: cumulative / 1000 for module, _, cumulative in slowest[: args.top]
+        },
+        'heavy_modules': runs[-1]['heavy_modules'],
+      }
+  print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite against a local fake podcast server.
+
+Scenarios, each run in its own process so peak
+RSS is not shared:
+
+- parse: Feed and StreamFeed on RSS and Atom feeds
+- replace: filename and tag templates of all entries
+- tag: tagging of MP3 and M4A enclosures
+- list_episodes: the subcommand, live and --cached
+- download: the subcommand with per stage latencies
+  (fetch, download, tag, commit)
+
+Results (items/s, MB/s, peak RSS and latency
+percentiles in ms) are printed as JSON.
+"""
+
+import json
+import subprocess
+import sys
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from functools import wraps
+from io import StringIO
+from pathlib import Path
+from resource import RUSAGE_SELF, getrusage
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath('podcast_catcher')))
+
+from fake_server import FakeServer  # noqa: E402
+
+SCENARIOS = ['parse', 'replace', 'tag', 'list_episodes', 'download']
+
+FEED_FORMATS = ['rss', 'atom']
+
+MB = 1000 * 1000
+
+TAGS = {
+  'title': '%episode_title%',
+  'artist': '%episode_author%',
+  'album': '%feed_title%',
+  'date': '%episode_date%',
+}
+
+FILENAME = '%episode_date%-%episode_url_basename%%episode_url_extension%'
+
+
+def peak_rss_mib() -> float:
+  """
+  Peak resident set size of this process.
+  """
+  return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+  """
+  Latency percentiles in ms of
+  samples given in seconds.
+  """
+  values = sorted(sample * 1000 for sample in samples)
+  if len(values) == 0:
+    return {'count': 0}
+  if len(values) == 1:
+    cuts = values * 99
+  else:
+    cuts = quantiles(values, n=100, method='inclusive')
+  return {
+    'count': len(values),
+    'p50': cuts[49],
+    'p90': cuts[89],
+    'p99': cuts[98],
+    'max': values[-1],
+  }
+
+
+def timed(samples: list[float], func: Callable) -> Callable:
+  """
+  Wrap func to record the duration of each call.
+  """
+
+  @wraps(func)
+  def wrapper(*args, **kwargs) -> Any:
+    start = perf_counter()
+    try:
+      return func(*args, **kwargs)
+    finally:
+      samples.append(perf_counter() - start)
+
+  return wrapper
+
+
+def feed_url(server: str, args: Namespace, feed_format: str, items: int) -> str:
+  """
+  URL of a synthetic feed on the fake server.
+  """
+  return (
+    f'{server}/feed?items={items}&format={feed_format}'
+    f'&enclosure_size={args.enclosure_size}'
+    f'&enclosure_format={args.enclosure_format}'
+  )
+
+
+def fetch(url: str) -> str:
+  """
+  Fetch a feed (outside of measurements).
+  """
+  from http_loader import HttpLoader
+
+  loader = HttpLoader()
+  try:
+    return loader.get_feed(url)
+  finally:
+    loader.close()
+
+
+def create_config(temp_dir: str, feeds: list[tuple[str, str]], settings: dict) -> Any:
+  """
+  Write and load a config with the
+  given (name, url) feeds.
+  """
+  from config_json_factory import ConfigJsonFactory
+
+  config_file = Path(temp_dir).joinpath('config.json')
+  config_file.write_text(
+    json.dumps(
+      {
+        'settings': {
+          'download_dir': str(Path(temp_dir).joinpath('download')),
+          'data_dir': str(Path(temp_dir).joinpath('data')),
+          'filename': FILENAME,
+          'tags': [{'replace': key, 'with': value} for key, value in TAGS.items()],
+          **settings,
+        },
+        'feeds': [{'name': name, 'url': url} for name, url in feeds],
+      }
+    )
+  )
+  factory = ConfigJsonFactory(str(config_file))
+  factory.validate(revalidate=True)
+  return factory.create_config()
+
+
+def run_parse(server: str, args: Namespace) -> dict:
+  """
+  Parse RSS and Atom feeds with both parsers.
+  """
+  from feed import Feed
+  from stream_feed import StreamFeed
+
+  latencies: dict[str, list[float]] = {}
+  items = 0
+  total = 0.0
+  for feed_format in FEED_FORMATS:
+    feed_text = fetch(feed_url(server, args, feed_format, args.items))
+    for parser in ['feed', 'stream_feed']:
+      samples = latencies.setdefault(f'{parser}_{feed_format}', [])
+      for _ in range(args.repeat):
+        start = perf_counter()
+        if parser == 'feed':
+          items += len(Feed(feed_text=feed_text).entries())
+        else:
+          items += len(list(StreamFeed(feed_text=feed_text).entries()))
+        samples.append(perf_counter() - start)
+        total += samples[-1]
+  return {
+    'items': items,
+    'seconds': total,
+    'items_per_second': items / total,
+    'latency_ms': {stage: percentiles(samples) for stage, samples in latencies.items()},
+  }
+
+
+def run_replace(server: str, args: Namespace) -> dict:
+  """
+  Expand filename and tag templates
+  for all entries of a feed.
+  """
+  from feed import Feed
+  from replacer import Replacer
+
+  feed = Feed(feed_text=fetch(feed_url(server, args, 'rss', args.items)))
+  templates = [FILENAME, *TAGS.values()]
+  samples: list[float] = []
+  for _ in range(args.repeat):
+    replacer = Replacer()
+    replacer.update_name('benchmark')
+    replacer.update_feed(feed)
+    for entry in feed.entries():
+      start = perf_counter()
+      replacer.update_entry(entry)
+      for template in templates:
+        replacer.replace(template)
+      samples.append(perf_counter() - start)
+  total = sum(samples)
+  return {
+    'items': len(samples),
+    'seconds': total,
+    'items_per_second': len(samples) / total,
+    'latency_ms': {'replace': percentiles(samples)},
+  }
+
+
+def run_tag(server: str, args: Namespace) -> dict:
+  """
+  Tag freshly downloaded MP3 and M4A enclosures.
+  """
+  from http_loader import HttpLoader
+  from id3tagger import ID3Tagger
+
+  loader = HttpLoader()
+  latencies: dict[str, list[float]] = {}
+  size = 0
+  with TemporaryDirectory() as temp_dir:
+    for enclosure_format in ['mp3', 'm4a']:
+      samples = latencies.setdefault(f'tag_{enclosure_format}', [])
+      for index in range(args.download_items):
+        target = Path(temp_dir).joinpath(f'{index}.{enclosure_format}')
+        loader.download(
+          source=(
+            f'{server}/enclosure.{enclosure_format}'
+            f'?size={args.enclosure_size}&format={enclosure_format}'
+          ),
+          target=str(target),
+        )
+        size += args.enclosure_size
+        start = perf_counter()
+        tagger = ID3Tagger(str(target))
+        for key in TAGS:
+          tagger.set(key, f'{key} {index}')
+        tagger.save()
+        samples.append(perf_counter() - start)
+  loader.close()
+  total = sum(sum(samples) for samples in latencies.values())
+  items = sum(len(samples) for samples in latencies.values())
+  return {
+    'items': items,
+    'seconds': total,
+    'items_per_second': items / total,
+    'mb_per_second': size / MB / total,
+    'latency_ms': {stage: percentiles(samples) for stage, samples in latencies.items()},
+  }
+
+
+def run_list_episodes(server: str, args: Namespace) -> dict:
+  """
+  Run list_episodes, live and from the snapshot.
+  """
+  import main_cli
+
+  latencies: dict[str, list[float]] = {'list_episodes': [], 'list_episodes_cached': []}
+  with TemporaryDirectory() as temp_dir:
+    config = create_config(
+      temp_dir, [('benchmark', feed_url(server, args, 'rss', args.items))], {}
+    )
+    for stage, samples in latencies.items():
+      for _ in range(args.repeat):
+        start = perf_counter()
+        with redirect_stdout(StringIO()):
+          main_cli.list_episodes(config, 'benchmark', cached=stage.endswith('cached'))
+        samples.append(perf_counter() - start)
+  total = sum(sum(samples) for samples in latencies.values())
+  items = args.items * sum(len(samples) for samples in latencies.values())
+  return {
+    'items': items,
+    'seconds': total,
+    'items_per_second': items / total,
+    'latency_ms': {stage: percentiles(samples) for stage, samples in latencies.items()},
+  }
+
+
+def run_download(server: str, args: Namespace) -> dict:
+  """
+  Run download for several feeds and record
+  the latency of each pipeline stage.
+  """
+  import main_cli
+  from feed_refresher import FeedRefresher
+  from http_loader import HttpLoader
+
+  latencies: dict[str, list[float]] = {
+    'fetch': [],
+    'download': [],
+    'tag': [],
+    'commit': [],
+  }
+  FeedRefresher.refresh = timed(latencies['fetch'], FeedRefresher.refresh)
+  HttpLoader.download = timed(latencies['download'], HttpLoader.download)
+  main_cli.tag_entry = timed(latencies['tag'], main_cli.tag_entry)
+  main_cli.track_entry = timed(latencies['commit'], main_cli.track_entry)
+
+  feeds = [
+    (
+      f'feed{index}',
+      feed_url(server, args, FEED_FORMATS[index % 2], args.download_items)
+      + f'&feed={index}',
+    )
+    for index in range(args.feeds)
+  ]
+  with TemporaryDirectory() as temp_dir:
+    config = create_config(
+      temp_dir,
+      feeds,
+      {
+        'feed_workers': args.feeds,
+        'download_workers': args.download_workers,
+        'downloads_per_host': args.download_workers,
+        'tag_workers': args.tag_workers,
+      },
+    )
+    start = perf_counter()
+    with redirect_stdout(StringIO()):
+      main_cli.download(config)
+    total = perf_counter() - start
+    files = [path for path in Path(temp_dir, 'download').rglob('*') if path.is_file()]
+    size = sum(path.stat().st_size for path in files)
+  return {
+    'items': len(files),
+    'seconds': total,
+    'items_per_second': len(files) / total,
+    'mb_per_second': size / MB / total,
+    'latency_ms': {stage: percentiles(samples) for stage, samples in latencies.items()},
+  }
+
+
+RUNNERS: dict[str, Callable[[str, Namespace], dict]] = {
+  'parse': run_parse,
+  'replace': run_replace,
+  'tag': run_tag,
+  'list_episodes': run_list_episodes,
+  'download': run_download,
+}
+
+
+def build_argument_parser() -> ArgumentParser:
+  """
+  Create argument parser.
+  """
+  parser = ArgumentParser(description=__doc__)
+  parser.add_argument('--items', type=int, default=1000, help='Items per feed')
+  parser.add_argument(
+    '--download-items', type=int, default=20, help='Items per feed to download'
+  )
+  parser.add_argument('--feeds', type=int, default=2, help='Feeds to download')
+  parser.add_argument('--enclosure-size', type=int, default=1024 * 1024)
+  parser.add_argument('--enclosure-format', choices=['mp3', 'm4a'], default='mp3')
+  parser.add_argument('--download-workers', type=int, default=4)
+  parser.add_argument('--tag-workers', type=int, default=2)
+  parser.add_argument('--repeat', type=int, default=5)
+  parser.add_argument(
+    '--scenario', action='append', choices=SCENARIOS, dest='scenarios'
+  )
+  parser.add_argument('--child', nargs=2, metavar=('SCENARIO', 'SERVER'))
+  return parser
+
+
+def main() -> None:
+  """
+  Run all scenarios against a local
+  server and print results as JSON.
+  """
+  args = build_argument_parser().parse_args()
+
+  if args.child is not None:
+    scenario, server = args.child
+    result = RUNNERS[scenario](server, args)
+    result['peak_rss_mib'] = peak_rss_mib()
+    print(json.dumps(result))
+    return
+
+  results = {}
+  with FakeServer() as server:
+    base_url = server.url('')
+    for scenario in args.scenarios or SCENARIOS:
+      output = subprocess.run(
+        [sys.executable, __file__, *sys.argv[1:], '--child', scenario, base_url],
+        check=True,
+        capture_output=True,
+        text=True,
+      ).stdout
+      results[scenario] = json.loads(output)
+  print(
+    json.dumps(
+      {
+        'parameters': {
+          key: value
+          for key, value in vars(args).items()
+          if key not in ('child', 'scenarios')
+        },
+        'scenarios': results,
+      },
+      indent=2,
+    )
+  )
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,90 @@
+"""
+Asyncio interface of the HTTP loader.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from http_loader import HttpLoader
+
+
+class AsyncHttpLoader:
+  """
+  Awaitable counterpart of HttpLoader.
+
+  requests has no asyncio transport, so the
+  blocking calls of the wrapped HttpLoader (and
+  its pooled session) run on a dedicated thread
+  pool. Cancelling an awaiting task stops all
+  running downloads of the loader cooperatively.
+  """
+
+  def __init__(self, loader: HttpLoader, max_workers: int):
+    """
+    CTOR for AsyncHttpLoader.
+    """
+    self.__loader = loader
+    self.__executor = ThreadPoolExecutor(
+      max_workers=max_workers, thread_name_prefix='async_http_loader'
+    )
+
+  async def get_feed(
+    self, url: str, verify_https: bool = True, use_cache: bool = True
+  ) -> str | None:
+    """
+    Fetch a feed via HTTP(S).
+    Returns None if the feed is unchanged
+    since it was processed the last time.
+    """
+    return await self.__run(self.__loader.get_feed, url, verify_https, use_cache)
+
+  async def download(
+    self,
+    source: str,
+    target: Path,
+    verify_https: bool = True,
+    hash_content: bool = False,
+  ) -> str | None:
+    """
+    Download from source and write to target.
+    If hash_content is set, the SHA-256 hex
+    digest of the enclosure is returned.
+    """
+    return await self.__run(
+      self.__loader.download, source, target, verify_https, hash_content
+    )
+
+  def throughput(self) -> float | None:
+    """
+    Return current bytes per second of all downloads,
+    None without rate limiter.
+    """
+    return self.__loader.throughput()
+
+  def cancel(self) -> None:
+    """
+    Stop running downloads.
+    """
+    self.__loader.cancel()
+
+  def close(self) -> None:
+    """
+    Stop the thread pool and close
+    all pooled connections.
+    """
+    self.__executor.shutdown(wait=True, cancel_futures=True)
+    self.__loader.close()
+
+  async def __run(self, func, *args):
+    """
+    Run blocking func on the thread pool. If the
+    awaiting task is cancelled, the downloads are
+    cancelled, too, instead of running on unseen.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+      return await loop.run_in_executor(self.__executor, func, *args)
+    except asyncio.CancelledError:
+      self.cancel()
+      raise
@@ -4,6 +4,9 @@ Read configuration from a JSON file.
 
 from datetime import datetime
 
+from enclosure_policy import EnclosurePolicy
+from retention_policy import RetentionPolicy
+
 
 class ConfigFile:
   """
@@ -15,8 +18,65 @@ class ConfigFile:
     Global configration settings.
     """
 
+    # Defaults of the optional settings
+    DEFAULT_FEED_WORKERS = 1
+    DEFAULT_DOWNLOAD_WORKERS = 1
+    DEFAULT_DOWNLOADS_PER_HOST = 1
+    DEFAULT_CONDITIONAL_GET = True
+    DEFAULT_HTTP_POOL_SIZE = 10
+    DEFAULT_CONNECT_TIMEOUT = 10
+    DEFAULT_READ_TIMEOUT = 60
+    DEFAULT_DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+    DEFAULT_PREALLOCATE = True
+    DEFAULT_TRACKER_BACKEND = 'json'
+    DEFAULT_INCREMENTAL_PARSE = False
+    DEFAULT_TAG_WORKERS = 1
+    DEFAULT_QUEUE_SIZE = 64
+    DEFAULT_METRICS_FORMAT = 'prometheus'
+    DEFAULT_POLL_MIN_INTERVAL = 15 * 60
+    DEFAULT_POLL_MAX_INTERVAL = 24 * 60 * 60
+    DEFAULT_DEDUP = 'off'
+    DEFAULT_OUTSIDE_WINDOWS = 'throttle'
+    DEFAULT_HTTP_MAX_ATTEMPTS = 3
+    DEFAULT_HTTP_RETRY_DELAY = 1
+    DEFAULT_HTTP_RETRY_MAX_DELAY = 60
+    DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 5
+    DEFAULT_CIRCUIT_BREAKER_TIMEOUT = 300
+
     def __init__(
-      self, download_dir: str, data_dir: str, filename: str, tags: dict[str, str]
+      self,
+      download_dir: str,
+      data_dir: str,
+      filename: str,
+      tags: dict[str, str],
+      feed_workers: int = DEFAULT_FEED_WORKERS,
+      download_workers: int = DEFAULT_DOWNLOAD_WORKERS,
+      downloads_per_host: int = DEFAULT_DOWNLOADS_PER_HOST,
+      conditional_get: bool = DEFAULT_CONDITIONAL_GET,
+      http_pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+      connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+      read_timeout: float = DEFAULT_READ_TIMEOUT,
+      download_buffer_size: int = DEFAULT_DOWNLOAD_BUFFER_SIZE,
+      preallocate: bool = DEFAULT_PREALLOCATE,
+      tracker_backend: str = DEFAULT_TRACKER_BACKEND,
+      incremental_parse: bool = DEFAULT_INCREMENTAL_PARSE,
+      tag_workers: int = DEFAULT_TAG_WORKERS,
+      queue_size: int = DEFAULT_QUEUE_SIZE,
+      metrics_file: str | None = None,
+      metrics_format: str = DEFAULT_METRICS_FORMAT,
+      poll_min_interval: float = DEFAULT_POLL_MIN_INTERVAL,
+      poll_max_interval: float = DEFAULT_POLL_MAX_INTERVAL,
+      dedup: str = DEFAULT_DEDUP,
+      retention: RetentionPolicy | None = None,
+      max_download_rate: int | None = None,
+      max_download_rate_per_host: int | None = None,
+      full_speed_windows: list[str] | None = None,
+      outside_windows: str = DEFAULT_OUTSIDE_WINDOWS,
+      http_max_attempts: int = DEFAULT_HTTP_MAX_ATTEMPTS,
+      http_retry_delay: float = DEFAULT_HTTP_RETRY_DELAY,
+      http_retry_max_delay: float = DEFAULT_HTTP_RETRY_MAX_DELAY,
+      circuit_breaker_threshold: int = DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+      circuit_breaker_timeout: float = DEFAULT_CIRCUIT_BREAKER_TIMEOUT,
     ):
       """
       CTOR for Settings class.
@@ -25,6 +85,36 @@ class ConfigFile:
       self.__data_dir = data_dir
       self.__filename = filename
       self.__tags = tags
+      self.__feed_workers = feed_workers
+      self.__download_workers = download_workers
+      self.__downloads_per_host = downloads_per_host
+      self.__conditional_get = conditional_get
+      self.__http_pool_size = http_pool_size
+      self.__connect_timeout = connect_timeout
+      self.__read_timeout = read_timeout
+      self.__download_buffer_size = download_buffer_size
+      self.__preallocate = preallocate
+      self.__tracker_backend = tracker_backend
+      self.__incremental_parse = incremental_parse
+      self.__tag_workers = tag_workers
+      self.__queue_size = queue_size
+      self.__metrics_file = metrics_file
+      self.__metrics_format = metrics_format
+      self.__poll_min_interval = poll_min_interval
+      self.__poll_max_interval = poll_max_interval
+      self.__dedup = dedup
+      self.__retention = retention
+      self.__max_download_rate = max_download_rate
+      self.__max_download_rate_per_host = max_download_rate_per_host
+      self.__full_speed_windows = (
+        full_speed_windows if full_speed_windows is not None else []
+      )
+      self.__outside_windows = outside_windows
+      self.__http_max_attempts = http_max_attempts
+      self.__http_retry_delay = http_retry_delay
+      self.__http_retry_max_delay = http_retry_max_delay
+      self.__circuit_breaker_threshold = circuit_breaker_threshold
+      self.__circuit_breaker_timeout = circuit_breaker_timeout
 
     def download_dir(self) -> str:
       """
@@ -50,6 +140,200 @@ class ConfigFile:
       """
       return self.__tags
 
+    def feed_workers(self) -> int:
+      """
+      Return the number of feeds refreshed in parallel.
+      """
+      return self.__feed_workers
+
+    def download_workers(self) -> int:
+      """
+      Return the number of enclosures
+      downloaded in parallel.
+      """
+      return self.__download_workers
+
+    def downloads_per_host(self) -> int:
+      """
+      Maximum number of parallel downloads
+      from the same hostname.
+      """
+      return self.__downloads_per_host
+
+    def conditional_get(self) -> bool:
+      """
+      Return if unchanged feeds are skipped
+      via conditional GET requests.
+      """
+      return self.__conditional_get
+
+    def http_pool_size(self) -> int:
+      """
+      Return the number of pooled
+      HTTP connections per host.
+      """
+      return self.__http_pool_size
+
+    def connect_timeout(self) -> float:
+      """
+      Timeout in seconds to establish a connection.
+      """
+      return self.__connect_timeout
+
+    def read_timeout(self) -> float:
+      """
+      Timeout in seconds between two received bytes.
+      """
+      return self.__read_timeout
+
+    def download_buffer_size(self) -> int:
+      """
+      Size in bytes of the buffer used
+      to stream enclosures to disk.
+      """
+      return self.__download_buffer_size
+
+    def preallocate(self) -> bool:
+      """
+      Return if disk space for enclosures
+      is reserved before downloading.
+      """
+      return self.__preallocate
+
+    def tracker_backend(self) -> str:
+      """
+      Storage backend of the episode trackers.
+      """
+      return self.__tracker_backend
+
+    def incremental_parse(self) -> bool:
+      """
+      Return if feeds are parsed incrementally,
+      stopping at already seen items.
+      """
+      return self.__incremental_parse
+
+    def tag_workers(self) -> int:
+      """
+      Return the number of threads tagging
+      downloaded enclosures.
+      """
+      return self.__tag_workers
+
+    def queue_size(self) -> int:
+      """
+      Capacity of the queues between
+      the download pipeline stages.
+      """
+      return self.__queue_size
+
+    def metrics_file(self) -> str | None:
+      """
+      File the metrics of a download run
+      are written to, None to disable.
+      """
+      return self.__metrics_file
+
+    def metrics_format(self) -> str:
+      """
+      Format of the metrics file
+      ('prometheus' or 'json').
+      """
+      return self.__metrics_format
+
+    def poll_min_interval(self) -> float:
+      """
+      Shortest time in seconds between two
+      polls of a feed in daemon mode.
+      """
+      return self.__poll_min_interval
+
+    def poll_max_interval(self) -> float:
+      """
+      Longest time in seconds between two
+      polls of a feed in daemon mode.
+      """
+      return self.__poll_max_interval
+
+    def dedup(self) -> str:
+      """
+      How duplicate enclosures are stored
+      ('off', 'reflink' or 'hardlink').
+      """
+      return self.__dedup
+
+    def retention(self) -> RetentionPolicy | None:
+      """
+      Default retention of feeds (keep_last,
+      max_age_days) and size limit of all
+      downloads (max_bytes), None to keep all.
+      """
+      return self.__retention
+
+    def max_download_rate(self) -> int | None:
+      """
+      Bandwidth of all downloads together in
+      bytes per second, None for unlimited.
+      """
+      return self.__max_download_rate
+
+    def max_download_rate_per_host(self) -> int | None:
+      """
+      Bandwidth of the downloads from one host in
+      bytes per second, None for unlimited.
+      """
+      return self.__max_download_rate_per_host
+
+    def full_speed_windows(self) -> list[str]:
+      """
+      Daily time windows ('HH:MM-HH:MM') in
+      which downloads aren't limited.
+      """
+      return self.__full_speed_windows
+
+    def outside_windows(self) -> str:
+      """
+      Return how downloads outside of the full
+      speed windows are handled ('throttle'
+      or 'defer').
+      """
+      return self.__outside_windows
+
+    def http_max_attempts(self) -> int:
+      """
+      Return the number of attempts of a feed or
+      enclosure request with transient failures.
+      """
+      return self.__http_max_attempts
+
+    def http_retry_delay(self) -> float:
+      """
+      Seconds the backoff between
+      attempts starts from.
+      """
+      return self.__http_retry_delay
+
+    def http_retry_max_delay(self) -> float:
+      """
+      Longest backoff between attempts
+      in seconds.
+      """
+      return self.__http_retry_max_delay
+
+    def circuit_breaker_threshold(self) -> int:
+      """
+      Failures in a row which
+      make a host unavailable.
+      """
+      return self.__circuit_breaker_threshold
+
+    def circuit_breaker_timeout(self) -> float:
+      """
+      Seconds an unavailable host
+      is skipped.
+      """
+      return self.__circuit_breaker_timeout
+
     def __repr__(self) -> str:
       """
       Return string representation.
@@ -59,8 +343,36 @@ class ConfigFile:
         f"'data_dir': '{self.data_dir()}'",
         f"'filename': '{self.filename()}'",
         f"'tags': {self.tags()}",
+        f"'feed_workers': {self.feed_workers()}",
+        f"'download_workers': {self.download_workers()}",
+        f"'downloads_per_host': {self.downloads_per_host()}",
+        f"'conditional_get': {self.conditional_get()}",
+        f"'http_pool_size': {self.http_pool_size()}",
+        f"'connect_timeout': {self.connect_timeout()}",
+        f"'read_timeout': {self.read_timeout()}",
+        f"'download_buffer_size': {self.download_buffer_size()}",
+        f"'preallocate': {self.preallocate()}",
+        f"'tracker_backend': '{self.tracker_backend()}'",
+        f"'incremental_parse': {self.incremental_parse()}",
+        f"'tag_workers': {self.tag_workers()}",
+        f"'queue_size': {self.queue_size()}",
+        f"'metrics_file': '{self.metrics_file()}'",
+        f"'metrics_format': '{self.metrics_format()}'",
+        f"'poll_min_interval': {self.poll_min_interval()}",
+        f"'poll_max_interval': {self.poll_max_interval()}",
+        f"'dedup': '{self.dedup()}'",
+        f"'retention': {self.retention()}",
+        f"'max_download_rate': {self.max_download_rate()}",
+        f"'max_download_rate_per_host': {self.max_download_rate_per_host()}",
+        f"'full_speed_windows': {self.full_speed_windows()}",
+        f"'outside_windows': '{self.outside_windows()}'",
+        f"'http_max_attempts': {self.http_max_attempts()}",
+        f"'http_retry_delay': {self.http_retry_delay()}",
+        f"'http_retry_max_delay': {self.http_retry_max_delay()}",
+        f"'circuit_breaker_threshold': {self.circuit_breaker_threshold()}",
+        f"'circuit_breaker_timeout': {self.circuit_breaker_timeout()}",
       ]
-      return f'{{{', '.join(items)}}}'
+      return f'{{{", ".join(items)}}}'
 
   class Feed:
     """
@@ -77,6 +389,8 @@ class ConfigFile:
       skip_older_than: datetime | None,
       filename: str | None,
       tags: dict[str, str],
+      enclosure_policy: EnclosurePolicy | None = None,
+      retention: RetentionPolicy | None = None,
     ):
       """
       CTOR for Feed class.
@@ -92,6 +406,8 @@ class ConfigFile:
       self.__skip_older_than = skip_older_than
       self.__filename = filename
       self.__tags = tags
+      self.__enclosure_policy = enclosure_policy
+      self.__retention = retention
 
     def name(self) -> str:
       """
@@ -143,6 +459,21 @@ class ConfigFile:
       """
       return self.__download_subdir
 
+    def enclosure_policy(self) -> EnclosurePolicy | None:
+      """
+      Return preference between several
+      enclosures of an episode, None to
+      use the first one.
+      """
+      return self.__enclosure_policy
+
+    def retention(self) -> RetentionPolicy | None:
+      """
+      Return which downloaded episodes to
+      keep, None to use the settings.
+      """
+      return self.__retention
+
     def __repr__(self) -> str:
       """
       Return string representation.
@@ -156,8 +487,10 @@ class ConfigFile:
         f"'download_subdir': '{self.download_subdir()}'",
         f"'filename': '{self.filename()}'",
         f"'tags': {self.tags()}",
+        f"'enclosure': {self.enclosure_policy()}",
+        f"'retention': {self.retention()}",
       ]
-      return f'{{{', '.join(items)}}}'
+      return f'{{{", ".join(items)}}}'
 
   def __init__(self, settings: Settings, feeds: list[Feed]) -> None:
     """
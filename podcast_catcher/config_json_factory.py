@@ -5,13 +5,16 @@ by loading a JSON file.
 
 from collections.abc import Callable
 from datetime import UTC, datetime
+from hashlib import sha256
 from json import JSONDecodeError, loads
+from os import replace
 from pathlib import Path
 from typing import Any
 
 from config_file import ConfigFile
+from enclosure_policy import EnclosurePolicy
 from exception import PodcastCatcherError
-from jsonschema import Draft202012Validator, SchemaError, ValidationError, validate
+from retention_policy import RetentionPolicy
 
 
 class ConfigJsonFactory:
@@ -22,11 +25,48 @@ class ConfigJsonFactory:
 
   CONFIG_SCHEMA = Path.joinpath(Path(__file__).parent.absolute(), 'config.schema.json')
 
+  # Hash of the last successfully validated
+  # config and schema, stored in data_dir.
+  VALIDATION_CACHE_FILE = 'config_validation.sha256'
+
+  # Schema text and compiled validators, shared by
+  # all factories of the process (e.g. reloads).
+  __schema_text: str | None = None
+  __validators: dict[str, Any] = {}
+
   KEY_SETTINGS = 'settings'
   KEY_DOWNLOAD_DIR = 'download_dir'
   KEY_DATA_DIR = 'data_dir'
   KEY_FILENAME = 'filename'
   KEY_TAGS = 'tags'
+  KEY_FEED_WORKERS = 'feed_workers'
+  KEY_DOWNLOAD_WORKERS = 'download_workers'
+  KEY_DOWNLOADS_PER_HOST = 'downloads_per_host'
+  KEY_CONDITIONAL_GET = 'conditional_get'
+  KEY_HTTP_POOL_SIZE = 'http_pool_size'
+  KEY_CONNECT_TIMEOUT = 'connect_timeout'
+  KEY_READ_TIMEOUT = 'read_timeout'
+  KEY_DOWNLOAD_BUFFER_SIZE = 'download_buffer_size'
+  KEY_PREALLOCATE = 'preallocate'
+  KEY_TRACKER_BACKEND = 'tracker_backend'
+  KEY_INCREMENTAL_PARSE = 'incremental_parse'
+  KEY_TAG_WORKERS = 'tag_workers'
+  KEY_QUEUE_SIZE = 'queue_size'
+  KEY_METRICS_FILE = 'metrics_file'
+  KEY_METRICS_FORMAT = 'metrics_format'
+  KEY_POLL_MIN_INTERVAL = 'poll_min_interval'
+  KEY_POLL_MAX_INTERVAL = 'poll_max_interval'
+  KEY_DEDUP = 'dedup'
+  KEY_RETENTION = 'retention'
+  KEY_MAX_DOWNLOAD_RATE = 'max_download_rate'
+  KEY_MAX_DOWNLOAD_RATE_PER_HOST = 'max_download_rate_per_host'
+  KEY_FULL_SPEED_WINDOWS = 'full_speed_windows'
+  KEY_OUTSIDE_WINDOWS = 'outside_windows'
+  KEY_HTTP_MAX_ATTEMPTS = 'http_max_attempts'
+  KEY_HTTP_RETRY_DELAY = 'http_retry_delay'
+  KEY_HTTP_RETRY_MAX_DELAY = 'http_retry_max_delay'
+  KEY_CIRCUIT_BREAKER_THRESHOLD = 'circuit_breaker_threshold'
+  KEY_CIRCUIT_BREAKER_TIMEOUT = 'circuit_breaker_timeout'
 
   KEY_REPLACE = 'replace'
   KEY_WITH = 'with'
@@ -38,6 +78,16 @@ class ConfigJsonFactory:
   KEY_ENABLED = 'enabled'
   KEY_SKIP_ODER_THAN = 'skip_older_than'
   KEY_DOWNLOAD_SUBDIR = 'download_subdir'
+  KEY_ENCLOSURE = 'enclosure'
+
+  KEY_TYPES = 'types'
+  KEY_MAX_LENGTH = 'max_length'
+  KEY_BITRATE = 'bitrate'
+  KEY_PREFER = 'prefer'
+
+  KEY_KEEP_LAST = 'keep_last'
+  KEY_MAX_AGE_DAYS = 'max_age_days'
+  KEY_MAX_BYTES = 'max_bytes'
 
   def __init__(self, config_filename: str):
     """
@@ -45,32 +95,79 @@ class ConfigJsonFactory:
     content on class initialization.
     """
     try:
-      with open(self.CONFIG_SCHEMA) as f:
-        self.__config_schema = loads(f.read())
+      if ConfigJsonFactory.__schema_text is None:
+        with open(self.CONFIG_SCHEMA) as f:
+          ConfigJsonFactory.__schema_text = f.read()
+      self.__config_schema = loads(ConfigJsonFactory.__schema_text)
       with open(config_filename) as f:
-        self.__config_data = loads(f.read())
+        self.__config_text = f.read()
+      self.__config_data = loads(self.__config_text)
     except FileNotFoundError as e:
       raise PodcastCatcherError(f'Config factory error: {e}') from e
     except JSONDecodeError as e:
       raise PodcastCatcherError(f'Config factory JSON parser error: {e}') from e
 
-  def validate(self) -> bool:
+  def validate(self, revalidate: bool = False) -> bool:
     """
-    Validate config against
-    JSON schema.
+    Validate config against JSON schema.
+    Skipped if config and schema are unchanged
+    since the last successful validation,
+    unless revalidate is set.
     """
-    try:
-      validate(
-        instance=self.__config_data,
-        schema=self.__config_schema,
+    content_hash = sha256(
+      f'{ConfigJsonFactory.__schema_text}\0{self.__config_text}'.encode()
+    ).hexdigest()
+    cache_file = self.__validation_cache_file()
+    if not revalidate and cache_file is not None:
+      try:
+        if cache_file.read_text() == content_hash:
+          return True
+      except FileNotFoundError:
+        pass
+
+    # jsonschema takes long to import,
+    # load it only for validation.
+    from jsonschema import Draft202012Validator, SchemaError
+    from jsonschema.exceptions import best_match
+
+    schema_hash = sha256(ConfigJsonFactory.__schema_text.encode()).hexdigest()
+    if schema_hash not in ConfigJsonFactory.__validators:
+      try:
+        Draft202012Validator.check_schema(self.__config_schema)
+      except SchemaError as e:
+        raise PodcastCatcherError(f'JSON schema error: {e}') from e
+      ConfigJsonFactory.__validators[schema_hash] = Draft202012Validator(
+        self.__config_schema,
         format_checker=Draft202012Validator.FORMAT_CHECKER,
       )
-    except SchemaError as e:
-      raise PodcastCatcherError(f'JSON schema error: {e}') from e
-    except ValidationError as e:
-      raise PodcastCatcherError(f'JSON config validation error: {e}') from e
+    validator = ConfigJsonFactory.__validators[schema_hash]
+    error = best_match(validator.iter_errors(self.__config_data))
+    if error is not None:
+      raise PodcastCatcherError(f'JSON config validation error: {error}')
+
+    if cache_file is not None:
+      cache_file.parent.mkdir(parents=True, exist_ok=True)
+      temp_file = cache_file.with_suffix('.tmp')
+      temp_file.write_text(content_hash)
+      replace(temp_file, cache_file)
     return True
 
+  def __validation_cache_file(self) -> Path | None:
+    """
+    Return the validation cache file in data_dir, None
+    if the config has no usable data_dir.
+    """
+    # Not validated yet, don't trust the structure
+    if not isinstance(self.__config_data, dict):
+      return None
+    settings_data = self.__config_data.get(self.KEY_SETTINGS)
+    if not isinstance(settings_data, dict):
+      return None
+    data_dir = settings_data.get(self.KEY_DATA_DIR)
+    if not isinstance(data_dir, str):
+      return None
+    return Path(data_dir).joinpath(self.VALIDATION_CACHE_FILE)
+
   @staticmethod
   def __get_optional(
     data: dict[str, Any],
@@ -93,6 +190,30 @@ class ConfigJsonFactory:
     """
     return datetime.strptime(text, '%Y-%m-%d').astimezone(tz=UTC)
 
+  @classmethod
+  def __parse_enclosure_policy(cls, data: dict[str, Any]) -> EnclosurePolicy:
+    """
+    Create enclosure policy of a feed.
+    """
+    return EnclosurePolicy(
+      types=cls.__get_optional(data, cls.KEY_TYPES, None),
+      max_length=cls.__get_optional(data, cls.KEY_MAX_LENGTH, None),
+      bitrate=cls.__get_optional(data, cls.KEY_BITRATE, None),
+      prefer=cls.__get_optional(data, cls.KEY_PREFER, EnclosurePolicy.PREFER_FIRST),
+    )
+
+  @classmethod
+  def __parse_retention_policy(cls, data: dict[str, Any]) -> RetentionPolicy:
+    """
+    Create retention policy of
+    the settings or a feed.
+    """
+    return RetentionPolicy(
+      keep_last=cls.__get_optional(data, cls.KEY_KEEP_LAST, None),
+      max_age_days=cls.__get_optional(data, cls.KEY_MAX_AGE_DAYS, None),
+      max_bytes=cls.__get_optional(data, cls.KEY_MAX_BYTES, None),
+    )
+
   def create_config(self) -> ConfigFile:
     """
     Create Config instance from
@@ -103,11 +224,101 @@ class ConfigJsonFactory:
       for entry in self.__config_data[self.KEY_SETTINGS][self.KEY_TAGS]:
         settings_tags[entry[self.KEY_REPLACE]] = entry[self.KEY_WITH]
 
+    settings_data = self.__config_data[self.KEY_SETTINGS]
+    defaults = ConfigFile.Settings
     settings = ConfigFile.Settings(
-      download_dir=self.__config_data[self.KEY_SETTINGS][self.KEY_DOWNLOAD_DIR],
-      data_dir=self.__config_data[self.KEY_SETTINGS][self.KEY_DATA_DIR],
-      filename=self.__config_data[self.KEY_SETTINGS][self.KEY_FILENAME],
+      download_dir=settings_data[self.KEY_DOWNLOAD_DIR],
+      data_dir=settings_data[self.KEY_DATA_DIR],
+      filename=settings_data[self.KEY_FILENAME],
       tags=settings_tags,
+      feed_workers=self.__get_optional(
+        settings_data, self.KEY_FEED_WORKERS, defaults.DEFAULT_FEED_WORKERS
+      ),
+      download_workers=self.__get_optional(
+        settings_data, self.KEY_DOWNLOAD_WORKERS, defaults.DEFAULT_DOWNLOAD_WORKERS
+      ),
+      downloads_per_host=self.__get_optional(
+        settings_data, self.KEY_DOWNLOADS_PER_HOST, defaults.DEFAULT_DOWNLOADS_PER_HOST
+      ),
+      conditional_get=self.__get_optional(
+        settings_data, self.KEY_CONDITIONAL_GET, defaults.DEFAULT_CONDITIONAL_GET
+      ),
+      http_pool_size=self.__get_optional(
+        settings_data, self.KEY_HTTP_POOL_SIZE, defaults.DEFAULT_HTTP_POOL_SIZE
+      ),
+      connect_timeout=self.__get_optional(
+        settings_data, self.KEY_CONNECT_TIMEOUT, defaults.DEFAULT_CONNECT_TIMEOUT
+      ),
+      read_timeout=self.__get_optional(
+        settings_data, self.KEY_READ_TIMEOUT, defaults.DEFAULT_READ_TIMEOUT
+      ),
+      download_buffer_size=self.__get_optional(
+        settings_data,
+        self.KEY_DOWNLOAD_BUFFER_SIZE,
+        defaults.DEFAULT_DOWNLOAD_BUFFER_SIZE,
+      ),
+      preallocate=self.__get_optional(
+        settings_data, self.KEY_PREALLOCATE, defaults.DEFAULT_PREALLOCATE
+      ),
+      tracker_backend=self.__get_optional(
+        settings_data, self.KEY_TRACKER_BACKEND, defaults.DEFAULT_TRACKER_BACKEND
+      ),
+      incremental_parse=self.__get_optional(
+        settings_data, self.KEY_INCREMENTAL_PARSE, defaults.DEFAULT_INCREMENTAL_PARSE
+      ),
+      tag_workers=self.__get_optional(
+        settings_data, self.KEY_TAG_WORKERS, defaults.DEFAULT_TAG_WORKERS
+      ),
+      queue_size=self.__get_optional(
+        settings_data, self.KEY_QUEUE_SIZE, defaults.DEFAULT_QUEUE_SIZE
+      ),
+      metrics_file=self.__get_optional(settings_data, self.KEY_METRICS_FILE, None),
+      metrics_format=self.__get_optional(
+        settings_data, self.KEY_METRICS_FORMAT, defaults.DEFAULT_METRICS_FORMAT
+      ),
+      poll_min_interval=self.__get_optional(
+        settings_data, self.KEY_POLL_MIN_INTERVAL, defaults.DEFAULT_POLL_MIN_INTERVAL
+      ),
+      poll_max_interval=self.__get_optional(
+        settings_data, self.KEY_POLL_MAX_INTERVAL, defaults.DEFAULT_POLL_MAX_INTERVAL
+      ),
+      dedup=self.__get_optional(settings_data, self.KEY_DEDUP, defaults.DEFAULT_DEDUP),
+      retention=self.__get_optional(
+        settings_data, self.KEY_RETENTION, None, func=self.__parse_retention_policy
+      ),
+      max_download_rate=self.__get_optional(
+        settings_data, self.KEY_MAX_DOWNLOAD_RATE, None
+      ),
+      max_download_rate_per_host=self.__get_optional(
+        settings_data, self.KEY_MAX_DOWNLOAD_RATE_PER_HOST, None
+      ),
+      full_speed_windows=self.__get_optional(
+        settings_data, self.KEY_FULL_SPEED_WINDOWS, None
+      ),
+      outside_windows=self.__get_optional(
+        settings_data, self.KEY_OUTSIDE_WINDOWS, defaults.DEFAULT_OUTSIDE_WINDOWS
+      ),
+      http_max_attempts=self.__get_optional(
+        settings_data, self.KEY_HTTP_MAX_ATTEMPTS, defaults.DEFAULT_HTTP_MAX_ATTEMPTS
+      ),
+      http_retry_delay=self.__get_optional(
+        settings_data, self.KEY_HTTP_RETRY_DELAY, defaults.DEFAULT_HTTP_RETRY_DELAY
+      ),
+      http_retry_max_delay=self.__get_optional(
+        settings_data,
+        self.KEY_HTTP_RETRY_MAX_DELAY,
+        defaults.DEFAULT_HTTP_RETRY_MAX_DELAY,
+      ),
+      circuit_breaker_threshold=self.__get_optional(
+        settings_data,
+        self.KEY_CIRCUIT_BREAKER_THRESHOLD,
+        defaults.DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+      ),
+      circuit_breaker_timeout=self.__get_optional(
+        settings_data,
+        self.KEY_CIRCUIT_BREAKER_TIMEOUT,
+        defaults.DEFAULT_CIRCUIT_BREAKER_TIMEOUT,
+      ),
     )
     feeds = []
     if self.KEY_FEEDS in self.__config_data:
@@ -128,6 +339,12 @@ class ConfigJsonFactory:
           ),
           filename=self.__get_optional(entry, self.KEY_FILENAME, None),
           tags=feed_tags,
+          enclosure_policy=self.__get_optional(
+            entry, self.KEY_ENCLOSURE, None, func=self.__parse_enclosure_policy
+          ),
+          retention=self.__get_optional(
+            entry, self.KEY_RETENTION, None, func=self.__parse_retention_policy
+          ),
         )
         feeds.append(feed)
 
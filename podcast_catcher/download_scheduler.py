@@ -0,0 +1,275 @@
+"""
+Schedule enclosure downloads on a pool
+of worker threads.
+"""
+
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Condition, Thread
+from typing import Any
+from urllib.parse import urlparse
+
+
+class DownloadScheduler:
+  """
+  Run several downloads at once.
+
+  The number of concurrent downloads is capped
+  globally and per hostname, so a single podcast
+  host is never hit by more than a few transfers.
+  Pending downloads are started in order of their
+  priority (lowest first), skipping downloads of
+  hosts which are already saturated.
+
+  If max_pending is set, submit() blocks while that
+  many downloads are pending. If on_finished is set,
+  finished jobs are handed to it by the worker
+  (which may block) instead of finished().
+  """
+
+  class Job:
+    """
+    A single download.
+    """
+
+    def __init__(
+      self,
+      source: str,
+      target: Path,
+      verify_https: bool,
+      priority: Any,
+      payload: Any,
+    ):
+      """
+      CTOR for Job class.
+      """
+      self.__source = source
+      self.__target = target
+      self.__verify_https = verify_https
+      self.__priority = priority
+      self.__payload = payload
+      self.__host = urlparse(source).hostname or ''
+      self.__error: Exception | None = None
+
+    def source(self) -> str:
+      """
+      URL to download from.
+      """
+      return self.__source
+
+    def target(self) -> Path:
+      """
+      Local file to write to.
+      """
+      return self.__target
+
+    def verify_https(self) -> bool:
+      """
+      Return if strict HTTPS checks are used.
+      """
+      return self.__verify_https
+
+    def priority(self) -> Any:
+      """
+      Priority of the job (lower is earlier).
+      """
+      return self.__priority
+
+    def payload(self) -> Any:
+      """
+      Caller provided data, returned
+      untouched with the finished job.
+      """
+      return self.__payload
+
+    def host(self) -> str:
+      """
+      Hostname of the source URL.
+      """
+      return self.__host
+
+    def error(self) -> Exception | None:
+      """
+      Exception raised by the download,
+      None if the download succeeded.
+      """
+      return self.__error
+
+    def set_error(self, error: Exception) -> None:
+      """
+      Mark download as failed.
+      """
+      self.__error = error
+
+  def __init__(
+    self,
+    download: Callable[[str, Path, bool], None],
+    max_workers: int,
+    max_per_host: int,
+    max_pending: int = 0,
+    on_finished: Callable[['DownloadScheduler.Job'], None] | None = None,
+  ):
+    """
+    CTOR for DownloadScheduler. The download
+    callable gets source, target and verify_https.
+    """
+    self.__download = download
+    self.__max_per_host = max_per_host
+    self.__max_pending = max_pending
+    self.__on_finished = on_finished
+    self.__condition = Condition()
+    self.__pending: list[DownloadScheduler.Job] = []
+    self.__active_per_host: dict[str, int] = {}
+    self.__unfinished = 0
+    self.__shutdown = False
+    self.__finished: Queue[DownloadScheduler.Job] = Queue()
+    self.__workers = [
+      Thread(target=self.__work, name=f'download_{index}', daemon=True)
+      for index in range(max_workers)
+    ]
+    for worker in self.__workers:
+      worker.start()
+
+  def __enter__(self) -> 'DownloadScheduler':
+    """
+    Enter context, nothing to do.
+    """
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    """
+    Leave context, wait for running downloads
+    unless the context is left due to an error.
+    """
+    self.shutdown(wait=exc_type is None)
+
+  def submit(
+    self,
+    source: str,
+    target: Path,
+    verify_https: bool = True,
+    priority: Any = 0,
+    payload: Any = None,
+  ) -> None:
+    """
+    Queue a download.
+    """
+    job = self.Job(
+      source=source,
+      target=target,
+      verify_https=verify_https,
+      priority=priority,
+      payload=payload,
+    )
+    with self.__condition:
+      while (
+        self.__max_pending > 0
+        and len(self.__pending) >= self.__max_pending
+        and not self.__shutdown
+      ):
+        self.__condition.wait()
+      if self.__shutdown:
+        return
+      self.__pending.append(job)
+      self.__pending.sort(key=lambda j: j.priority())
+      self.__unfinished += 1
+      self.__condition.notify_all()
+
+  def pending(self) -> int:
+    """
+    Return the number of queued jobs not yet started.
+    """
+    with self.__condition:
+      return len(self.__pending)
+
+  def join(self) -> None:
+    """
+    Wait until all submitted jobs are finished
+    (and handed to on_finished, if set).
+    """
+    with self.__condition:
+      while self.__unfinished > 0:
+        self.__condition.wait()
+
+  def unfinished(self) -> int:
+    """
+    Return the number of submitted jobs not yet
+    returned by finished().
+    """
+    with self.__condition:
+      return self.__unfinished
+
+  def finished(self, block: bool = True) -> Iterator[Job]:
+    """
+    Yield finished jobs (successful or failed)
+    in order of completion. If block is set,
+    wait until all submitted jobs are finished,
+    otherwise only yield jobs already done.
+    """
+    while self.unfinished() > 0:
+      try:
+        job = self.__finished.get(block=block)
+      except Empty:
+        return
+      with self.__condition:
+        self.__unfinished -= 1
+      yield job
+
+  def shutdown(self, wait: bool = True) -> None:
+    """
+    Drop pending downloads and stop the
+    workers. If wait is set, block until
+    running downloads are finished.
+    """
+    with self.__condition:
+      self.__unfinished -= len(self.__pending)
+      self.__pending.clear()
+      self.__shutdown = True
+      self.__condition.notify_all()
+    if wait:
+      for worker in self.__workers:
+        worker.join()
+
+  def __next_job(self) -> Job | None:
+    """
+    Take the pending job with the lowest priority
+    value whose host is not saturated. Return
+    None once the scheduler is shut down.
+    """
+    with self.__condition:
+      while True:
+        if self.__shutdown:
+          return None
+        for job in self.__pending:
+          if self.__active_per_host.get(job.host(), 0) < self.__max_per_host:
+            self.__pending.remove(job)
+            self.__active_per_host[job.host()] = (
+              self.__active_per_host.get(job.host(), 0) + 1
+            )
+            # Wake up a blocked submit()
+            self.__condition.notify_all()
+            return job
+        self.__condition.wait()
+
+  def __work(self) -> None:
+    """
+    Worker thread loop.
+    """
+    while (job := self.__next_job()) is not None:
+      try:
+        self.__download(job.source(), job.target(), job.verify_https())
+      except Exception as e:
+        job.set_error(e)
+      with self.__condition:
+        self.__active_per_host[job.host()] -= 1
+        self.__condition.notify_all()
+      if self.__on_finished is None:
+        self.__finished.put(job)
+        continue
+      try:
+        self.__on_finished(job)
+      finally:
+        with self.__condition:
+          self.__unfinished -= 1
+          self.__condition.notify_all()
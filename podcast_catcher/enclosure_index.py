@@ -0,0 +1,222 @@
+"""
+Index of downloaded enclosures to
+avoid downloading duplicates.
+"""
+
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from metrics import Metrics
+
+
+class EnclosureIndex:
+  """
+  Remember every downloaded enclosure by its
+  normalized URL and by size and SHA-256 of its
+  content, for all feeds in one database.
+
+  An enclosure whose URL is known is linked from
+  the existing file instead of downloaded again.
+  A download with the same content as an existing
+  file is replaced by a link to that file.
+
+  In reflink mode, files are cloned copy-on-write
+  (Linux FICLONE, e.g. btrfs or XFS), so each file
+  keeps its own tags. Where cloning isn't possible,
+  known URLs are copied, which still saves the
+  download. In hardlink mode, duplicates share one
+  file, and thus the tags written last.
+  """
+
+  MODE_OFF = 'off'
+  MODE_REFLINK = 'reflink'
+  MODE_HARDLINK = 'hardlink'
+
+  MODES = [MODE_OFF, MODE_REFLINK, MODE_HARDLINK]
+
+  DATABASE_FILE = 'enclosures.sqlite3'
+
+  SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS enclosures ('
+    ' url TEXT PRIMARY KEY,'
+    ' path TEXT NOT NULL,'
+    ' size INTEGER NOT NULL,'
+    ' sha256 TEXT NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS enclosures_content ON enclosures (sha256, size)',
+  ]
+
+  # Tracking prefixes which redirect to the URL in the
+  # rest of their path: host -> path segments to drop
+  REDIRECTORS = {
+    'dts.podtrac.com': 1,  # /redirect.mp3/<url>
+    'www.podtrac.com': 2,  # /pts/redirect.mp3/<url>
+    'chtbl.com': 2,  # /track/<id>/<url>
+    'chrt.fm': 2,  # /track/<id>/<url>
+    'pdst.fm': 1,  # /e/<url>
+    'op3.dev': 1,  # /e/<url>
+    'pfx.vpixl.com': 1,  # /<id>/<url>
+    'arttrk.com': 2,  # /p/<id>/<url>
+    'verifi.podscribe.com': 2,  # /rss/p/<url>
+    'mgln.ai': 2,  # /e/<id>/<url>
+    'prfx.byspotify.com': 1,  # /e/<url>
+    'media.blubrry.com': 1,  # /<show>/<url>
+  }
+
+  # Query parameters which only track the listener
+  TRACKING_PARAMS = {
+    'fbclid',
+    'gclid',
+    'mc_cid',
+    'mc_eid',
+    'awCollectionId',
+    'awEpisodeId',
+  }
+  TRACKING_PREFIX = 'utm_'
+
+  # ioctl to clone a file (linux/fs.h)
+  FICLONE = 0x40049409
+
+  def __init__(self, data_dir: str, mode: str = MODE_REFLINK):
+    """
+    CTOR for EnclosureIndex.
+    """
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    self.__mode = mode
+    self.__lock = Lock()
+    self.__connection = sqlite3.connect(
+      data_dir.joinpath(self.DATABASE_FILE), check_same_thread=False
+    )
+    self.__connection.execute('PRAGMA journal_mode=WAL')
+    self.__connection.execute('PRAGMA synchronous=NORMAL')
+    for statement in self.SCHEMA:
+      self.__connection.execute(statement)
+    self.__connection.commit()
+
+  @classmethod
+  def normalize(cls, url: str) -> str:
+    """
+    Key of an enclosure URL: tracking redirects
+    and tracking query parameters removed,
+    scheme dropped, host lowercased and the
+    remaining query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    path = parts.path
+    query = parts.query
+    while host in cls.REDIRECTORS:
+      segments = path.lstrip('/').split('/')
+      rest = '/'.join(segments[cls.REDIRECTORS[host] :])
+      # The target may come with or without scheme
+      for scheme in ('https:', 'http:'):
+        if rest.startswith(scheme):
+          rest = rest.removeprefix(scheme).lstrip('/')
+          break
+      target = urlsplit(f'//{rest}')
+      host = (target.hostname or '').lower()
+      path = target.path
+    params = sorted(
+      (key, value)
+      for key, value in parse_qsl(query, keep_blank_values=True)
+      if key not in cls.TRACKING_PARAMS and not key.startswith(cls.TRACKING_PREFIX)
+    )
+    key = f'{host}{path}'
+    if len(params) > 0:
+      key = f'{key}?{urlencode(params)}'
+    return key
+
+  def link_known(self, source: str, target: Path) -> bool:
+    """
+    Provide target from an existing download of
+    the same (normalized) URL. Returns False if
+    the URL is unknown or its file is gone.
+    """
+    with self.__lock:
+      row = self.__connection.execute(
+        'SELECT path FROM enclosures WHERE url = ?', (self.normalize(source),)
+      ).fetchone()
+    if row is None:
+      return False
+    existing = Path(row[0])
+    if not existing.is_file():
+      return False
+    if existing != target.absolute():
+      self.__link(existing, target, copy=True)
+    Metrics.count('dedup_url_hits')
+    Metrics.count('dedup_bytes_saved', target.stat().st_size)
+    return True
+
+  def add(self, source: str, target: Path, sha256: str) -> None:
+    """
+    Register a downloaded enclosure. If a file
+    with the same content exists, target is
+    replaced by a link to it.
+    """
+    target = target.absolute()
+    size = target.stat().st_size
+    with self.__lock:
+      rows = self.__connection.execute(
+        'SELECT path FROM enclosures WHERE sha256 = ? AND size = ? AND path != ?',
+        (sha256, size, str(target)),
+      ).fetchall()
+    for (path,) in rows:
+      existing = Path(path)
+      if existing.is_file() and self.__link(existing, target, copy=False):
+        Metrics.count('dedup_content_hits')
+        Metrics.count('dedup_bytes_saved', size)
+        break
+    with self.__lock:
+      self.__connection.execute(
+        'INSERT OR REPLACE INTO enclosures VALUES (?, ?, ?, ?)',
+        (self.normalize(source), str(target), size, sha256),
+      )
+      self.__connection.commit()
+
+  def close(self) -> None:
+    """
+    Close the database.
+    """
+    with self.__lock:
+      self.__connection.close()
+
+  def __link(self, existing: Path, target: Path, copy: bool) -> bool:
+    """
+    Replace target by a link (or clone) of
+    existing. If that isn't possible, copy
+    existing if copy is set. Returns False
+    if target was left untouched.
+    """
+    temp_file = target.with_name(f'{target.name}.dedup')
+    temp_file.unlink(missing_ok=True)
+    try:
+      if self.__mode == self.MODE_HARDLINK:
+        os.link(existing, temp_file)
+      else:
+        self.__clone(existing, temp_file)
+    except OSError:
+      # e.g. other filesystem, or no reflink support
+      temp_file.unlink(missing_ok=True)
+      if not copy:
+        return False
+      shutil.copyfile(existing, temp_file)
+    os.replace(temp_file, target)
+    return True
+
+  @classmethod
+  def __clone(cls, existing: Path, target: Path) -> None:
+    """
+    Clone existing to target copy-on-write.
+    """
+    try:
+      import fcntl
+    except ImportError:
+      raise OSError('Cloning files is not supported') from None
+
+    with open(existing, 'rb') as source_fd, open(target, 'wb') as target_fd:
+      fcntl.ioctl(target_fd.fileno(), cls.FICLONE, source_fd.fileno())
@@ -0,0 +1,160 @@
+"""
+Choose one of several enclosures
+offered for an episode.
+"""
+
+from fnmatch import fnmatchcase
+
+
+class EnclosurePolicy:
+  """
+  Preference of a feed between the enclosures of
+  an episode (e.g. low and high bitrate, or audio
+  and video), judged by their type and length
+  attributes.
+
+  Enclosures are ranked by, in this order:
+  - the first of types their MIME type matches
+    (wildcards like 'audio/*' allowed), others last
+  - whether they fit into max_length (bytes)
+  - the distance of their bitrate to bitrate
+    (kbit/s), estimated from length and the
+    duration of the episode, if both are known
+  - their length, if prefer is 'smallest' or
+    'largest'
+  - their order in the feed
+  """
+
+  PREFER_FIRST = 'first'
+  PREFER_SMALLEST = 'smallest'
+  PREFER_LARGEST = 'largest'
+
+  PREFERENCES = [PREFER_FIRST, PREFER_SMALLEST, PREFER_LARGEST]
+
+  def __init__(
+    self,
+    types: list[str] | None = None,
+    max_length: int | None = None,
+    bitrate: float | None = None,
+    prefer: str = PREFER_FIRST,
+  ):
+    """
+    CTOR for EnclosurePolicy.
+    """
+    self.__types = types if types is not None else []
+    self.__max_length = max_length
+    self.__bitrate = bitrate
+    self.__prefer = prefer
+
+  def types(self) -> list[str]:
+    """
+    Preferred MIME types, best first.
+    """
+    return self.__types
+
+  def max_length(self) -> int | None:
+    """
+    Largest enclosure (bytes) to
+    prefer, None for any size.
+    """
+    return self.__max_length
+
+  def bitrate(self) -> float | None:
+    """
+    Preferred bitrate in kbit/s.
+    """
+    return self.__bitrate
+
+  def prefer(self) -> str:
+    """
+    Preference by length ('first',
+    'smallest' or 'largest').
+    """
+    return self.__prefer
+
+  def select(
+    self,
+    enclosures: list[tuple[str | None, int | None]],
+    duration: float | None = None,
+  ) -> int:
+    """
+    Index of the preferred enclosure of
+    (type, length) pairs. Length is None
+    if unknown, duration in seconds.
+    """
+    return min(
+      range(len(enclosures)),
+      key=lambda index: self.__rank(index, *enclosures[index], duration),
+    )
+
+  def __rank(
+    self,
+    index: int,
+    mime_type: str | None,
+    length: int | None,
+    duration: float | None,
+  ) -> tuple:
+    """
+    Sort key of an enclosure, lowest wins.
+    """
+    type_rank = len(self.__types)
+    if mime_type is not None:
+      for rank, pattern in enumerate(self.__types):
+        if fnmatchcase(mime_type.lower(), pattern.lower()):
+          type_rank = rank
+          break
+    too_long = self.__max_length is not None and (
+      length is None or length > self.__max_length
+    )
+    bitrate_distance = 0.0
+    if self.__bitrate is not None:
+      if length is not None and duration is not None and duration > 0:
+        bitrate_distance = abs(length * 8 / 1000 / duration - self.__bitrate)
+      else:
+        bitrate_distance = float('inf')
+    size = 0.0
+    if self.__prefer == self.PREFER_SMALLEST:
+      size = length if length is not None else float('inf')
+    elif self.__prefer == self.PREFER_LARGEST:
+      size = -length if length is not None else float('inf')
+    return type_rank, too_long, bitrate_distance, size, index
+
+  @staticmethod
+  def parse_length(length: str | None) -> int | None:
+    """
+    Length attribute of an enclosure,
+    None if missing or invalid.
+    """
+    if length is None or not length.strip().isdigit():
+      return None
+    value = int(length)
+    # Some feeds use 0 (or 1) for unknown
+    return value if value > 1 else None
+
+  @staticmethod
+  def parse_duration(duration: str | None) -> float | None:
+    """
+    Seconds of an itunes:duration
+    ('HH:MM:SS', 'MM:SS' or seconds).
+    """
+    if duration is None:
+      return None
+    seconds = 0.0
+    try:
+      for part in duration.strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    except ValueError:
+      return None
+    return seconds if seconds > 0 else None
+
+  def __repr__(self) -> str:
+    """
+    Return string representation.
+    """
+    items = [
+      f"'types': {self.types()}",
+      f"'max_length': {self.max_length()}",
+      f"'bitrate': {self.bitrate()}",
+      f"'prefer': '{self.prefer()}'",
+    ]
+    return f'{{{", ".join(items)}}}'
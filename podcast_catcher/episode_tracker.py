@@ -3,38 +3,73 @@ Manage state which episodes were
 already downloaded.
 """
 
-from json import dumps, loads
+import os
+from datetime import datetime
+from json import JSONDecodeError, dumps, loads
 from pathlib import Path
+from threading import Lock
 
 from config_file import ConfigFile
 from feed import Entry
+from metrics import Metrics
 
 
 class EpisodeTracker:
   """
   Keep track of already downloaded
   episodes per feed.
+
+  In journal mode, complete() appends the episode
+  to a journal file (one JSON object per line)
+  instead of rewriting the whole list on save().
+  The journal is folded into the JSON file by
+  compact(), either when it grows beyond
+  JOURNAL_COMPACT_SIZE or by close().
+
+  The oldest episode offered for download but not
+  completed yet is kept in an unfinished file, so
+  incremental parsing doesn't stop above it.
   """
 
   COMPLETED_FILES_EXTENSION = 'json'
+  JOURNAL_FILES_EXTENSION = 'journal'
+  UNFINISHED_FILES_EXTENSION = 'unfinished'
+
+  # Journal size in bytes which triggers a compaction
+  JOURNAL_COMPACT_SIZE = 256 * 1024
 
   EPISODE_TITLE = 'title'
   EPISODE_URL = 'url'
   EPISODE_PUBLISHED = 'published'
+  # Downloaded file and its size, as long as it
+  # is kept (not set by older versions)
+  EPISODE_PATH = 'path'
+  EPISODE_SIZE = 'size'
 
-  def __init__(self, config: ConfigFile, feed_name: str):
+  def __init__(self, config: ConfigFile, feed_name: str, journal: bool = False):
     """
     CTOR for EpisodeTracker.
     """
     data_dir = Path(config.settings().data_dir())
     # Ensure folder structure for data
     # dir exists. If not, create it.
-    if not data_dir.exists():
-      data_dir.mkdir(parents=True)
+    # Trackers may be created from several
+    # feed refresh threads at once.
+    data_dir.mkdir(parents=True, exist_ok=True)
+    self.__lock = Lock()
+    self.__journal = journal
     self.__completed_downloads: list[dict[str, str]] = []
     self.__completed_file = data_dir.joinpath(
       f'{feed_name}.{self.COMPLETED_FILES_EXTENSION}'
     )
+    self.__journal_file = data_dir.joinpath(
+      f'{feed_name}.{self.JOURNAL_FILES_EXTENSION}'
+    )
+    self.__unfinished_file = data_dir.joinpath(
+      f'{feed_name}.{self.UNFINISHED_FILES_EXTENSION}'
+    )
+    # Episodes offered for download, None until offer()
+    self.__offered: list[Entry] | None = None
     try:
       with open(self.__completed_file) as fd:
         self.__completed_downloads = loads(fd.read())
@@ -42,32 +77,169 @@ class EpisodeTracker:
       # File not yet created or deleted,
       # keep empty array and ignore exception.
       pass
+    # Replay the journal, even if journal mode is
+    # off by now, so no completed episode is lost.
+    self.__replay_journal()
 
-  def complete(self, entry: Entry) -> None:
+  def __replay_journal(self) -> None:
     """
-    Register completed download
-    of an episode.
+    Add journal entries not yet in the
+    completed downloads list.
     """
-    self.__completed_downloads.append(
-      {
-        self.EPISODE_TITLE: entry.title(),
-        self.EPISODE_URL: entry.enclosure(),
-        self.EPISODE_PUBLISHED: str(entry.published()),
-      }
-    )
+    try:
+      with open(self.__journal_file) as fd:
+        lines = fd.readlines()
+    except FileNotFoundError:
+      return
+    # A crash during compaction may leave entries
+    # in the journal which are in the JSON file, too.
+    known = self.already_downloaded_links()
+    for line in lines:
+      try:
+        episode = loads(line)
+      except JSONDecodeError:
+        # Last line cut off by a crash
+        continue
+      if episode[self.EPISODE_URL] not in known:
+        known.add(episode[self.EPISODE_URL])
+        self.__completed_downloads.append(episode)
+
+  def complete(self, entry: Entry, path: Path | None = None) -> None:
+    """
+    Register completed download of an
+    episode, stored in file path.
+    """
+    episode = {
+      self.EPISODE_TITLE: entry.title(),
+      self.EPISODE_URL: entry.enclosure(),
+      self.EPISODE_PUBLISHED: str(entry.published()),
+    }
+    if path is not None:
+      episode[self.EPISODE_PATH] = str(path.absolute())
+      episode[self.EPISODE_SIZE] = path.stat().st_size
+    with self.__lock:
+      self.__completed_downloads.append(episode)
+      if self.__journal:
+        with open(self.__journal_file, 'a') as fd:
+          fd.write(dumps(episode) + '\n')
+          fd.flush()
+          os.fsync(fd.fileno())
 
   def save(self) -> None:
     """
     Save current download state.
+    In journal mode, everything is saved
+    already, only compact large journals.
+    """
+    if not self.__journal:
+      self.compact()
+      return
+    try:
+      journal_size = self.__journal_file.stat().st_size
+    except FileNotFoundError:
+      return
+    if journal_size >= self.JOURNAL_COMPACT_SIZE:
+      self.compact()
+
+  def close(self) -> None:
+    """
+    Fold the journal into the JSON file
+    at the end of a run and remember the
+    oldest offered episode not downloaded.
+    """
+    if self.__journal_file.exists():
+      self.compact()
+    if self.__offered is not None:
+      downloaded = self.already_downloaded_links()
+      self.__store_unfinished(
+        [entry for entry in self.__offered if entry.enclosure() not in downloaded]
+      )
+      self.__offered = None
+
+  def offer(self, entries: list[Entry]) -> None:
+    """
+    Remember the episodes offered for download.
+    Until close(), all of them count as unfinished,
+    so an aborted run can't hide older ones.
+    """
+    self.__offered = list(entries)
+    self.__store_unfinished(self.__offered)
+
+  def __store_unfinished(self, entries: list[Entry]) -> None:
+    """
+    Write the publish date of the oldest
+    of entries, or drop it if empty.
+    """
+    if len(entries) == 0:
+      self.__unfinished_file.unlink(missing_ok=True)
+      return
+    oldest = min(entry.published() for entry in entries)
+    self.__unfinished_file.write_text(str(oldest))
+
+  def unfinished(self) -> datetime | None:
+    """
+    Return the publish date of the oldest
+    episode offered but not downloaded.
+    """
+    try:
+      return datetime.fromisoformat(self.__unfinished_file.read_text())
+    except (FileNotFoundError, ValueError):
+      return None
+
+  def compact(self) -> None:
+    """
+    Write all completed downloads to the JSON
+    file and drop the journal. The JSON file is
+    replaced atomically, a crash leaves either
+    the old or the new file.
+    """
+    backend = 'journal' if self.__journal else 'json'
+    with self.__lock, Metrics.timer('tracker_save', backend=backend):
+      temp_file = self.__completed_file.with_suffix('.tmp')
+      with open(temp_file, 'w') as fd:
+        fd.write(dumps(self.__completed_downloads))
+        fd.flush()
+        os.fsync(fd.fileno())
+      os.replace(temp_file, self.__completed_file)
+      self.__journal_file.unlink(missing_ok=True)
+
+  def episodes(self) -> list[dict[str, str | int]]:
+    """
+    Return all downloaded episodes.
+    """
+    with self.__lock:
+      return list(self.__completed_downloads)
+
+  def stored_episodes(self) -> list[dict[str, str | int]]:
+    """
+    Return downloaded episodes whose file is kept,
+    sorted from oldest to newest.
+    """
+    with self.__lock:
+      stored = [
+        episode
+        for episode in self.__completed_downloads
+        if self.EPISODE_PATH in episode
+      ]
+    return sorted(stored, key=lambda e: e[self.EPISODE_PUBLISHED])
+
+  def forget_files(self, urls: set[str]) -> None:
+    """
+    Drop the files of episodes (e.g. deleted by
+    retention), the episodes stay downloaded.
     """
-    with open(self.__completed_file, 'w') as fd:
-      fd.write(dumps(self.__completed_downloads))
+    with self.__lock:
+      for episode in self.__completed_downloads:
+        if episode[self.EPISODE_URL] in urls:
+          episode.pop(self.EPISODE_PATH, None)
+          episode.pop(self.EPISODE_SIZE, None)
+    self.compact()
 
-  def already_downloaded_links(self) -> list[str]:
+  def already_downloaded_links(self) -> set[str]:
     """
-    List of already downloaded episodes (URL links).
+    Set of already downloaded episodes (URL links).
     """
-    return [x[self.EPISODE_URL] for x in self.__completed_downloads]
+    return {x[self.EPISODE_URL] for x in self.__completed_downloads}
 
   def latest_entry(self) -> dict[str, str] | None:
     """
@@ -0,0 +1,49 @@
+"""
+Create an episode tracker for
+the configured storage backend.
+"""
+
+from config_file import ConfigFile
+from episode_tracker import EpisodeTracker
+from exception import PodcastCatcherError
+from metrics import Metrics
+from sqlite_episode_tracker import SqliteEpisodeTracker
+
+
+class EpisodeTrackerFactory:
+  """
+  Select the episode tracker
+  implementation by config.
+  """
+
+  BACKEND_JSON = 'json'
+  BACKEND_JOURNAL = 'journal'
+  BACKEND_SQLITE = 'sqlite'
+
+  BACKENDS = [BACKEND_JSON, BACKEND_JOURNAL, BACKEND_SQLITE]
+
+  @classmethod
+  def create(
+    cls, config: ConfigFile, feed_name: str
+  ) -> EpisodeTracker | SqliteEpisodeTracker:
+    """
+    Create (and load) tracker of feed_name.
+    """
+    backend = config.settings().tracker_backend()
+    with Metrics.timer('tracker_load', backend=backend):
+      return cls.__create(config, feed_name, backend)
+
+  @classmethod
+  def __create(
+    cls, config: ConfigFile, feed_name: str, backend: str
+  ) -> EpisodeTracker | SqliteEpisodeTracker:
+    """
+    Create tracker of feed_name for backend.
+    """
+    if backend == cls.BACKEND_JSON:
+      return EpisodeTracker(config, feed_name)
+    if backend == cls.BACKEND_JOURNAL:
+      return EpisodeTracker(config, feed_name, journal=True)
+    if backend == cls.BACKEND_SQLITE:
+      return SqliteEpisodeTracker(config, feed_name)
+    raise PodcastCatcherError(f"Unknown tracker backend '{backend}'")
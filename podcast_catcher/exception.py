@@ -9,3 +9,50 @@ class PodcastCatcherError(Exception):
   """
 
   pass
+
+
+class HttpStatusError(PodcastCatcherError):
+  """
+  HTTP request answered with an
+  unexpected status code.
+  """
+
+  def __init__(self, message: str, status: int, retry_after: float | None = None):
+    """
+    CTOR for HttpStatusError, retry_after
+    in seconds as requested by the server.
+    """
+    super().__init__(message)
+    self.__status = status
+    self.__retry_after = retry_after
+
+  def status(self) -> int:
+    """
+    Return HTTP status code.
+    """
+    return self.__status
+
+  def retry_after(self) -> float | None:
+    """
+    Return seconds to wait before retrying
+    (Retry-After header), None if not sent.
+    """
+    return self.__retry_after
+
+
+class DownloadDeferredError(PodcastCatcherError):
+  """
+  Download skipped, it may only start
+  in the next full speed window.
+  """
+
+  pass
+
+
+class HostUnavailableError(PodcastCatcherError):
+  """
+  Request skipped, the host failed too
+  often (circuit breaker is open).
+  """
+
+  pass
@@ -2,38 +2,71 @@
 Abstraction of a feed.
 """
 
+import zlib
 from datetime import UTC, datetime
-from sys import stderr
-from time import mktime
+from sys import intern, stderr
+from time import mktime, perf_counter, struct_time
 
-import feedparser
+from enclosure_policy import EnclosurePolicy
+from exception import PodcastCatcherError
+from metrics import Metrics
 
 
 class Entry:
   """
   Entry within a feed.
+
+  Kept compact, as feeds hold thousands of them:
+  slots instead of a per-instance dict, authors
+  and tags interned (usually the same for all
+  entries) and long summaries (HTML show notes)
+  stored zlib compressed. A summary is only
+  decompressed when summary() is called, e.g. by
+  a template using %episode_summary%.
   """
 
+  __slots__ = (
+    '__author',
+    '__enclosure',
+    '__link',
+    '__published',
+    '__summary',
+    '__title',
+    '__tags',
+    '__alternatives',
+  )
+
+  # Summaries of at least this many characters
+  # are compressed, shorter ones aren't worth it.
+  COMPRESS_SIZE = 256
+
   def __init__(
     self,
     author: str,
     enclosure: str,
     link: str | None,
     published: datetime,
-    summary: str,
+    summary: str | bytes,
     title: str,
     tags: list[str],
+    alternatives: list[str] | None = None,
   ):
     """
-    CTOR for entry element.
+    CTOR for entry element. summary may also
+    be given as returned by packed_summary().
+    alternatives are the URLs of the other
+    enclosures offered for the entry.
     """
-    self.__author = author
+    self.__author = intern(author)
     self.__enclosure = enclosure
     self.__link = link if link is not None else ''
     self.__published = published
+    if isinstance(summary, str) and len(summary) >= self.COMPRESS_SIZE:
+      summary = zlib.compress(summary.encode(), 1)
     self.__summary = summary
     self.__title = title
-    self.__tags = tags
+    self.__tags = tuple(intern(tag) for tag in tags)
+    self.__alternatives = tuple(alternatives) if alternatives is not None else ()
 
   def author(self) -> str:
     """
@@ -49,6 +82,13 @@ class Entry:
     """
     return self.__enclosure
 
+  def alternatives(self) -> list[str]:
+    """
+    URLs of the other enclosures offered,
+    but not chosen, for the entry.
+    """
+    return list(self.__alternatives)
+
   def published(self) -> datetime:
     """
     Time the entry was published.
@@ -59,6 +99,15 @@ class Entry:
     """
     Summary of the entry.
     """
+    if isinstance(self.__summary, bytes):
+      return zlib.decompress(self.__summary).decode()
+    return self.__summary
+
+  def packed_summary(self) -> str | bytes:
+    """
+    Summary as stored (compressed if it is
+    bytes), to persist it without decoding.
+    """
     return self.__summary
 
   def title(self) -> str:
@@ -71,7 +120,7 @@ class Entry:
     """
     Return list of tags.
     """
-    return self.__tags
+    return list(self.__tags)
 
   def link(self) -> str:
     """
@@ -93,7 +142,7 @@ class Entry:
       f"summary: '{self.summary()}'",
       f"tags: '{self.tags()}'",
     ]
-    return f'{{{', '.join(items)}}}'
+    return f'{{{", ".join(items)}}}'
 
 
 class Feed:
@@ -107,51 +156,92 @@ class Feed:
   TAG_LINK = 'link'
   TAG_UPDATED_PARSED = 'updated_parsed'
   TAG_PUBLISHED_PARSED = 'published_parsed'
+  TAG_TTL = 'ttl'
+  TAG_UPDATE_PERIOD = 'sy_updateperiod'
+  TAG_UPDATE_FREQUENCY = 'sy_updatefrequency'
+
+  # Seconds of the sy:updatePeriod values
+  UPDATE_PERIODS = {
+    'hourly': 60 * 60,
+    'daily': 24 * 60 * 60,
+    'weekly': 7 * 24 * 60 * 60,
+    'monthly': 30 * 24 * 60 * 60,
+    'yearly': 365 * 24 * 60 * 60,
+  }
 
-  def __init__(self, feed_text: str):
+  TAG_ENCLOSURE_TYPE = 'type'
+  TAG_ENCLOSURE_LENGTH = 'length'
+  TAG_DURATION = 'itunes_duration'
+
+  def __init__(self, feed_text: str, enclosure_policy: EnclosurePolicy | None = None):
     """
-    COTR: Parse feed from string.
+    COTR: Parse feed from string. Of several
+    enclosures of an entry, the one preferred
+    by enclosure_policy is used (default:
+    the first one).
     """
+    # feedparser takes long to import and is
+    # only needed once a feed is parsed.
+    import feedparser
+
+    start = perf_counter()
     parsed: feedparser.FeedParserDict = feedparser.parse(feed_text)
-    self.__title = parsed.feed.title
-    self.__subtitle = parsed.feed.subtitle
-    self.__description = parsed.feed.description
-    if self.TAG_LINK in parsed.feed:
-      self.__link = parsed.feed.link
-    else:
-      self.__link = None
+    Metrics.observe('feed_parse', perf_counter() - start, parser='feedparser')
+    # feedparser flags recoverable errors as bozo, too,
+    # only fail if nothing usable was parsed.
+    if len(parsed.entries) == 0 and (parsed.bozo or parsed.get('version', '') == ''):
+      reason = parsed.get('bozo_exception', 'no RSS or Atom document')
+      raise PodcastCatcherError(f'Not a feed ({reason})')
+    self.__title = parsed.feed.get('title', '')
+    self.__subtitle = parsed.feed.get('subtitle', '')
+    self.__description = parsed.feed.get('description', '')
+    self.__link = parsed.feed.get(self.TAG_LINK)
     # feedparser uses the fallback to 'published_parsed' if
     # 'updated_parsed' doesn't exist, but this mapping is
     # temporarily and may be removed in the future. Mapping
     # is added here as well to be future-proof.
     if self.TAG_UPDATED_PARSED in parsed.feed:
-      self.__updated = datetime.fromtimestamp(
-        timestamp=mktime(parsed.feed.updated_parsed),
-        tz=UTC,
-      )
+      self.__updated = self.to_datetime(parsed.feed.updated_parsed)
     elif self.TAG_PUBLISHED_PARSED in parsed.feed:
-      self.__updated = datetime.fromtimestamp(
-        timestamp=mktime(parsed.feed.published_parsed),
-        tz=UTC,
-      )
+      self.__updated = self.to_datetime(parsed.feed.published_parsed)
     else:
       # TODO: Better solution?
       self.__updated = datetime.now(tz=UTC)
+    self.__update_interval = self.to_update_interval(
+      ttl=parsed.feed.get(self.TAG_TTL),
+      update_period=parsed.feed.get(self.TAG_UPDATE_PERIOD),
+      update_frequency=parsed.feed.get(self.TAG_UPDATE_FREQUENCY),
+    )
 
     self.__entries: list[Entry] = []
     for entry in parsed.entries:
+      title = entry.get('title', '')
       if len(entry.enclosures) < 1:
         print(
-          f"Feed '{self.title()}' episode '{entry.title}' has no enclosures"
+          f"Feed '{self.title()}' episode '{title}' has no enclosures"
           ' -> skipping episode.',
           file=stderr,
         )
         continue
-      author = entry.author if self.TAG_AUTHOR in entry else entry.title
-      enclosure = entry.enclosures[0].href
-      if len(entry.enclosures) > 1:
-        # TODO: Support preferred enclosure format
-        print(f"Feed '{self.title()}' supports multiple encosure options", file=stderr)
+      author = entry.author if self.TAG_AUTHOR in entry else title
+      index = 0
+      if len(entry.enclosures) > 1 and enclosure_policy is not None:
+        index = enclosure_policy.select(
+          [
+            (
+              enclosure.get(self.TAG_ENCLOSURE_TYPE),
+              EnclosurePolicy.parse_length(enclosure.get(self.TAG_ENCLOSURE_LENGTH)),
+            )
+            for enclosure in entry.enclosures
+          ],
+          EnclosurePolicy.parse_duration(entry.get(self.TAG_DURATION)),
+        )
+      enclosure = entry.enclosures[index].href
+      alternatives = [
+        other.href
+        for position, other in enumerate(entry.enclosures)
+        if position != index
+      ]
       tags = []
       if self.TAG_TAGS in entry:
         tags = [term[self.TAG_TERM_KEY] for term in entry.tags]
@@ -160,18 +250,79 @@ class Feed:
         Entry(
           author=author,
           enclosure=enclosure,
-          published=datetime.fromtimestamp(
-            timestamp=mktime(entry.published_parsed),
-            tz=UTC,
-          ),
-          summary=entry.summary,
+          published=self.to_datetime(entry.published_parsed),
+          summary=entry.get('summary', ''),
           # tag scheme and label are ignored
           tags=tags,
-          title=entry.title,
+          title=title,
           link=link,
+          alternatives=alternatives,
         )
       )
 
+  @classmethod
+  def from_values(
+    cls,
+    title: str,
+    subtitle: str,
+    description: str,
+    link: str | None,
+    updated: datetime,
+    entries: list[Entry],
+    update_interval: float | None = None,
+  ) -> 'Feed':
+    """
+    Create a feed from already parsed values
+    (e.g. a snapshot) without parsing text.
+    """
+    feed = cls.__new__(cls)
+    feed.__title = title
+    feed.__subtitle = subtitle
+    feed.__description = description
+    feed.__link = link
+    feed.__updated = updated
+    feed.__entries = entries
+    feed.__update_interval = update_interval
+    return feed
+
+  @classmethod
+  def to_update_interval(
+    cls,
+    ttl: str | None,
+    update_period: str | None,
+    update_frequency: str | None,
+  ) -> float | None:
+    """
+    Convert the update hints of a feed to
+    seconds: <ttl> (minutes) of RSS 2.0 or
+    sy:updatePeriod/sy:updateFrequency of the
+    syndication module. None if there are no
+    (valid) hints, the larger one otherwise.
+    """
+    intervals = []
+    try:
+      if ttl is not None and float(ttl) > 0:
+        intervals.append(float(ttl) * 60)
+    except ValueError:
+      pass
+    if update_period is not None and update_period.strip() in cls.UPDATE_PERIODS:
+      frequency = 1.0
+      try:
+        if update_frequency is not None and float(update_frequency) > 0:
+          frequency = float(update_frequency)
+      except ValueError:
+        pass
+      intervals.append(cls.UPDATE_PERIODS[update_period.strip()] / frequency)
+    return max(intervals, default=None)
+
+  @staticmethod
+  def to_datetime(parsed: struct_time) -> datetime:
+    """
+    Convert a parsed (UTC) time
+    to a datetime instance.
+    """
+    return datetime.fromtimestamp(timestamp=mktime(parsed), tz=UTC)
+
   def title(self) -> str:
     """
     Return title of feed.
@@ -202,6 +353,13 @@ class Feed:
     """
     return self.__updated
 
+  def update_interval(self) -> float | None:
+    """
+    Seconds between updates the feed
+    suggests, None if it has no hints.
+    """
+    return self.__update_interval
+
   def entries(self, newer_than: datetime | None = None) -> list[Entry]:
     """
     Return a list of entries in this feed.
@@ -226,4 +384,4 @@ class Feed:
       f"updated: '{self.updated()}'",
       f"episodes: '{self.entries()}'",
     ]
-    return f'{{{', '.join(items)}}}'
+    return f'{{{", ".join(items)}}}'
@@ -0,0 +1,114 @@
+"""
+Persistent cache of HTTP validators
+(ETag, Last-Modified, body hash) per feed.
+"""
+
+from json import JSONDecodeError, dumps, loads
+from os import replace
+from pathlib import Path
+from threading import Lock
+
+
+class FeedCache:
+  """
+  Remember how a feed looked like the last time
+  it was fully processed, so unchanged feeds can
+  be skipped via conditional GET requests.
+
+  Validators of a fresh response are only staged.
+  They are persisted by confirm() once all new
+  episodes of the feed were handled, otherwise an
+  aborted run would hide episodes behind a 304.
+  """
+
+  # Own directory, data_dir itself holds
+  # the <feed name>.json tracker files.
+  CACHE_DIR = 'feed_cache'
+  CACHE_FILE = 'validators.json'
+
+  KEY_ETAG = 'etag'
+  KEY_LAST_MODIFIED = 'last_modified'
+  KEY_BODY_HASH = 'body_hash'
+
+  def __init__(self, data_dir: str):
+    """
+    CTOR for FeedCache, loads
+    the cache file if it exists.
+    """
+    path = Path(data_dir).joinpath(self.CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    self.__cache_file = path.joinpath(self.CACHE_FILE)
+    self.__lock = Lock()
+    self.__staged: dict[str, dict[str, str | None]] = {}
+    self.__validators: dict[str, dict[str, str | None]] = {}
+    try:
+      with open(self.__cache_file) as fd:
+        self.__validators = loads(fd.read())
+    except (FileNotFoundError, JSONDecodeError):
+      # Missing or broken cache, every
+      # feed is downloaded in full.
+      pass
+
+  def request_headers(self, url: str) -> dict[str, str]:
+    """
+    Headers for a conditional GET of the feed.
+    """
+    with self.__lock:
+      validators = self.__validators.get(url, {})
+    headers = {}
+    if validators.get(self.KEY_ETAG) is not None:
+      headers['If-None-Match'] = validators[self.KEY_ETAG]
+    if validators.get(self.KEY_LAST_MODIFIED) is not None:
+      headers['If-Modified-Since'] = validators[self.KEY_LAST_MODIFIED]
+    return headers
+
+  def body_hash(self, url: str) -> str | None:
+    """
+    Hash of the last processed feed body.
+    """
+    with self.__lock:
+      return self.__validators.get(url, {}).get(self.KEY_BODY_HASH)
+
+  def latest_body_hash(self, url: str) -> str | None:
+    """
+    Hash of the last fetched feed body,
+    even if it is not confirmed yet.
+    """
+    with self.__lock:
+      if url in self.__staged:
+        return self.__staged[url][self.KEY_BODY_HASH]
+      return self.__validators.get(url, {}).get(self.KEY_BODY_HASH)
+
+  def stage(
+    self,
+    url: str,
+    etag: str | None,
+    last_modified: str | None,
+    body_hash: str,
+  ) -> None:
+    """
+    Remember validators of a fresh response
+    until the feed is confirmed.
+    """
+    with self.__lock:
+      self.__staged[url] = {
+        self.KEY_ETAG: etag,
+        self.KEY_LAST_MODIFIED: last_modified,
+        self.KEY_BODY_HASH: body_hash,
+      }
+
+  def confirm(self, url: str) -> None:
+    """
+    Persist staged validators of a feed,
+    after it was processed completely.
+    """
+    with self.__lock:
+      if url not in self.__staged:
+        return
+      self.__validators[url] = self.__staged.pop(url)
+      # Write to a temporary file first, a crash
+      # must not leave a truncated cache behind.
+      temp_file = self.__cache_file.with_suffix('.tmp')
+      with open(temp_file, 'w') as fd:
+        fd.write(dumps(self.__validators))
+      replace(temp_file, self.__cache_file)
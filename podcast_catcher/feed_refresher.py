@@ -0,0 +1,354 @@
+"""
+Fetch and parse feeds concurrently.
+"""
+
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sys import stderr
+from time import perf_counter
+from xml.etree.ElementTree import ParseError
+
+from config_file import ConfigFile
+from enclosure_index import EnclosureIndex
+from episode_tracker import EpisodeTracker
+from episode_tracker_factory import EpisodeTrackerFactory
+from exception import PodcastCatcherError
+from feed import Entry, Feed
+from feed_snapshot import FeedSnapshot
+from http_loader import HttpLoader
+from metrics import Metrics
+from sqlite_episode_tracker import SqliteEpisodeTracker
+from stream_feed import StreamFeed
+
+
+class FeedRefresher:
+  """
+  Refresh feeds (download, parse and filter
+  already downloaded episodes) on a pool of
+  worker threads.
+  """
+
+  class Result:
+    """
+    Outcome of refreshing a single feed.
+    """
+
+    def __init__(
+      self,
+      config_feed: ConfigFile.Feed,
+      feed: Feed | StreamFeed | None,
+      episode_tracker: EpisodeTracker | SqliteEpisodeTracker | None,
+      entries: list[Entry],
+      duration: float,
+      error: PodcastCatcherError | None = None,
+    ):
+      """
+      CTOR for Result class.
+      """
+      self.__config_feed = config_feed
+      self.__feed = feed
+      self.__episode_tracker = episode_tracker
+      self.__entries = entries
+      self.__duration = duration
+      self.__error = error
+
+    def config_feed(self) -> ConfigFile.Feed:
+      """
+      Return feed configuration.
+      """
+      return self.__config_feed
+
+    def feed(self) -> Feed | StreamFeed | None:
+      """
+      Return parsed feed, None if the feed
+      is unchanged since the last run.
+      """
+      return self.__feed
+
+    def is_modified(self) -> bool:
+      """
+      Return if the feed changed since
+      the last run.
+      """
+      return self.__feed is not None
+
+    def error(self) -> PodcastCatcherError | None:
+      """
+      Return why the refresh failed,
+      None if it succeeded.
+      """
+      return self.__error
+
+    def episode_tracker(self) -> EpisodeTracker | SqliteEpisodeTracker | None:
+      """
+      Return episode tracker of the feed,
+      None if the feed is unchanged or
+      the refresh failed.
+      """
+      return self.__episode_tracker
+
+    def entries(self) -> list[Entry]:
+      """
+      Return new entries, sorted from
+      oldest to newest.
+      """
+      return self.__entries
+
+    def duration(self) -> float:
+      """
+      Return time in seconds it took
+      to refresh the feed.
+      """
+      return self.__duration
+
+  def __init__(
+    self,
+    config: ConfigFile,
+    loader: HttpLoader,
+    snapshots: FeedSnapshot | None = None,
+    keep_trackers: bool = False,
+  ):
+    """
+    CTOR for FeedRefresher. If keep_trackers
+    is set, the episode tracker of each feed
+    is loaded once and reused by later
+    refreshes (e.g. in daemon mode).
+    """
+    self.__config = config
+    self.__loader = loader
+    self.__snapshots = snapshots
+    self.__trackers: dict[str, EpisodeTracker | SqliteEpisodeTracker] | None = (
+      {} if keep_trackers else None
+    )
+
+  def episode_tracker(self, feed_name: str) -> EpisodeTracker | SqliteEpisodeTracker:
+    """
+    Episode tracker of a feed, loaded
+    once if trackers are kept.
+    """
+    if self.__trackers is None:
+      return EpisodeTrackerFactory.create(self.__config, feed_name)
+    if feed_name not in self.__trackers:
+      self.__trackers[feed_name] = EpisodeTrackerFactory.create(
+        self.__config, feed_name
+      )
+    return self.__trackers[feed_name]
+
+  def refresh(self, config_feed: ConfigFile.Feed) -> Result:
+    """
+    Download and parse a single feed and
+    filter out already downloaded episodes.
+    A failure is returned as result, so
+    other feeds aren't affected.
+    """
+    start = perf_counter()
+    try:
+      # Download feed
+      feed_text = self.__loader.get_feed(
+        url=config_feed.url(),
+        verify_https=config_feed.is_strict_https(),
+      )
+      return self.process(config_feed, feed_text, start)
+    except PodcastCatcherError as e:
+      return self.failed(config_feed, e, start)
+
+  def failed(
+    self, config_feed: ConfigFile.Feed, error: PodcastCatcherError, start: float
+  ) -> Result:
+    """
+    Return the result of a feed whose refresh failed,
+    start is the perf_counter() value the
+    refresh started at.
+    """
+    Metrics.count('feeds_failed', feed=config_feed.name())
+    duration = perf_counter() - start
+    Metrics.observe('feed_refresh', duration, feed=config_feed.name())
+    return self.Result(
+      config_feed=config_feed,
+      feed=None,
+      episode_tracker=None,
+      entries=[],
+      duration=duration,
+      error=error,
+    )
+
+  def process(
+    self, config_feed: ConfigFile.Feed, feed_text: str | None, start: float
+  ) -> Result:
+    """
+    Parse a downloaded feed and filter out already
+    downloaded episodes. feed_text is None for an
+    unchanged feed, start is the perf_counter()
+    value the refresh started at. A feed which
+    can't be parsed is returned as failed result.
+    """
+    if feed_text is None:
+      # Feed not modified, skip parsing and filtering
+      Metrics.count('feeds_not_modified')
+      duration = perf_counter() - start
+      Metrics.observe('feed_refresh', duration, feed=config_feed.name())
+      return self.Result(
+        config_feed=config_feed,
+        feed=None,
+        episode_tracker=None,
+        entries=[],
+        duration=duration,
+      )
+
+    episode_tracker = self.episode_tracker(config_feed.name())
+
+    # Already downloaded episodes. Other enclosures of
+    # an entry count as well, so a changed enclosure
+    # policy doesn't download episodes again.
+    already_downloaded = episode_tracker.already_downloaded_links()
+    normalize = self.__config.settings().dedup() != EnclosureIndex.MODE_OFF
+    if normalize:
+      # Also if only tracking parts of the URL changed
+      already_downloaded = {EnclosureIndex.normalize(url) for url in already_downloaded}
+
+    def is_new(entry: Entry) -> bool:
+      """
+      Return if entry is still to be downloaded.
+      """
+      return self.__is_new(
+        entry, already_downloaded, normalize, config_feed.skip_older_than()
+      )
+
+    # Parse feed. Whatever a broken feed
+    # raises, only this feed fails.
+    try:
+      if self.__config.settings().incremental_parse():
+        parsed_feed, candidates = self.__parse_incremental(
+          feed_text, config_feed, episode_tracker, is_new
+        )
+      else:
+        parsed_feed = Feed(
+          feed_text=feed_text, enclosure_policy=config_feed.enclosure_policy()
+        )
+        candidates = parsed_feed.entries()
+    except PodcastCatcherError as e:
+      return self.failed(config_feed, e, start)
+    except Exception as e:
+      return self.failed(
+        config_feed, PodcastCatcherError(f'Feed parse error: {e!r}'), start
+      )
+    # Incrementally parsed feeds lack older
+    # entries, only snapshot complete feeds.
+    if self.__snapshots is not None and isinstance(parsed_feed, Feed):
+      self.__snapshots.save(config_feed, parsed_feed)
+
+    # Filter out already downloaded episodes
+    # and episodes older than skip_older_than
+    entries = [entry for entry in candidates if is_new(entry)]
+    # Sort entries from oldest to newest
+    entries.sort(key=lambda e: e.published())
+    episode_tracker.offer(entries)
+    duration = perf_counter() - start
+    Metrics.observe('feed_refresh', duration, feed=config_feed.name())
+    return self.Result(
+      config_feed=config_feed,
+      feed=parsed_feed,
+      episode_tracker=episode_tracker,
+      entries=entries,
+      duration=duration,
+    )
+
+  @staticmethod
+  def __is_new(
+    entry: Entry,
+    already_downloaded: set[str],
+    normalize: bool,
+    skip_older_than: datetime | None,
+  ) -> bool:
+    """
+    Return if entry is not older than skip_older_than
+    and none of its enclosures is in already_downloaded,
+    compared by normalized URL if normalize is set.
+    """
+    if skip_older_than is not None and entry.published() < skip_older_than:
+      return False
+    for url in [entry.enclosure(), *entry.alternatives()]:
+      if normalize:
+        url = EnclosureIndex.normalize(url)
+      if url in already_downloaded:
+        return False
+    return True
+
+  @staticmethod
+  def __parse_incremental(
+    feed_text: str,
+    config_feed: ConfigFile.Feed,
+    episode_tracker: EpisodeTracker | SqliteEpisodeTracker,
+    is_new: Callable[[Entry], bool],
+  ) -> tuple[Feed | StreamFeed, list[Entry]]:
+    """
+    Parse feed with StreamFeed, which stops at items
+    older than the newest downloaded episode (or
+    skip_older_than), but never above an episode
+    not downloaded by an earlier run (e.g. a failed
+    download) or an item which is_new. Falls back
+    to Feed for documents StreamFeed can't handle.
+    """
+    stop_before = None
+    latest_entry = episode_tracker.latest_entry()
+    if latest_entry is not None:
+      stop_before = datetime.fromisoformat(
+        latest_entry[EpisodeTracker.EPISODE_PUBLISHED]
+      )
+      unfinished = episode_tracker.unfinished()
+      if unfinished is not None and unfinished < stop_before:
+        stop_before = unfinished
+    skip_older_than = config_feed.skip_older_than()
+    if skip_older_than is not None and (
+      stop_before is None or skip_older_than > stop_before
+    ):
+      stop_before = skip_older_than
+    try:
+      with Metrics.timer('feed_parse', parser='stream'):
+        stream_feed = StreamFeed(
+          feed_text=feed_text,
+          stop_before=stop_before,
+          enclosure_policy=config_feed.enclosure_policy(),
+          is_new=is_new,
+        )
+        return stream_feed, list(stream_feed.entries())
+    except (PodcastCatcherError, ParseError) as e:
+      print(
+        f"Feed '{config_feed.name()}': incremental parsing failed ({e}),"
+        ' parsing the full feed.',
+        file=stderr,
+      )
+      parsed_feed = Feed(
+        feed_text=feed_text, enclosure_policy=config_feed.enclosure_policy()
+      )
+      return parsed_feed, parsed_feed.entries()
+
+  def refresh_all(
+    self, config_feeds: list[ConfigFile.Feed] | None = None
+  ) -> Iterator[Result]:
+    """
+    Refresh all enabled feeds (or the given
+    ones). Feeds are processed concurrently,
+    but results are yielded in order, so the
+    output of each feed stays grouped.
+    """
+    if config_feeds is None:
+      config_feeds = [feed for feed in self.__config.feeds() if feed.is_enabled()]
+    workers = self.__config.settings().feed_workers()
+    if workers <= 1:
+      for config_feed in config_feeds:
+        yield self.refresh(config_feed)
+      return
+    with ThreadPoolExecutor(
+      max_workers=workers, thread_name_prefix='feed_refresher'
+    ) as executor:
+      futures = [executor.submit(self.refresh, feed) for feed in config_feeds]
+      try:
+        for future in futures:
+          yield future.result()
+      finally:
+        # Don't start pending refreshes if the
+        # consumer stops early (error or CTRL-C).
+        for future in futures:
+          future.cancel()
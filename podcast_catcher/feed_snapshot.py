@@ -0,0 +1,156 @@
+"""
+Persist parsed feeds for offline use.
+"""
+
+import marshal
+import os
+from datetime import UTC, datetime
+from pathlib import Path
+from time import time
+
+from config_file import ConfigFile
+from feed import Entry, Feed
+from feed_cache import FeedCache
+
+
+class FeedSnapshot:
+  """
+  Compact binary snapshot of each parsed feed
+  (metadata and entries) in data_dir, so listings
+  can be answered without network access.
+
+  A snapshot is invalid once the feed cache knows
+  a different feed body than the snapshot was made
+  from, or if it is older than the requested age.
+  """
+
+  SNAPSHOT_DIR = 'snapshots'
+  SNAPSHOT_EXTENSION = 'snapshot'
+
+  # Increment on layout changes, older
+  # snapshots are ignored then.
+  FORMAT_VERSION = 4
+
+  def __init__(self, data_dir: str, feed_cache: FeedCache | None = None):
+    """
+    CTOR for FeedSnapshot.
+    """
+    self.__snapshot_dir = Path(data_dir).joinpath(self.SNAPSHOT_DIR)
+    self.__snapshot_dir.mkdir(parents=True, exist_ok=True)
+    self.__feed_cache = feed_cache
+
+  def __snapshot_file(self, config_feed: ConfigFile.Feed) -> Path:
+    """
+    Snapshot file of a feed.
+    """
+    return self.__snapshot_dir.joinpath(
+      f'{config_feed.name()}.{self.SNAPSHOT_EXTENSION}'
+    )
+
+  def __body_hash(self, config_feed: ConfigFile.Feed) -> str | None:
+    """
+    Hash of the feed body as known to
+    the feed cache, if there is one.
+    """
+    if self.__feed_cache is None:
+      return None
+    return self.__feed_cache.latest_body_hash(config_feed.url())
+
+  def save(self, config_feed: ConfigFile.Feed, feed: Feed) -> None:
+    """
+    Write snapshot of a parsed feed.
+    """
+    data = (
+      self.FORMAT_VERSION,
+      time(),
+      self.__body_hash(config_feed),
+      feed.title(),
+      feed.subtitle(),
+      feed.description(),
+      feed.link(),
+      feed.updated().timestamp(),
+      feed.update_interval(),
+      [
+        (
+          entry.author(),
+          entry.enclosure(),
+          entry.link(),
+          entry.published().timestamp(),
+          entry.packed_summary(),
+          entry.title(),
+          entry.tags(),
+          entry.alternatives(),
+        )
+        for entry in feed.entries()
+      ],
+    )
+    snapshot_file = self.__snapshot_file(config_feed)
+    temp_file = snapshot_file.with_suffix('.tmp')
+    with open(temp_file, 'wb') as fd:
+      marshal.dump(data, fd)
+    os.replace(temp_file, snapshot_file)
+
+  def load(
+    self, config_feed: ConfigFile.Feed, max_age: float | None = None
+  ) -> tuple[Feed, datetime] | None:
+    """
+    Load snapshot of a feed and the time it
+    was taken. Returns None if there is no
+    valid snapshot younger than max_age seconds.
+    """
+    try:
+      with open(self.__snapshot_file(config_feed), 'rb') as fd:
+        data = marshal.load(fd)
+    except (FileNotFoundError, EOFError, ValueError, TypeError):
+      return None
+    if not isinstance(data, tuple) or data[0] != self.FORMAT_VERSION:
+      return None
+    (
+      _,
+      created,
+      body_hash,
+      title,
+      subtitle,
+      description,
+      link,
+      updated,
+      update_interval,
+      entries,
+    ) = data
+    if max_age is not None and time() - created > max_age:
+      return None
+    current_hash = self.__body_hash(config_feed)
+    if body_hash is not None and current_hash is not None and body_hash != current_hash:
+      # Feed changed since the snapshot was taken
+      return None
+    feed = Feed.from_values(
+      title=title,
+      subtitle=subtitle,
+      description=description,
+      link=link,
+      updated=datetime.fromtimestamp(updated, tz=UTC),
+      update_interval=update_interval,
+      entries=[
+        Entry(
+          author=author,
+          enclosure=enclosure,
+          link=entry_link,
+          published=datetime.fromtimestamp(published, tz=UTC),
+          summary=summary,
+          title=entry_title,
+          tags=tags,
+          alternatives=alternatives,
+        )
+        for (
+          author,
+          enclosure,
+          entry_link,
+          published,
+          summary,
+          entry_title,
+          tags,
+          alternatives,
+        ) in entries
+      ],
+    )
+    return feed, datetime.fromtimestamp(created, tz=UTC)
@@ -3,8 +3,27 @@ Handle HTTP(S) requests to access
 the RSS/ATOM feed.
 """
 
-import requests
-from exception import PodcastCatcherError
+import os
+from collections.abc import Callable
+from hashlib import sha256
+from itertools import count
+from pathlib import Path
+from threading import Event
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse
+
+from exception import DownloadDeferredError, HttpStatusError, PodcastCatcherError
+from feed_cache import FeedCache
+from metrics import Metrics
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+
+if TYPE_CHECKING:
+  import hashlib
+
+  # requests takes long to import,
+  # it's loaded by the first loader.
+  import requests
 
 
 class HttpLoader:
@@ -15,24 +34,461 @@ class HttpLoader:
   library.
   """
 
-  def get_feed(self, url: str, verify_https: bool = True) -> str:
+  # Enclosures are already compressed media.
+  ENCLOSURE_HEADERS = {'Accept-Encoding': 'identity'}
+
+  PART_SUFFIX = '.part'
+  PART_META_SUFFIX = '.part.validator'
+
+  def __init__(
+    self,
+    feed_cache: FeedCache | None = None,
+    pool_size: int = 10,
+    connect_timeout: float = 10,
+    read_timeout: float = 60,
+    buffer_size: int = 1024 * 1024,
+    preallocate: bool = True,
+    rate_limiter: RateLimiter | None = None,
+    retry_policy: RetryPolicy | None = None,
+  ):
+    """
+    CTOR for HttpLoader. If a feed cache is
+    provided, feeds are fetched via conditional
+    GET requests.
+
+    Enclosures are streamed through a buffer of
+    buffer_size bytes. If preallocate is set and
+    the size is known, disk space for enclosures
+    is reserved up front (less fragmentation).
+    If a rate limiter is provided, it shapes
+    (and measures) all enclosure downloads.
+    If a retry policy is provided, transient
+    failures are retried by it.
+
+    All requests share one session, so connections
+    (and TLS sessions) are kept alive and reused.
+    """
+    self.__feed_cache = feed_cache
+    self.__timeout = (connect_timeout, read_timeout)
+    self.__buffer_size = buffer_size
+    self.__preallocate = preallocate
+    self.__rate_limiter = rate_limiter
+    self.__retry_policy = retry_policy
+    self.__cancelled = Event()
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+    # Feeds are text and compress well. The default covers
+    # all encodings urllib3 can decode (br, if brotli is
+    # installed).
+    self.__feed_headers = {'Accept-Encoding': DEFAULT_ACCEPT_ENCODING}
+    self.__session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    self.__session.mount('http://', adapter)
+    self.__session.mount('https://', adapter)
+
+  def close(self) -> None:
+    """
+    Close all pooled connections.
+    """
+    self.__session.close()
+
+  def cancel(self) -> None:
+    """
+    Stop running downloads after their current
+    buffer (the part files are kept for resume)
+    and refuse new ones. May be called from
+    any thread.
+    """
+    self.__cancelled.set()
+
+  def throughput(self) -> float | None:
+    """
+    Return current bytes per second of all downloads,
+    None without rate limiter.
+    """
+    if self.__rate_limiter is None:
+      return None
+    return self.__rate_limiter.throughput()
+
+  def __sleep(self, seconds: float, source: str) -> None:
+    """
+    Wait for the rate limiter,
+    unless cancelled first.
+    """
+    if self.__cancelled.wait(seconds):
+      raise PodcastCatcherError(f'Download of {source} cancelled')
+
+  def __retry(self, url: str, attempt: Callable[[], Any]) -> Any:
+    """
+    Run attempt (a request to url) and retry
+    it by the retry policy, if any.
+    """
+    if self.__retry_policy is None:
+      return attempt()
+    # Hosts on other ports are separate servers
+    host = urlparse(url).netloc
+    for number in count(1):
+      self.__retry_policy.check(host)
+      try:
+        result = attempt()
+      except Exception as e:
+        if not self.__retry_policy.is_transient(e):
+          if isinstance(e, HttpStatusError):
+            # The host answered, it's just not there
+            self.__retry_policy.succeeded(host)
+          raise
+        self.__retry_policy.failed(host, e)
+        delay = self.__retry_policy.delay(e, number)
+        if delay is None or not self.__retry_policy.available(host):
+          # Report the cause, not the breaker it opened
+          raise
+        Metrics.count('http_retries', host=host)
+        self.__sleep(delay, url)
+        continue
+      self.__retry_policy.succeeded(host)
+      return result
+
+  def get_feed(
+    self, url: str, verify_https: bool = True, use_cache: bool = True
+  ) -> str | None:
     """
     Fetch a feed via HTTP(S).
+    Returns None if the feed is unchanged
+    since it was processed the last time.
     """
+    import requests
+
+    feed_cache = self.__feed_cache if use_cache else None
+    headers = dict(self.__feed_headers)
+    if feed_cache is not None:
+      headers.update(feed_cache.request_headers(url))
     try:
-      request = requests.get(url, verify=verify_https)
-      if request.status_code != 200:
-        raise PodcastCatcherError(f'HTTP error for feed {url}: {request.status_code}')
-    except requests.ConnectTimeout as e:
+      request = self.__retry(
+        url, lambda: self.__get_feed(url, verify_https, headers, feed_cache)
+      )
+    except PodcastCatcherError:
+      Metrics.count('http_feed_errors')
+      raise
+    except requests.Timeout as e:
+      Metrics.count('http_feed_errors')
       raise PodcastCatcherError(f'HTTP timeout for feed {url}: {e}') from None
+    except requests.RequestException as e:
+      Metrics.count('http_feed_errors')
+      raise PodcastCatcherError(f'HTTP error for feed {url}: {e}') from None
+    if request.status_code == 304:
+      Metrics.count('http_feed_not_modified')
+      return None
+    if feed_cache is not None:
+      # Not all servers support validators,
+      # compare the content as fallback.
+      body_hash = sha256(request.content).hexdigest()
+      unchanged = body_hash == feed_cache.body_hash(url)
+      feed_cache.stage(
+        url=url,
+        etag=request.headers.get('ETag'),
+        last_modified=request.headers.get('Last-Modified'),
+        body_hash=body_hash,
+      )
+      if unchanged:
+        # Same content as last time, but the server
+        # may have sent new validators, keep them.
+        feed_cache.confirm(url)
+        Metrics.count('http_feed_not_modified')
+        return None
     return request.text
 
-  def download(self, source: str, target: str, verify_https: bool = True) -> None:
+  def __get_feed(
+    self,
+    url: str,
+    verify_https: bool,
+    headers: dict[str, str],
+    feed_cache: FeedCache | None,
+  ) -> 'requests.Response':
+    """
+    Single attempt to fetch a feed.
+    """
+    # Includes name resolution, connect and body
+    with Metrics.timer('http_feed_request'):
+      request = self.__session.get(
+        url,
+        verify=verify_https,
+        headers=headers,
+        timeout=self.__timeout,
+      )
+    # Time until the response headers were parsed
+    Metrics.observe('http_feed_response', request.elapsed.total_seconds())
+    Metrics.count('http_feed_bytes', len(request.content))
+    if feed_cache is not None and request.status_code == 304:
+      return request
+    if request.status_code != 200:
+      raise HttpStatusError(
+        f'HTTP error for feed {url}: {request.status_code}',
+        request.status_code,
+        RetryPolicy.parse_retry_after(request.headers.get('Retry-After')),
+      )
+    return request
+
+  def download(
+    self,
+    source: str,
+    target: str,
+    verify_https: bool = True,
+    hash_content: bool = False,
+  ) -> str | None:
+    """
+    Download from source and write
+    to target (timed). If hash_content
+    is set, the SHA-256 hex digest of
+    the enclosure is returned.
+
+    Failed attempts are retried by the retry
+    policy, resuming the received part.
+    Raises DownloadDeferredError outside of
+    the full speed windows in defer mode.
+    """
+    import requests
+    import urllib3
+
+    if self.__rate_limiter is not None:
+      delay = self.__rate_limiter.start_delay()
+      if delay > 0:
+        # Don't wait (maybe for hours), the
+        # next run picks the enclosure up.
+        Metrics.count('http_download_deferred')
+        raise DownloadDeferredError(
+          f'Download of {source} deferred, next full speed window opens in {delay:.0f}s'
+        )
+    with Metrics.timer('http_download'):
+      try:
+        return self.__retry(
+          source,
+          lambda: self.__download(
+            source, target, verify_https, sha256() if hash_content else None
+          ),
+        )
+      except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+        Metrics.count('http_download_errors')
+        raise PodcastCatcherError(f'HTTP error for {source}: {e}') from None
+      except Exception:
+        Metrics.count('http_download_errors')
+        raise
+
+  def __download(
+    self,
+    source: str,
+    target: str,
+    verify_https: bool,
+    digest: 'hashlib._Hash | None',
+  ) -> str | None:
     """
     Download from source and write
     to target.
+
+    Data is written to a '.part' file next to the
+    target, which is renamed once it is complete.
+    An existing '.part' file of an interrupted
+    download is resumed via a Range request.
+    The digest is updated while the data streams
+    to disk (an already received part is read
+    once).
+    """
+    if self.__cancelled.is_set():
+      raise PodcastCatcherError(f'Download of {source} cancelled')
+    target = Path(target)
+    part_file = target.with_name(target.name + self.PART_SUFFIX)
+    meta_file = target.with_name(target.name + self.PART_META_SUFFIX)
+
+    headers = dict(self.ENCLOSURE_HEADERS)
+    offset = part_file.stat().st_size if part_file.exists() else 0
+    validator = self.__read_part_meta(meta_file)
+    if offset > 0 and validator is not None:
+      # If-Range: the server only sends the remaining
+      # range if the enclosure is unchanged, otherwise
+      # it sends the whole file.
+      headers['Range'] = f'bytes={offset}-'
+      headers['If-Range'] = validator
+    else:
+      offset = 0
+
+    request = self.__session.get(
+      source,
+      verify=verify_https,
+      headers=headers,
+      timeout=self.__timeout,
+      stream=True,
+    )
+    Metrics.observe('http_download_response', request.elapsed.total_seconds())
+    with request:
+      if request.status_code == 416 and offset > 0:
+        # Range not satisfiable, the part file
+        # is probably complete already.
+        expected_size = self.__total_size(request)
+        if expected_size != offset:
+          # Part file doesn't match the enclosure,
+          # start from scratch next time.
+          part_file.unlink()
+          meta_file.unlink(missing_ok=True)
+          raise PodcastCatcherError(f'HTTP error for {source}: range not satisfiable')
+        if digest is not None:
+          self.__hash_file(part_file, digest)
+      elif request.status_code == 206 and offset > 0:
+        expected_size = self.__total_size(request)
+        if not request.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+          raise PodcastCatcherError(
+            f'HTTP error for {source}: unexpected range'
+            f" '{request.headers.get('Content-Range')}'"
+          )
+        Metrics.count('http_download_resumed')
+        self.__write(request, source, part_file, meta_file, True, expected_size, digest)
+      elif request.status_code == 200:
+        # Fresh download (or the server ignored the range)
+        expected_size = self.__total_size(request)
+        self.__write_part_meta(meta_file, self.__part_validator(request))
+        self.__write(
+          request, source, part_file, meta_file, False, expected_size, digest
+        )
+      else:
+        raise HttpStatusError(
+          f'HTTP error for {source}: {request.status_code}',
+          request.status_code,
+          RetryPolicy.parse_retry_after(request.headers.get('Retry-After')),
+        )
+
+    size = part_file.stat().st_size
+    if expected_size is not None and size != expected_size:
+      # Keep part file, the next run resumes it
+      raise PodcastCatcherError(
+        f'Incomplete download of {source}: {size} of {expected_size} bytes'
+      )
+    os.replace(part_file, target)
+    meta_file.unlink(missing_ok=True)
+    return digest.hexdigest() if digest is not None else None
+
+  def __hash_file(self, file: Path, digest: 'hashlib._Hash') -> None:
+    """
+    Update digest with the content of file.
+    """
+    buffer = bytearray(self.__buffer_size)
+    view = memoryview(buffer)
+    with open(file, 'rb') as fd:
+      while (size := fd.readinto(buffer)) > 0:
+        digest.update(view[:size])
+
+  def __write(
+    self,
+    request: 'requests.Response',
+    source: str,
+    part_file: Path,
+    meta_file: Path,
+    append: bool,
+    expected_size: int | None,
+    digest: 'hashlib._Hash | None' = None,
+  ) -> None:
+    """
+    Stream response body to part file.
+
+    The body is read into one reused buffer and
+    written via a memoryview, so memory usage is
+    bounded by the buffer size. Throttled downloads
+    read less at once and wait for the rate limiter
+    after each read.
+    """
+    if append and digest is not None:
+      self.__hash_file(part_file, digest)
+    validator = self.__read_part_meta(meta_file)
+    preallocate = (
+      self.__preallocate
+      and expected_size is not None
+      and hasattr(os, 'posix_fallocate')
+    )
+    buffer = bytearray(self.__buffer_size)
+    view = memoryview(buffer)
+    host = urlparse(source).hostname or ''
+    read_size = self.__buffer_size
+    # Decode the body in case the server ignored the
+    # requested identity encoding.
+    request.raw.decode_content = True
+    with open(part_file, 'r+b' if append else 'wb') as fd:
+      start = fd.seek(0, os.SEEK_END)
+      if preallocate and expected_size > start:
+        # A preallocated file has its final size from the
+        # start, so its size no longer tells how much was
+        # received. Drop the validator until the file is
+        # truncated to the received data, a hard crash then
+        # restarts the download instead of resuming zeros.
+        meta_file.unlink(missing_ok=True)
+        os.posix_fallocate(fd.fileno(), start, expected_size - start)
+      try:
+        while (size := request.raw.readinto(view[:read_size])) > 0:
+          fd.write(view[:size])
+          if digest is not None:
+            digest.update(view[:size])
+          if self.__cancelled.is_set():
+            raise PodcastCatcherError(f'Download of {part_file} cancelled')
+          if self.__rate_limiter is not None:
+            read_size = self.__rate_limiter.read_size(self.__buffer_size)
+            wait = self.__rate_limiter.reserve(host, size)
+            if wait > 0:
+              self.__sleep(wait, source)
+      finally:
+        Metrics.count('http_download_bytes', fd.tell() - start)
+        if preallocate:
+          fd.truncate(fd.tell())
+          if validator is not None:
+            self.__write_part_meta(meta_file, validator)
+
+  @staticmethod
+  def __total_size(request: 'requests.Response') -> int | None:
+    """
+    Size of the complete enclosure, taken from
+    Content-Range (partial response) or
+    Content-Length (full response).
+    """
+    if request.headers.get('Content-Encoding', 'identity') != 'identity':
+      # Length of the encoded body, not of the file
+      return None
+    content_range = request.headers.get('Content-Range')
+    if content_range is not None:
+      total = content_range.rpartition('/')[2]
+      return int(total) if total.isdigit() else None
+    content_length = request.headers.get('Content-Length')
+    if content_length is not None and content_length.isdigit():
+      return int(content_length)
+    return None
+
+  @staticmethod
+  def __read_part_meta(meta_file: Path) -> str | None:
+    """
+    Return validator stored for a part file.
+    """
+    try:
+      with open(meta_file) as fd:
+        return fd.read().strip() or None
+    except FileNotFoundError:
+      return None
+
+  @staticmethod
+  def __part_validator(request: 'requests.Response') -> str | None:
+    """
+    Return the validator of a fresh response for If-Range.
+    Weak ETags are not allowed for If-Range,
+    use Last-Modified instead.
+    """
+    etag = request.headers.get('ETag')
+    if etag is not None and not etag.startswith('W/'):
+      return etag
+    return request.headers.get('Last-Modified')
+
+  @staticmethod
+  def __write_part_meta(meta_file: Path, validator: str | None) -> None:
+    """
+    Store validator for a part file.
     """
-    request = requests.get(source, verify=verify_https)
-    with open(target, 'wb') as fd:
-      for chunk in request.iter_content(chunk_size=4096):
-        fd.write(chunk)
+    if validator is None:
+      # Without validator, resuming is not safe
+      meta_file.unlink(missing_ok=True)
+      return
+    with open(meta_file, 'w') as fd:
+      fd.write(validator)
@@ -2,51 +2,132 @@
 Add/modift id3 tags in media files.
 """
 
-from mutagen.easyid3 import EasyID3
-from mutagen.id3._util import MutagenError
-from mutagen import File
+from sys import stderr
+from typing import TYPE_CHECKING
+
+from metrics import Metrics
+
+if TYPE_CHECKING:
+  # mutagen is loaded by the first tagger,
+  # commands without tagging don't need it.
+  from mutagen import FileType
 
 
 class ID3Tagger:
   """
-  Wrap ID3 tag actions.
+  Wrap tag actions. The backend is picked by
+  the container mutagen detects (ID3 for MP3,
+  MP4 atoms for M4A, Vorbis comments for Ogg
+  Vorbis/Opus and FLAC), all with the same
+  (EasyID3 style) tag keys.
+
+  The file is opened once, set() only collects
+  the tags and save() writes all of them at once.
+  Tags are written with spare padding, so later
+  re-tags fit in place instead of rewriting the
+  whole audio payload.
   """
 
+  # Padding reserved behind the tags, in bytes
+  PADDING_SIZE = 64 * 1024
+
   def __init__(self, media_file: str):
     """
     CTOR for id3tag.
     """
+    from mutagen import File, MutagenError
+    from mutagen.easyid3 import EasyID3
+    from mutagen.id3 import ID3NoHeaderError
+
+    self.__media_file = media_file
+    self.__tags: dict[str, str] = {}
+    self.__created = False
     try:
-      self.__mediafile: EasyID3 = EasyID3(media_file)
+      with Metrics.timer('tag_open'):
+        self.__mediafile: FileType | None = File(media_file, easy=True)
     except MutagenError as e:
+      # e.g. ID3 tags, but no MPEG frames
       print(f'\n\t\tException: {e}')
-      # File has no ID3 tags, create the tags
-      # first before loading it as EasyID3
-      file = File(media_file, easy=True)
-      file.add_tags()
-      file.save(media_file, v1=2)
-      self.__mediafile: EasyID3 = EasyID3(media_file)
+      self.__mediafile = None
+    if self.__mediafile is None:
+      # Unknown container, use ID3 tags
+      # like for (undetected) MP3 files.
+      try:
+        self.__id3 = EasyID3(media_file)
+      except ID3NoHeaderError:
+        self.__id3 = EasyID3()
+        self.__created = True
+      return
+    self.__id3 = None
+    if self.__mediafile.tags is None:
+      # Only added in memory, written by save()
+      self.__mediafile.add_tags()
+      self.__created = True
+
+  def __padding(self, info) -> int:
+    """
+    Keep the existing padding if the tags still
+    fit, otherwise reserve PADDING_SIZE.
+    """
+    if info.padding >= 0:
+      return info.padding
+    return self.PADDING_SIZE
 
   def save(self) -> None:
     """
     Save tags to media file.
     """
-    self.__mediafile.save()
+    with Metrics.timer('tag_save'):
+      self.__save()
+
+  def __save(self) -> None:
+    """
+    Apply collected tags and write them.
+    """
+    from mutagen.easyid3 import EasyID3
+
+    tags = self.__id3 if self.__id3 is not None else self.__mediafile.tags
+    for key, value in self.__tags.items():
+      try:
+        tags[key] = value
+      except KeyError:
+        # e.g. EasyMP4 has no 'website'
+        print(
+          f"Tag '{key}' is not supported for '{self.__media_file}' -> skipping tag.",
+          file=stderr,
+        )
+    if self.__id3 is not None:
+      self.__id3.save(self.__media_file, v1=2, padding=self.__padding)
+    elif isinstance(tags, EasyID3):
+      # Also write an ID3v1 tag for new MP3 tags,
+      # existing ones are updated only.
+      self.__mediafile.save(v1=2 if self.__created else 1, padding=self.__padding)
+    else:
+      self.__mediafile.save(padding=self.__padding)
+    self.__tags.clear()
 
   def set(self, tag: str, value: str) -> None:
     """
-    Set ID3 tags.
+    Set tags, written by save().
     """
-    self.__mediafile[tag] = value
+    self.__tags[tag] = value
 
   def info(self) -> str:
     """
     Return stream information from mediafile.
     """
+    if self.__mediafile is None:
+      return self.__id3.pprint()
     return self.__mediafile.pprint()
 
   def valid_tags(self) -> list[str]:
     """
     Get a list of valid tag keys.
     """
+    from mutagen.easyid3 import EasyID3
+    from mutagen.easymp4 import EasyMP4Tags
+
+    if self.__mediafile is not None and isinstance(self.__mediafile.tags, EasyMP4Tags):
+      return list(EasyMP4Tags.Get.keys())
+    # Vorbis comments accept any key
     return [key for key in EasyID3.valid_keys]
@@ -13,28 +13,52 @@ tags or use undecipherable filenames.
 """
 
 from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 from sys import exit
+from time import perf_counter, sleep, time
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
 
 from config_file import ConfigFile
 from config_json_factory import ConfigJsonFactory
-from episode_tracker import EpisodeTracker
-from exception import PodcastCatcherError
-from feed import Feed
+from download_scheduler import DownloadScheduler
+from enclosure_index import EnclosureIndex
+from episode_tracker_factory import EpisodeTrackerFactory
+from exception import DownloadDeferredError, PodcastCatcherError
+from feed import Entry, Feed
+from feed_cache import FeedCache
+from feed_refresher import FeedRefresher
+from feed_snapshot import FeedSnapshot
 from http_loader import HttpLoader
 from id3tagger import ID3Tagger
+from metrics import Metrics
+from pipeline_stage import PipelineStage
+from poll_scheduler import PollScheduler
+from pruner import Pruner
+from rate_limiter import RateLimiter
 from replacer import Replacer
+from retry_policy import RetryPolicy
 from version import VERSION
 
+if TYPE_CHECKING:
+  # Only needed by download --async, asyncio
+  # takes long to import.
+  import asyncio
+
+  from async_http_loader import AsyncHttpLoader
+
 # Subparsers
 CMD_DOWNLOAD = 'download'
 CMD_LIST_FEEDS = 'list_feeds'
 CMD_LIST_EPISODES = 'list_episodes'
 CMD_RAW_FEED = 'raw_feed'
+CMD_SERVE = 'serve'
 CMD_VERSION = 'version'
 
 SUB_CMDS = [
   CMD_DOWNLOAD,
+  CMD_SERVE,
   CMD_LIST_FEEDS,
   CMD_LIST_EPISODES,
   CMD_RAW_FEED,
@@ -49,6 +73,25 @@ EXIT_SUCCESS = 0
 EXIT_ERROR = 2
 
 
+def add_snapshot_arguments(parser: ArgumentParser) -> None:
+  """
+  Add arguments to answer a command
+  from the feed snapshots.
+  """
+  parser.add_argument(
+    '--cached',
+    action='store_true',
+    help='Use the feed snapshot of the last refresh instead of fetching the feed',
+  )
+  parser.add_argument(
+    '--max-age',
+    type=float,
+    default=None,
+    metavar='SECONDS',
+    help='Only use feed snapshots younger than SECONDS (implies --cached)',
+  )
+
+
 def build_argument_parser() -> ArgumentParser:
   """
   Create argument parser.
@@ -63,20 +106,36 @@ def build_argument_parser() -> ArgumentParser:
     default=DEFAULT_CONFIG,
     help=f'Configuration file (default {DEFAULT_CONFIG})',
   )
+  parser.add_argument(
+    '--revalidate',
+    action='store_true',
+    help='Validate the configuration even if it is unchanged since the last run',
+  )
 
   sub_parsers = parser.add_subparsers(
     required=True,
     dest='cmd',
-    metavar=f'{{{','.join(SUB_CMDS)}}}',
+    metavar=f'{{{",".join(SUB_CMDS)}}}',
   )
 
-  sub_parsers.add_parser(
+  parser_download = sub_parsers.add_parser(
     CMD_DOWNLOAD,
   )
+  parser_download.add_argument(
+    '--async',
+    dest='use_async',
+    action='store_true',
+    help='Use the asyncio based pipeline',
+  )
 
   sub_parsers.add_parser(
+    CMD_SERVE,
+  )
+
+  parser_list_feeds = sub_parsers.add_parser(
     CMD_LIST_FEEDS,
   )
+  add_snapshot_arguments(parser_list_feeds)
 
   parser_list_episodes = sub_parsers.add_parser(
     CMD_LIST_EPISODES,
@@ -86,6 +145,7 @@ def build_argument_parser() -> ArgumentParser:
     type=str,
     help='Name of the feed',
   )
+  add_snapshot_arguments(parser_list_episodes)
 
   parser_raw_feed = sub_parsers.add_parser(
     CMD_RAW_FEED,
@@ -103,133 +163,791 @@ def build_argument_parser() -> ArgumentParser:
   return parser
 
 
+def create_loader(
+  config: ConfigFile, feed_cache: FeedCache | None = None
+) -> HttpLoader:
+  """
+  Create HTTP loader with connection pool,
+  timeouts, rate limits and retries from
+  the settings.
+  """
+  settings = config.settings()
+  rate_limiter = RateLimiter(
+    max_rate=settings.max_download_rate(),
+    max_rate_per_host=settings.max_download_rate_per_host(),
+    full_speed_windows=settings.full_speed_windows(),
+    outside_windows=settings.outside_windows(),
+  )
+  return HttpLoader(
+    feed_cache=feed_cache,
+    pool_size=settings.http_pool_size(),
+    connect_timeout=settings.connect_timeout(),
+    read_timeout=settings.read_timeout(),
+    buffer_size=settings.download_buffer_size(),
+    preallocate=settings.preallocate(),
+    rate_limiter=rate_limiter,
+    retry_policy=RetryPolicy(
+      max_attempts=settings.http_max_attempts(),
+      base_delay=settings.http_retry_delay(),
+      max_delay=settings.http_retry_max_delay(),
+      breaker_threshold=settings.circuit_breaker_threshold(),
+      breaker_timeout=settings.circuit_breaker_timeout(),
+    ),
+  )
+
+
+def throughput(loader: 'HttpLoader | AsyncHttpLoader') -> str:
+  """
+  Return the current throughput of all
+  downloads, e.g. '1.5 MiB/s'.
+  """
+  rate = loader.throughput()
+  return RateLimiter.format_rate(rate if rate is not None else 0.0)
+
+
+def create_enclosure_index(config: ConfigFile) -> EnclosureIndex | None:
+  """
+  Create the index of downloaded
+  enclosures, if dedup is enabled.
+  """
+  settings = config.settings()
+  if settings.dedup() == EnclosureIndex.MODE_OFF:
+    return None
+  return EnclosureIndex(settings.data_dir(), settings.dedup())
+
+
+def download_enclosure(
+  loader: HttpLoader,
+  enclosures: EnclosureIndex | None,
+  source: str,
+  target: Path,
+  verify_https: bool,
+) -> None:
+  """
+  Download an enclosure, unless it is known
+  to the enclosure index already.
+  """
+  if enclosures is not None and enclosures.link_known(source, target):
+    return
+  sha256 = loader.download(
+    source=source,
+    target=target,
+    verify_https=verify_https,
+    hash_content=enclosures is not None,
+  )
+  if enclosures is not None:
+    enclosures.add(source, target, sha256)
+
+
+def record_failure(
+  failures: dict[str, str], config_feed: ConfigFile.Feed, error: Exception
+) -> None:
+  """
+  Remember the first failure of a
+  feed, the other feeds keep going.
+  """
+  failures.setdefault(config_feed.name(), str(error))
+
+
+def check_failures(failures: dict[str, str]) -> None:
+  """
+  Fail the run if any feed failed.
+  """
+  if len(failures) > 0:
+    details = ', '.join(f'{name} ({error})' for name, error in failures.items())
+    raise PodcastCatcherError(f'Failed feeds: {details}')
+
+
+def finish_feed(
+  result: FeedRefresher.Result, feed_cache: FeedCache | None, pruner: Pruner
+) -> None:
+  """
+  Prune a feed whose new episodes are all
+  handled, close its episode tracker and
+  confirm the feed in the feed cache,
+  unless an episode wasn't downloaded
+  (e.g. deferred), so the next run
+  offers it again.
+  """
+  episode_tracker = result.episode_tracker()
+  pruner.prune_feed(result.config_feed(), episode_tracker)
+  episode_tracker.close()
+  if feed_cache is not None and episode_tracker.unfinished() is None:
+    feed_cache.confirm(result.config_feed().url())
+
+
+def render_filenames(
+  config: ConfigFile,
+  replacer: Replacer,
+  config_feed: ConfigFile.Feed,
+  entries: list[Entry],
+) -> list[str]:
+  """
+  Render the filenames of all new entries
+  of a feed, timed once for the whole feed.
+  """
+  template = config.get_filename(feed=config_feed)
+  filenames = []
+  with Metrics.timer('replacer_filenames', feed=config_feed.name()):
+    for entry in entries:
+      replacer.update_entry(entry)
+      filenames.append(replacer.replace(template))
+  return filenames
+
+
+def tag_entry(
+  config: ConfigFile,
+  replacer: Replacer,
+  result: FeedRefresher.Result,
+  entry: Entry,
+  target: Path,
+) -> None:
+  """
+  Tag a downloaded enclosure.
+  """
+  config_feed = result.config_feed()
+
+  # Update replacer
+  replacer.update_name(config_feed.name())
+  replacer.update_feed(result.feed())
+  replacer.update_entry(entry)
+
+  # Tag downloaded enclosure
+  tagger = ID3Tagger(target)
+  for key, value in config.get_tags(config_feed).items():
+    tagger.set(key, replacer.replace(value))
+  tagger.set('genre', ', '.join(entry.tags()))
+  tagger.save()
+
+
+def track_entry(result: FeedRefresher.Result, entry: Entry, target: Path) -> None:
+  """
+  Register a downloaded (and tagged)
+  episode in the episode tracker.
+  """
+  episode_tracker = result.episode_tracker()
+  episode_tracker.complete(entry, target)
+  episode_tracker.save()
+
+
+def tag_and_track(
+  config: ConfigFile,
+  replacer: Replacer,
+  result: FeedRefresher.Result,
+  entry: Entry,
+  target: Path,
+) -> None:
+  """
+  Tag a downloaded enclosure and
+  register it in the episode tracker.
+  """
+  tag_entry(config, replacer, result, entry, target)
+  track_entry(result, entry, target)
+
+
+def tag_download(
+  config: ConfigFile,
+  commit_stage: PipelineStage,
+  job: DownloadScheduler.Job,
+) -> None:
+  """
+  Tag stage: tag a successfully downloaded
+  enclosure and pass the job on to the
+  commit stage, failed or not.
+  """
+  if job.error() is None:
+    result, entry = job.payload()
+    try:
+      # Replacer is not thread-safe, each
+      # episode gets its own.
+      tag_entry(config, Replacer(), result, entry, job.target())
+    except Exception as e:
+      job.set_error(e)
+  commit_stage.put(job)
+
+
+def commit_download(
+  loader: HttpLoader,
+  feed_cache: FeedCache | None,
+  pruner: Pruner,
+  pending: dict[str, int],
+  failures: dict[str, str],
+  job: DownloadScheduler.Job,
+) -> None:
+  """
+  Commit stage: register a tagged enclosure in
+  the episode tracker, or the failure of its
+  feed. Once all pending downloads of a feed
+  are done, the feed is finished.
+  Runs on a single thread.
+  """
+  result, entry = job.payload()
+  config_feed = result.config_feed()
+  if isinstance(job.error(), DownloadDeferredError):
+    Metrics.count('episodes_deferred', feed=config_feed.name())
+    print(
+      f'\t{config_feed.name()}: {entry.title()} ({entry.published()})...'
+      f' Deferred ({job.error()})'
+    )
+  elif job.error() is not None:
+    Metrics.count('episodes_failed', feed=config_feed.name())
+    record_failure(failures, config_feed, job.error())
+    print(
+      f'\t{config_feed.name()}: {entry.title()} ({entry.published()})...'
+      f' Failed ({job.error()})'
+    )
+  else:
+    track_entry(result, entry, job.target())
+    Metrics.count('episodes_downloaded', feed=config_feed.name())
+    print(
+      f'\t{config_feed.name()}: {entry.title()} ({entry.published()})...'
+      f' Done ({throughput(loader)})'
+    )
+
+  pending[config_feed.url()] -= 1
+  if pending[config_feed.url()] == 0:
+    # Don't confirm a feed with failed episodes in
+    # the feed cache, so the next run retries them.
+    finish_feed(result, None if config_feed.name() in failures else feed_cache, pruner)
+
+
 def download(config: ConfigFile) -> None:
   """
   Download feed enclosures not
   downloaded, yet.
+
+  Runs as pipeline: feeds are fetched by the
+  refresher, enclosures downloaded by the
+  scheduler, then tagged and finally committed
+  to the episode tracker by their own stages.
+  All stages are connected by bounded queues.
   """
-  loader = HttpLoader()
+  settings = config.settings()
+  feed_cache = None
+  if settings.conditional_get():
+    feed_cache = FeedCache(settings.data_dir())
+  loader = create_loader(config, feed_cache=feed_cache)
+  refresher = FeedRefresher(
+    config, loader, FeedSnapshot(settings.data_dir(), feed_cache)
+  )
+  enclosures = create_enclosure_index(config)
+  pruner = Pruner(config, refresher.episode_tracker)
+  try:
+    failures = download_results(
+      config, loader, enclosures, feed_cache, pruner, refresher.refresh_all()
+    )
+    pruner.prune_all()
+    check_failures(failures)
+  finally:
+    if enclosures is not None:
+      enclosures.close()
+
+
+def download_results(
+  config: ConfigFile,
+  loader: HttpLoader,
+  enclosures: EnclosureIndex | None,
+  feed_cache: FeedCache | None,
+  pruner: Pruner,
+  results: Iterable[FeedRefresher.Result],
+) -> dict[str, str]:
+  """
+  Download, tag and commit the new
+  episodes of refreshed feeds, then
+  prune each finished feed. Returns
+  the first error of each failed feed.
+  """
+  settings = config.settings()
   replacer = Replacer()
+  # Number of unfinished downloads per feed URL
+  pending: dict[str, int] = {}
+  # First error per failed feed name
+  failures: dict[str, str] = {}
   # Ensure base download folder exists
-  download_dir = Path(config.settings().download_dir())
+  download_dir = Path(settings.download_dir())
   if not download_dir.exists():
     download_dir.mkdir(parents=True)
-  # For each feed:
-  for config_feed in config.feeds():
-    # Skip feeds not enabled
-    if not config_feed.is_enabled:
-      continue
+  with (
+    PipelineStage(
+      name='commit',
+      handle=lambda job: commit_download(
+        loader, feed_cache, pruner, pending, failures, job
+      ),
+      max_queued=settings.queue_size(),
+    ) as commit_stage,
+    PipelineStage(
+      name='tag',
+      handle=lambda job: tag_download(config, commit_stage, job),
+      workers=settings.tag_workers(),
+      max_queued=settings.queue_size(),
+    ) as tag_stage,
+    DownloadScheduler(
+      download=lambda source, target, verify_https: download_enclosure(
+        loader, enclosures, source, target, verify_https
+      ),
+      max_workers=settings.download_workers(),
+      max_per_host=settings.downloads_per_host(),
+      max_pending=settings.queue_size(),
+      on_finished=tag_stage.put,
+    ) as scheduler,
+  ):
 
-    # Download feed
-    feed_text = loader.get_feed(
-      url=config_feed.url(),
-      verify_https=config_feed.is_strict_https(),
-    )
+    def check_errors() -> None:
+      """
+      Abort on the first failed episode.
+      """
+      for stage in (tag_stage, commit_stage):
+        if stage.error() is not None:
+          raise stage.error()
 
-    # Parse feed
-    parsed_feed = Feed(feed_text=feed_text)
+    # For each (refreshed) feed:
+    for feed_index, result in enumerate(results):
+      check_errors()
+      config_feed = result.config_feed()
+      entries = result.entries()
 
-    # Update replacer settings
-    replacer.update_name(config_feed.name())
-    replacer.update_feed(parsed_feed)
+      if result.error() is not None:
+        record_failure(failures, config_feed, result.error())
+        print(f'{config_feed.name()} (failed: {result.error()})')
+        continue
 
-    # Filter out already downloaded episodes
-    episode_tracker = EpisodeTracker(config, config_feed.name())
-    already_downloaded = episode_tracker.already_downloaded_links()
-    entries = [
-      entry
-      for entry in parsed_feed.entries()
-      if entry.enclosure() not in already_downloaded
-    ]
-    # Filter out episodes older than X
-    if config_feed.skip_older_than() is not None:
-      entries = [
-        entry for entry in entries if entry.published() >= config_feed.skip_older_than()
-      ]
-    # Sort entries from oldest to newest
-    entries.sort(key=lambda e: e.published())
-    print(f'{config_feed.name()} ({len(entries)} new entries)')
-
-    # Ensure target download folder exists,
-    # but only if at least one episode is
-    # available for download
-    target_dir = download_dir.joinpath(
-      Path(config_feed.download_subdir()),
-    )
-    if len(entries) > 0 and not target_dir.exists():
-      target_dir.mkdir(parents=True)
+      if not result.is_modified():
+        print(
+          f'{config_feed.name()} (not modified, refreshed in {result.duration():.2f}s)'
+        )
+        continue
 
-    index = 1
-    tags = config.get_tags(config_feed)
-    # Handle CRTL-C interrupts
-    try:
-      # For all episodes in feed:
-      for entry in entries:
-        # Update replacer
-        replacer.update_entry(entry)
+      Metrics.gauge('feed_new_episodes', len(entries), feed=config_feed.name())
 
-        filename = replacer.replace(config.get_filename(feed=config_feed))
-        print(
-          f'\t{index}/{len(entries)}: {entry.title()} ({entry.published()})... ',
-          end='',
-          flush=True,
+      # Update replacer settings
+      replacer.update_name(config_feed.name())
+      replacer.update_feed(result.feed())
+
+      print(
+        f'{config_feed.name()} ({len(entries)} new entries,'
+        f' refreshed in {result.duration():.2f}s,'
+        f' queued: {scheduler.pending()} downloads,'
+        f' {tag_stage.depth()} tags, {commit_stage.depth()} commits,'
+        f' {throughput(loader)})'
+      )
+
+      # Ensure target download folder exists,
+      # but only if at least one episode is
+      # available for download
+      target_dir = download_dir.joinpath(
+        Path(config_feed.download_subdir()),
+      )
+      if len(entries) > 0 and not target_dir.exists():
+        target_dir.mkdir(parents=True)
+
+      pending[config_feed.url()] = len(entries)
+      if len(entries) == 0:
+        finish_feed(result, feed_cache, pruner)
+
+      # Queue all episodes in feed. Entries are sorted
+      # from oldest to newest, the n-th episode of every
+      # feed is started before the (n+1)-th of any feed.
+      filenames = render_filenames(config, replacer, config_feed, entries)
+      for index, (entry, filename) in enumerate(zip(entries, filenames, strict=True)):
+        scheduler.submit(
+          source=entry.enclosure(),
+          target=target_dir.joinpath(Path(f'{filename}')),
+          verify_https=config_feed.is_strict_https(),
+          priority=(index, feed_index),
+          payload=(result, entry),
         )
-        target_file = target_dir.joinpath(Path(f'{filename}'))
 
-        # Download enclosure
-        loader.download(
+    # Wait for remaining downloads, tags and commits
+    scheduler.join()
+    tag_stage.join()
+    commit_stage.join()
+    check_errors()
+  return failures
+
+
+async def download_entry_async(
+  config: ConfigFile,
+  loader: 'AsyncHttpLoader',
+  enclosures: EnclosureIndex | None,
+  result: FeedRefresher.Result,
+  entry: Entry,
+  target: Path,
+  download_limit: 'asyncio.Semaphore',
+  host_limits: dict[str, 'asyncio.Semaphore'],
+  failures: dict[str, str],
+) -> None:
+  """
+  Download, tag and track a single episode,
+  or record the failure of its feed.
+  """
+  import asyncio
+
+  config_feed = result.config_feed()
+  host = urlparse(entry.enclosure()).hostname or ''
+  if host not in host_limits:
+    host_limits[host] = asyncio.Semaphore(config.settings().downloads_per_host())
+  # Wait for the host first, a download waiting
+  # for its host must not block a global slot.
+  try:
+    known = enclosures is not None and await asyncio.to_thread(
+      enclosures.link_known, entry.enclosure(), target
+    )
+    if not known:
+      async with host_limits[host], download_limit:
+        sha256 = await loader.download(
           source=entry.enclosure(),
-          target=target_file,
+          target=target,
           verify_https=config_feed.is_strict_https(),
+          hash_content=enclosures is not None,
         )
+      if enclosures is not None:
+        await asyncio.to_thread(enclosures.add, entry.enclosure(), target, sha256)
+    # Tagging (mutagen) and tracker writes block, run them
+    # in the executor. Replacer is not thread-safe, so
+    # each episode gets its own.
+    await asyncio.to_thread(tag_and_track, config, Replacer(), result, entry, target)
+  except DownloadDeferredError as e:
+    Metrics.count('episodes_deferred', feed=config_feed.name())
+    print(
+      f'\t{config_feed.name()}: {entry.title()} ({entry.published()})... Deferred ({e})'
+    )
+    return
+  except Exception as e:
+    Metrics.count('episodes_failed', feed=config_feed.name())
+    record_failure(failures, config_feed, e)
+    print(
+      f'\t{config_feed.name()}: {entry.title()} ({entry.published()})... Failed ({e})'
+    )
+    return
+  Metrics.count('episodes_downloaded', feed=config_feed.name())
+  print(
+    f'\t{config_feed.name()}: {entry.title()} ({entry.published()})...'
+    f' Done ({throughput(loader)})'
+  )
 
-        # Tag downloaded enclosure
-        tagger = ID3Tagger(target_file)
-        for key, value in tags.items():
-          tagger.set(key, replacer.replace(value))
-        tagger.set('genre', ', '.join(entry.tags()))
-        tagger.save()
 
-        # Update episode tracker
-        episode_tracker.complete(entry)
-        episode_tracker.save()
-        print('Done')
-        index += 1
-    except InterruptedError:
-      # Silently abort via CRTL-C
-      # (no stack trace).
-      # Ensure the tracker is saved at the end
-      episode_tracker.save()
+async def download_feed_async(
+  config: ConfigFile,
+  loader: 'AsyncHttpLoader',
+  enclosures: EnclosureIndex | None,
+  refresher: FeedRefresher,
+  feed_cache: FeedCache | None,
+  pruner: Pruner,
+  config_feed: ConfigFile.Feed,
+  feed_limit: 'asyncio.Semaphore',
+  download_limit: 'asyncio.Semaphore',
+  host_limits: dict[str, 'asyncio.Semaphore'],
+  failures: dict[str, str],
+) -> None:
+  """
+  Refresh a feed and download its new episodes.
+  Failures are recorded, not raised.
+  """
+  import asyncio
 
+  start = perf_counter()
+  try:
+    async with feed_limit:
+      feed_text = await loader.get_feed(
+        url=config_feed.url(),
+        verify_https=config_feed.is_strict_https(),
+      )
+    # Parsing (feedparser) is CPU bound, run it in the executor
+    result = await asyncio.to_thread(refresher.process, config_feed, feed_text, start)
+  except PodcastCatcherError as e:
+    result = refresher.failed(config_feed, e, start)
+  if result.error() is not None:
+    record_failure(failures, config_feed, result.error())
+    print(f'{config_feed.name()} (failed: {result.error()})')
+    return
+  if not result.is_modified():
+    print(f'{config_feed.name()} (not modified, refreshed in {result.duration():.2f}s)')
+    return
+  entries = result.entries()
+  Metrics.gauge('feed_new_episodes', len(entries), feed=config_feed.name())
+  print(
+    f'{config_feed.name()} ({len(entries)} new entries,'
+    f' refreshed in {result.duration():.2f}s, {throughput(loader)})'
+  )
 
-def list_feeds(config: ConfigFile) -> None:
+  replacer = Replacer()
+  replacer.update_name(config_feed.name())
+  replacer.update_feed(result.feed())
+  target_dir = Path(config.settings().download_dir()).joinpath(
+    Path(config_feed.download_subdir()),
+  )
+  if len(entries) > 0 and not target_dir.exists():
+    target_dir.mkdir(parents=True)
+
+  # Entries are sorted from oldest to newest and
+  # queue for the semaphores in that order.
+  filenames = render_filenames(config, replacer, config_feed, entries)
+  async with asyncio.TaskGroup() as group:
+    for entry, filename in zip(entries, filenames, strict=True):
+      group.create_task(
+        download_entry_async(
+          config,
+          loader,
+          enclosures,
+          result,
+          entry,
+          target_dir.joinpath(Path(f'{filename}')),
+          download_limit,
+          host_limits,
+          failures,
+        )
+      )
+  # Don't confirm a feed with failed episodes in
+  # the feed cache, so the next run retries them.
+  if config_feed.name() in failures:
+    feed_cache = None
+  await asyncio.to_thread(finish_feed, result, feed_cache, pruner)
+
+
+async def download_async(config: ConfigFile) -> None:
+  """
+  Download feed enclosures not downloaded,
+  yet, driven by an asyncio event loop.
+  """
+  import asyncio
+
+  from async_http_loader import AsyncHttpLoader
+
+  settings = config.settings()
+  feed_cache = None
+  if settings.conditional_get():
+    feed_cache = FeedCache(settings.data_dir())
+  http_loader = create_loader(config, feed_cache=feed_cache)
+  loader = AsyncHttpLoader(
+    http_loader,
+    max_workers=settings.feed_workers() + settings.download_workers(),
+  )
+  refresher = FeedRefresher(
+    config, http_loader, FeedSnapshot(settings.data_dir(), feed_cache)
+  )
+  enclosures = create_enclosure_index(config)
+  pruner = Pruner(config, refresher.episode_tracker)
+  # Ensure base download folder exists
+  download_dir = Path(settings.download_dir())
+  if not download_dir.exists():
+    download_dir.mkdir(parents=True)
+
+  feed_limit = asyncio.Semaphore(settings.feed_workers())
+  download_limit = asyncio.Semaphore(settings.download_workers())
+  host_limits: dict[str, asyncio.Semaphore] = {}
+  # First error per failed feed name
+  failures: dict[str, str] = {}
+  try:
+    async with asyncio.TaskGroup() as group:
+      for config_feed in config.feeds():
+        if not config_feed.is_enabled():
+          continue
+        group.create_task(
+          download_feed_async(
+            config,
+            loader,
+            enclosures,
+            refresher,
+            feed_cache,
+            pruner,
+            config_feed,
+            feed_limit,
+            download_limit,
+            host_limits,
+            failures,
+          )
+        )
+    await asyncio.to_thread(pruner.prune_all)
+    check_failures(failures)
+  finally:
+    loader.close()
+    if enclosures is not None:
+      enclosures.close()
+
+
+def serve(config: ConfigFile) -> None:
+  """
+  Download new episodes until interrupted,
+  polling each feed when it is due.
+
+  Config, HTTP session and episode trackers
+  stay loaded between polls.
+  """
+  settings = config.settings()
+  feed_cache = None
+  if settings.conditional_get():
+    feed_cache = FeedCache(settings.data_dir())
+  loader = create_loader(config, feed_cache=feed_cache)
+  refresher = FeedRefresher(
+    config,
+    loader,
+    FeedSnapshot(settings.data_dir(), feed_cache),
+    keep_trackers=True,
+  )
+  enclosures = create_enclosure_index(config)
+  pruner = Pruner(config, refresher.episode_tracker)
+  scheduler = PollScheduler(
+    [feed for feed in config.feeds() if feed.is_enabled()],
+    min_interval=settings.poll_min_interval(),
+    max_interval=settings.poll_max_interval(),
+  )
+  if scheduler.next_due() is None:
+    raise PodcastCatcherError('No enabled feeds to serve')
+
+  def schedule(
+    results: Iterable[FeedRefresher.Result], polled: set[str]
+  ) -> Iterator[FeedRefresher.Result]:
+    """
+    Schedule the next poll of each
+    refreshed feed.
+    """
+    for result in results:
+      config_feed = result.config_feed()
+      polled.add(config_feed.name())
+      if result.error() is not None:
+        interval = scheduler.failed(config_feed)
+      else:
+        interval = scheduler.update(result)
+      yield result
+      print(f'{config_feed.name()}: next poll in {interval:.0f}s')
+
+  try:
+    while True:
+      due = scheduler.due()
+      if len(due) == 0:
+        sleep(max(scheduler.next_due() - time(), 0))
+        continue
+      polled: set[str] = set()
+      start = perf_counter()
+      success = False
+      try:
+        failures = download_results(
+          config,
+          loader,
+          enclosures,
+          feed_cache,
+          pruner,
+          schedule(refresher.refresh_all(due), polled),
+        )
+        pruner.prune_all()
+        check_failures(failures)
+        success = True
+      except (PodcastCatcherError, OSError) as e:
+        # Keep serving, the feeds are retried later
+        print(e)
+      finally:
+        for config_feed in due:
+          if config_feed.name() not in polled:
+            scheduler.failed(config_feed)
+        report_metrics(config, perf_counter() - start, success)
+        # Report each cycle on its own, not the totals since startup
+        Metrics.reset()
+  finally:
+    loader.close()
+    if enclosures is not None:
+      enclosures.close()
+
+
+def report_metrics(config: ConfigFile, duration: float, success: bool) -> None:
+  """
+  Print the metrics summary of a download
+  run (or serve cycle) and write the
+  metrics file, if set.
+  """
+  Metrics.gauge('run_duration_seconds', duration)
+  Metrics.gauge('last_run_timestamp_seconds', time())
+  Metrics.gauge('last_run_success', 1 if success else 0)
+  print(Metrics.summary())
+  settings = config.settings()
+  if settings.metrics_file() is not None:
+    try:
+      Metrics.write(settings.metrics_file(), settings.metrics_format())
+    except OSError as e:
+      raise PodcastCatcherError(
+        f"Can't write metrics file '{settings.metrics_file()}': {e}"
+      ) from None
+
+
+def create_snapshots(config: ConfigFile) -> FeedSnapshot:
+  """
+  Create feed snapshots, validated
+  against the feed cache if enabled.
+  """
+  feed_cache = None
+  if config.settings().conditional_get():
+    feed_cache = FeedCache(config.settings().data_dir())
+  return FeedSnapshot(config.settings().data_dir(), feed_cache)
+
+
+def list_feeds(
+  config: ConfigFile,
+  cached: bool = False,
+  max_age: float | None = None,
+) -> None:
   """
   Show a list of feeds in config.
+  Optional: show feed details
+  from the feed snapshots.
   """
+  snapshots = create_snapshots(config) if cached else None
   for feed in config.feeds():
     print(f'{feed.name()} ({feed.url()}) (enabled: {feed.is_enabled()})')
-    episode_tracker = EpisodeTracker(config, feed.name())
+    episode_tracker = EpisodeTrackerFactory.create(config, feed.name())
     last_entry = episode_tracker.latest_entry()
     if last_entry is None:
       last_entry = '-'
     print(f'\tLast download: {last_entry}')
+    if snapshots is None:
+      continue
+    snapshot = snapshots.load(feed, max_age)
+    if snapshot is None:
+      print('\tSnapshot: -')
+      continue
+    parsed_feed, created = snapshot
+    already_downloaded = episode_tracker.already_downloaded_links()
+    not_downloaded = [
+      entry
+      for entry in parsed_feed.entries()
+      if entry.enclosure() not in already_downloaded
+    ]
+    print(
+      f"\tSnapshot: '{parsed_feed.title()}' updated {parsed_feed.updated()},"
+      f' {len(parsed_feed.entries())} episodes ({len(not_downloaded)} not downloaded),'
+      f' taken {created}'
+    )
 
 
-def list_episodes(config: ConfigFile, feed_name: str) -> None:
+def list_episodes(
+  config: ConfigFile,
+  feed_name: str,
+  cached: bool = False,
+  max_age: float | None = None,
+) -> None:
   """
   Name of the feed to show
   (available) episodes for.
+  Optional: use the feed snapshot
+  if it is valid.
   """
-  loader = HttpLoader()
+  snapshots = create_snapshots(config)
   for config_feed in config.feeds():
     if config_feed.name() == feed_name:
-      episode_tracker = EpisodeTracker(config, config_feed.name())
+      episode_tracker = EpisodeTrackerFactory.create(config, config_feed.name())
       print(f'{config_feed.name()}')
-      feed_text = loader.get_feed(
-        url=config_feed.url(),
-        verify_https=config_feed.is_strict_https(),
-      )
-      parsed_feed = Feed(feed_text=feed_text)
+      snapshot = snapshots.load(config_feed, max_age) if cached else None
+      if snapshot is not None:
+        parsed_feed, _ = snapshot
+      else:
+        # Snapshots are only stored by refreshes, which
+        # know the body hash of the feed they parsed
+        loader = create_loader(config)
+        feed_text = loader.get_feed(
+          url=config_feed.url(),
+          verify_https=config_feed.is_strict_https(),
+        )
+        parsed_feed = Feed(
+          feed_text=feed_text, enclosure_policy=config_feed.enclosure_policy()
+        )
       # Sort entries from oldest to newest
       already_downloaded = episode_tracker.already_downloaded_links()
       entries = [
@@ -253,7 +971,7 @@ def raw_feed(config: ConfigFile, feed_name: str) -> None:
   Show raw RSS/ATOM feed
   fetched via HTTP(S).
   """
-  loader = HttpLoader()
+  loader = create_loader(config)
   for feed in config.feeds():
     if feed.name() == feed_name:
       feed_text = loader.get_feed(feed.url())
@@ -283,19 +1001,40 @@ def main_cli() -> None:
 
   try:
     config_json_factory = ConfigJsonFactory(args.config)
-    config_json_factory.validate()
+    config_json_factory.validate(revalidate=args.revalidate)
     config = config_json_factory.create_config()
 
     if args.cmd == CMD_DOWNLOAD:
-      download(
+      start = perf_counter()
+      success = False
+      try:
+        if args.use_async:
+          import asyncio
+
+          asyncio.run(download_async(config))
+        else:
+          download(
+            config,
+          )
+        success = True
+      finally:
+        report_metrics(config, perf_counter() - start, success)
+    elif args.cmd == CMD_SERVE:
+      serve(
         config,
       )
     elif args.cmd == CMD_LIST_FEEDS:
-      list_feeds(config)
+      list_feeds(
+        config,
+        cached=args.cached or args.max_age is not None,
+        max_age=args.max_age,
+      )
     elif args.cmd == CMD_LIST_EPISODES:
       list_episodes(
         config,
         args.feed_name,
+        cached=args.cached or args.max_age is not None,
+        max_age=args.max_age,
       )
     elif args.cmd == CMD_RAW_FEED:
       raw_feed(
@@ -0,0 +1,225 @@
+"""
+Timers and counters of a run, exported
+as Prometheus textfile or JSON.
+"""
+
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from json import dumps
+from pathlib import Path
+from threading import Lock
+from time import perf_counter
+
+from exception import PodcastCatcherError
+
+
+class Metrics:
+  """
+  Process wide metrics, safe to be
+  updated from any thread.
+
+  Timers keep count, sum and max of their
+  observations (in seconds), counters only
+  grow and gauges hold the last value. All
+  of them may carry labels (e.g. feed=...).
+  """
+
+  PREFIX = 'podcast_catcher'
+
+  FORMAT_PROMETHEUS = 'prometheus'
+  FORMAT_JSON = 'json'
+
+  __lock = Lock()
+  # (name, labels) -> [count, sum, max]
+  __timers: dict[tuple[str, tuple], list[float]] = {}
+  __counters: dict[tuple[str, tuple], float] = {}
+  __gauges: dict[tuple[str, tuple], float] = {}
+
+  @staticmethod
+  def __key(name: str, labels: dict[str, str]) -> tuple[str, tuple]:
+    """
+    Key of a metric with its labels.
+    """
+    return name, tuple(sorted(labels.items()))
+
+  @classmethod
+  def observe(cls, name: str, seconds: float, **labels: str) -> None:
+    """
+    Record a duration of timer name.
+    """
+    key = cls.__key(name, labels)
+    with cls.__lock:
+      timer = cls.__timers.setdefault(key, [0, 0.0, 0.0])
+      timer[0] += 1
+      timer[1] += seconds
+      timer[2] = max(timer[2], seconds)
+
+  @classmethod
+  @contextmanager
+  def timer(cls, name: str, **labels: str) -> Iterator[None]:
+    """
+    Time the enclosed block,
+    failed or not.
+    """
+    start = perf_counter()
+    try:
+      yield
+    finally:
+      cls.observe(name, perf_counter() - start, **labels)
+
+  @classmethod
+  def count(cls, name: str, value: float = 1, **labels: str) -> None:
+    """
+    Increase counter name by value.
+    """
+    key = cls.__key(name, labels)
+    with cls.__lock:
+      cls.__counters[key] = cls.__counters.get(key, 0) + value
+
+  @classmethod
+  def gauge(cls, name: str, value: float, **labels: str) -> None:
+    """
+    Set gauge name to value.
+    """
+    key = cls.__key(name, labels)
+    with cls.__lock:
+      cls.__gauges[key] = value
+
+  @classmethod
+  def reset(cls) -> None:
+    """
+    Drop all metrics, e.g. before the next serve cycle.
+    """
+    with cls.__lock:
+      cls.__timers.clear()
+      cls.__counters.clear()
+      cls.__gauges.clear()
+
+  @classmethod
+  def summary(cls) -> str:
+    """
+    Human readable summary, labels
+    are summed up per metric.
+    """
+    timers: dict[str, list[float]] = {}
+    counters: dict[str, float] = {}
+    with cls.__lock:
+      for (name, _), (count, total, maximum) in cls.__timers.items():
+        timer = timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += count
+        timer[1] += total
+        timer[2] = max(timer[2], maximum)
+      for (name, _), value in cls.__counters.items():
+        counters[name] = counters.get(name, 0) + value
+    lines = ['Metrics:']
+    for name, (count, total, maximum) in sorted(timers.items()):
+      lines.append(
+        f'\t{name}: {count} in {total:.2f}s'
+        f' (mean {total / count * 1000:.1f}ms, max {maximum * 1000:.1f}ms)'
+      )
+    for name, value in sorted(counters.items()):
+      lines.append(f'\t{name}: {value:g}')
+    return '\n'.join(lines)
+
+  @classmethod
+  def write(cls, metrics_file: str, metrics_format: str = FORMAT_PROMETHEUS) -> None:
+    """
+    Write all metrics to a file. The file is
+    replaced atomically, so a scraper never
+    reads a partial file.
+    """
+    if metrics_format == cls.FORMAT_PROMETHEUS:
+      text = cls.__prometheus()
+    elif metrics_format == cls.FORMAT_JSON:
+      text = cls.__json()
+    else:
+      raise PodcastCatcherError(f"Unknown metrics format '{metrics_format}'")
+    path = Path(metrics_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_name(f'.{path.name}.tmp')
+    with open(temp_file, 'w') as fd:
+      fd.write(text)
+    os.replace(temp_file, path)
+
+  @staticmethod
+  def __escape(value: str) -> str:
+    """
+    Escape a Prometheus label value.
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+  @classmethod
+  def __labels(cls, labels: tuple) -> str:
+    """
+    Prometheus label set, e.g. '{feed="A"}'.
+    """
+    if len(labels) == 0:
+      return ''
+    items = [f'{key}="{cls.__escape(str(value))}"' for key, value in labels]
+    return f'{{{",".join(items)}}}'
+
+  @classmethod
+  def __prometheus(cls) -> str:
+    """
+    Metrics in Prometheus text exposition format.
+    """
+    lines = []
+    with cls.__lock:
+      timers = sorted(cls.__timers.items())
+      counters = sorted(cls.__counters.items())
+      gauges = sorted(cls.__gauges.items())
+    declared = set()
+    for name in sorted({name for (name, _), _ in timers}):
+      # Lines of a metric family must not be interleaved,
+      # so the max gauges follow after the summary.
+      metric = f'{cls.PREFIX}_{name}_seconds'
+      family = [(labels, timer) for (other, labels), timer in timers if other == name]
+      lines.append(f'# TYPE {metric} summary')
+      for labels, (count, total, _) in family:
+        lines.append(f'{metric}_count{cls.__labels(labels)} {count}')
+        lines.append(f'{metric}_sum{cls.__labels(labels)} {total}')
+      lines.append(f'# TYPE {metric}_max gauge')
+      for labels, (_, _, maximum) in family:
+        lines.append(f'{metric}_max{cls.__labels(labels)} {maximum}')
+    for (name, labels), value in counters:
+      metric = f'{cls.PREFIX}_{name}_total'
+      if metric not in declared:
+        declared.add(metric)
+        lines.append(f'# TYPE {metric} counter')
+      lines.append(f'{metric}{cls.__labels(labels)} {value}')
+    for (name, labels), value in gauges:
+      metric = f'{cls.PREFIX}_{name}'
+      if metric not in declared:
+        declared.add(metric)
+        lines.append(f'# TYPE {metric} gauge')
+      lines.append(f'{metric}{cls.__labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+  @classmethod
+  def __json(cls) -> str:
+    """
+    Metrics as JSON document.
+    """
+    with cls.__lock:
+      data = {
+        'timers': [
+          {
+            'name': name,
+            'labels': dict(labels),
+            'count': count,
+            'sum': total,
+            'max': maximum,
+          }
+          for (name, labels), (count, total, maximum) in sorted(cls.__timers.items())
+        ],
+        'counters': [
+          {'name': name, 'labels': dict(labels), 'value': value}
+          for (name, labels), value in sorted(cls.__counters.items())
+        ],
+        'gauges': [
+          {'name': name, 'labels': dict(labels), 'value': value}
+          for (name, labels), value in sorted(cls.__gauges.items())
+        ],
+      }
+    return dumps(data, indent=2)
@@ -0,0 +1,121 @@
+"""
+Stage of a thread based processing pipeline.
+"""
+
+from collections.abc import Callable
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any
+
+
+class PipelineStage:
+  """
+  Worker threads handling the items of a bounded
+  queue. put() blocks while the queue is full,
+  so a slow stage throttles the stages feeding it.
+
+  Exceptions of the handler don't stop the stage,
+  the first one is kept and returned by error().
+  """
+
+  # Tells a worker to stop
+  __STOP = object()
+
+  def __init__(
+    self,
+    name: str,
+    handle: Callable[[Any], None],
+    workers: int = 1,
+    max_queued: int = 0,
+  ):
+    """
+    CTOR for PipelineStage. max_queued
+    of 0 means an unbounded queue.
+    """
+    self.__handle = handle
+    self.__queue: Queue[Any] = Queue(maxsize=max_queued)
+    self.__lock = Lock()
+    self.__error: Exception | None = None
+    self.__dropping = False
+    self.__workers = [
+      Thread(target=self.__work, name=f'{name}_{index}', daemon=True)
+      for index in range(workers)
+    ]
+    for worker in self.__workers:
+      worker.start()
+
+  def __enter__(self) -> 'PipelineStage':
+    """
+    Enter context, nothing to do.
+    """
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    """
+    Leave context, handle remaining items
+    unless the context is left due to an error.
+    """
+    self.shutdown(wait=exc_type is None)
+
+  def put(self, item: Any) -> None:
+    """
+    Queue an item, blocks while
+    the queue is full.
+    """
+    self.__queue.put(item)
+
+  def depth(self) -> int:
+    """
+    Return the number of queued items not
+    yet taken by a worker.
+    """
+    return self.__queue.qsize()
+
+  def join(self) -> None:
+    """
+    Wait until all queued items are handled.
+    """
+    self.__queue.join()
+
+  def error(self) -> Exception | None:
+    """
+    First exception raised by the handler,
+    None if all items succeeded so far.
+    """
+    with self.__lock:
+      return self.__error
+
+  def shutdown(self, wait: bool = True) -> None:
+    """
+    Stop the workers. If wait is set, block
+    until all queued items are handled,
+    otherwise queued items are dropped.
+    """
+    if not wait:
+      with self.__lock:
+        self.__dropping = True
+      return
+    for _ in self.__workers:
+      self.__queue.put(self.__STOP)
+    for worker in self.__workers:
+      worker.join()
+
+  def __work(self) -> None:
+    """
+    Worker thread loop.
+    """
+    while True:
+      item = self.__queue.get()
+      try:
+        if item is self.__STOP:
+          return
+        with self.__lock:
+          if self.__dropping:
+            continue
+        self.__handle(item)
+      except Exception as e:
+        with self.__lock:
+          if self.__error is None:
+            self.__error = e
+      finally:
+        self.__queue.task_done()
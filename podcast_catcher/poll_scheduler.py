@@ -0,0 +1,163 @@
+"""
+Decide when each feed is polled
+next in daemon mode.
+"""
+
+import heapq
+from datetime import datetime
+from statistics import median
+from time import time
+
+from config_file import ConfigFile
+from feed import Feed
+from feed_refresher import FeedRefresher
+
+
+class PollScheduler:
+  """
+  Keep all feeds in a priority queue ordered by
+  the time they are due next.
+
+  Each feed is polled on its own interval: a
+  fraction of the median gap between its recent
+  episodes, but never shorter than the interval
+  the feed suggests (<ttl>, sy:updatePeriod).
+  Unchanged feeds back off, so quiet feeds cost
+  fewer and fewer requests. Intervals are always
+  kept between min_interval and max_interval.
+  """
+
+  # Published times kept per feed
+  HISTORY_SIZE = 10
+  # Poll this many times per typical episode gap
+  POLLS_PER_GAP = 4
+  # Interval growth of unchanged or failed feeds
+  BACKOFF = 1.5
+
+  def __init__(
+    self,
+    config_feeds: list[ConfigFile.Feed],
+    min_interval: float,
+    max_interval: float,
+  ):
+    """
+    CTOR for PollScheduler, all
+    feeds are due right away.
+    """
+    self.__min_interval = min_interval
+    self.__max_interval = max_interval
+    self.__feeds = {feed.name(): feed for feed in config_feeds}
+    self.__intervals = {name: min_interval for name in self.__feeds}
+    # Newest published timestamps per feed, oldest first
+    self.__history: dict[str, list[float]] = {name: [] for name in self.__feeds}
+    self.__updated: dict[str, datetime] = {}
+    # (due time, sequence, feed name), the sequence
+    # keeps feeds due at the same time in config order
+    self.__queue: list[tuple[float, int, str]] = []
+    self.__sequence = 0
+    now = time()
+    for name in self.__feeds:
+      self.__push(name, now)
+
+  def __push(self, name: str, due: float) -> None:
+    """
+    Queue a feed to be polled at due.
+    """
+    heapq.heappush(self.__queue, (due, self.__sequence, name))
+    self.__sequence += 1
+
+  def __clamp(self, interval: float) -> float:
+    """
+    Keep interval within the configured bounds.
+    """
+    return min(max(interval, self.__min_interval), self.__max_interval)
+
+  def next_due(self) -> float | None:
+    """
+    Time (epoch seconds) the next feed is
+    due, None if no feed is scheduled.
+    """
+    if len(self.__queue) == 0:
+      return None
+    return self.__queue[0][0]
+
+  def due(self, now: float | None = None) -> list[ConfigFile.Feed]:
+    """
+    Remove and return all feeds due by now. Each
+    of them must be passed to update() or failed()
+    to be scheduled again.
+    """
+    if now is None:
+      now = time()
+    feeds = []
+    while len(self.__queue) > 0 and self.__queue[0][0] <= now:
+      _, _, name = heapq.heappop(self.__queue)
+      feeds.append(self.__feeds[name])
+    return feeds
+
+  def interval(self, config_feed: ConfigFile.Feed) -> float:
+    """
+    Return the current poll interval
+    of a feed in seconds.
+    """
+    return self.__intervals[config_feed.name()]
+
+  def update(self, result: FeedRefresher.Result) -> float:
+    """
+    Learn from a refresh and schedule the next
+    poll of its feed. Returns the new interval.
+    """
+    name = result.config_feed().name()
+    feed = result.feed()
+    interval = self.__intervals[name]
+    if feed is None or feed.updated() == self.__updated.get(name):
+      # Unchanged since the last poll
+      interval *= self.BACKOFF
+    else:
+      self.__updated[name] = feed.updated()
+      # Entries of a StreamFeed can only be iterated
+      # once, only the new ones are known then.
+      entries = feed.entries() if isinstance(feed, Feed) else result.entries()
+      estimate = self.__estimate(name, [entry.published() for entry in entries])
+      if estimate is not None:
+        interval = estimate
+      if feed.update_interval() is not None:
+        # The feed asks not to be polled more often
+        interval = max(interval, feed.update_interval())
+    return self.__schedule(name, interval)
+
+  def failed(self, config_feed: ConfigFile.Feed) -> float:
+    """
+    Schedule the next poll of a feed
+    whose refresh or downloads failed.
+    Returns the new interval.
+    """
+    name = config_feed.name()
+    return self.__schedule(name, self.__intervals[name] * self.BACKOFF)
+
+  def __schedule(self, name: str, interval: float) -> float:
+    """
+    Set the interval of a feed and queue it.
+    """
+    interval = self.__clamp(interval)
+    self.__intervals[name] = interval
+    self.__push(name, time() + interval)
+    return interval
+
+  def __estimate(self, name: str, published: list[datetime]) -> float | None:
+    """
+    Merge published times into the history of
+    a feed and estimate its poll interval from
+    the median gap between episodes.
+    """
+    history = self.__history[name]
+    merged = sorted(set(history) | {date.timestamp() for date in published})
+    history[:] = merged[-self.HISTORY_SIZE :]
+    gaps = [
+      newer - older
+      for older, newer in zip(history[:-1], history[1:], strict=True)
+      if newer > older
+    ]
+    if len(gaps) == 0:
+      return None
+    return median(gaps) / self.POLLS_PER_GAP
@@ -0,0 +1,173 @@
+"""
+Delete downloaded episodes by
+their retention policies.
+"""
+
+from collections.abc import Callable
+from datetime import UTC, datetime
+from pathlib import Path
+from sys import stderr
+from threading import Lock
+
+from config_file import ConfigFile
+from episode_tracker import EpisodeTracker
+from metrics import Metrics
+from retention_policy import RetentionPolicy
+from sqlite_episode_tracker import SqliteEpisodeTracker
+
+
+class Pruner:
+  """
+  Apply the retention policy of each feed, or
+  keep_last and max_age_days of the settings for
+  feeds without one, and max_bytes of the
+  settings to all downloads together.
+
+  Works on the path and size the episode trackers
+  record for each download, the download folder
+  is never walked. Deleted episodes stay tracked,
+  so they aren't downloaded again.
+  """
+
+  def __init__(
+    self,
+    config: ConfigFile,
+    episode_tracker: Callable[[str], EpisodeTracker | SqliteEpisodeTracker],
+  ):
+    """
+    CTOR for Pruner. episode_tracker provides
+    the tracker of a feed by name, it must be
+    the one downloads are registered with.
+    """
+    self.__config = config
+    self.__episode_tracker = episode_tracker
+    self.__lock = Lock()
+    # Feeds pruned since the last prune_all()
+    self.__pruned: set[str] = set()
+
+  def __feed_policy(self, config_feed: ConfigFile.Feed) -> RetentionPolicy | None:
+    """
+    Retention policy of a single feed.
+    """
+    if config_feed.retention() is not None:
+      return config_feed.retention()
+    retention = self.__config.settings().retention()
+    if retention is None:
+      return None
+    # max_bytes of the settings limits all feeds together
+    return RetentionPolicy(
+      keep_last=retention.keep_last(), max_age_days=retention.max_age_days()
+    )
+
+  def prune_feed(
+    self,
+    config_feed: ConfigFile.Feed,
+    episode_tracker: EpisodeTracker | SqliteEpisodeTracker,
+  ) -> None:
+    """
+    Delete the episodes of a feed beyond its
+    retention policy, e.g. after a refresh.
+    """
+    with self.__lock:
+      self.__pruned.add(config_feed.name())
+    self.__prune(config_feed, episode_tracker)
+
+  def __prune(
+    self,
+    config_feed: ConfigFile.Feed,
+    episode_tracker: EpisodeTracker | SqliteEpisodeTracker,
+  ) -> None:
+    """
+    Apply the retention policy of a feed.
+    """
+    policy = self.__feed_policy(config_feed)
+    if policy is None:
+      return
+    episodes = episode_tracker.stored_episodes()
+    expired = policy.expired(self.__sizes(episodes), datetime.now(UTC))
+    self.__delete(config_feed, episode_tracker, episodes[:expired])
+
+  def prune_all(self) -> None:
+    """
+    Prune all feeds not pruned since the last
+    call (their episodes still age), then
+    limit the size of all downloads.
+    """
+    with self.__lock:
+      pruned = set(self.__pruned)
+      self.__pruned.clear()
+    trackers: dict[str, EpisodeTracker | SqliteEpisodeTracker] = {}
+    for config_feed in self.__config.feeds():
+      name = config_feed.name()
+      if name not in pruned and self.__feed_policy(config_feed) is not None:
+        trackers[name] = self.__episode_tracker(name)
+        self.__prune(config_feed, trackers[name])
+
+    retention = self.__config.settings().retention()
+    if retention is None or retention.max_bytes() is None:
+      return
+    for config_feed in self.__config.feeds():
+      if config_feed.name() not in trackers:
+        trackers[config_feed.name()] = self.__episode_tracker(config_feed.name())
+    # Merge the stored episodes of all feeds, oldest first
+    stored = [
+      (config_feed, episode)
+      for config_feed in self.__config.feeds()
+      for episode in trackers[config_feed.name()].stored_episodes()
+    ]
+    stored.sort(key=lambda item: self.__published(item[1]))
+    expired = RetentionPolicy(max_bytes=retention.max_bytes()).expired(
+      self.__sizes([episode for _, episode in stored]), datetime.now(UTC)
+    )
+    for config_feed in self.__config.feeds():
+      episodes = [episode for feed, episode in stored[:expired] if feed is config_feed]
+      self.__delete(config_feed, trackers[config_feed.name()], episodes)
+
+  @staticmethod
+  def __published(episode: dict[str, str | int]) -> datetime:
+    """
+    Return the published time of a stored episode.
+    """
+    return datetime.fromisoformat(episode[EpisodeTracker.EPISODE_PUBLISHED])
+
+  @classmethod
+  def __sizes(cls, episodes: list[dict[str, str | int]]) -> list[tuple[datetime, int]]:
+    """
+    Return (published, size) pairs of stored episodes.
+    """
+    return [
+      (cls.__published(episode), episode[EpisodeTracker.EPISODE_SIZE])
+      for episode in episodes
+    ]
+
+  @staticmethod
+  def __delete(
+    config_feed: ConfigFile.Feed,
+    episode_tracker: EpisodeTracker | SqliteEpisodeTracker,
+    episodes: list[dict[str, str | int]],
+  ) -> None:
+    """
+    Delete the files of episodes and
+    drop them from the tracker.
+    """
+    if len(episodes) == 0:
+      return
+    deleted = set()
+    for episode in episodes:
+      try:
+        Path(episode[EpisodeTracker.EPISODE_PATH]).unlink(missing_ok=True)
+      except OSError as e:
+        print(f"Feed '{config_feed.name()}': deleting failed ({e})", file=stderr)
+        continue
+      deleted.add(episode[EpisodeTracker.EPISODE_URL])
+      Metrics.count('retention_deleted', feed=config_feed.name())
+      Metrics.count(
+        'retention_bytes_freed',
+        episode[EpisodeTracker.EPISODE_SIZE],
+        feed=config_feed.name(),
+      )
+      print(
+        f'\t{config_feed.name()}: {episode[EpisodeTracker.EPISODE_TITLE]}'
+        f' ({episode[EpisodeTracker.EPISODE_PUBLISHED]})... Deleted'
+      )
+    episode_tracker.forget_files(deleted)
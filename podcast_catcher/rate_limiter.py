@@ -0,0 +1,218 @@
+"""
+Limit the bandwidth of downloads.
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock
+from time import monotonic
+
+from exception import PodcastCatcherError
+
+
+class RateLimiter:
+  """
+  Shape downloads by token buckets, one for all
+  downloads (max_rate) and one per host
+  (max_rate_per_host), both in bytes per second.
+
+  Within the full speed windows (local time, e.g.
+  '01:00-06:00'), the limits are lifted. Outside
+  of them, downloads are either throttled by the
+  limits or deferred: they don't start before the
+  next window opens (running ones finish).
+
+  Also measures the throughput of all downloads.
+  """
+
+  OUTSIDE_THROTTLE = 'throttle'
+  OUTSIDE_DEFER = 'defer'
+
+  OUTSIDE_MODES = [OUTSIDE_THROTTLE, OUTSIDE_DEFER]
+
+  # Bucket size, in seconds of its rate
+  BURST_SECONDS = 1.0
+  # Smallest read of a throttled download, several
+  # reads per second keep the rate smooth.
+  READS_PER_SECOND = 10
+  MIN_READ_SIZE = 4096
+  # Throughput is averaged over this many seconds
+  THROUGHPUT_SECONDS = 5.0
+
+  class TokenBucket:
+    """
+    Bucket refilled with rate tokens (bytes) per
+    second, holding at most capacity tokens.
+    Reservations may overdraw it, the caller
+    waits until the debt is paid off.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+      """
+      CTOR for TokenBucket, starts full.
+      """
+      self.__rate = rate
+      self.__capacity = capacity
+      self.__tokens = capacity
+      self.__updated = monotonic()
+      self.__lock = Lock()
+
+    def reserve(self, amount: float) -> float:
+      """
+      Take amount tokens and return the seconds
+      to wait before using them.
+      """
+      with self.__lock:
+        now = monotonic()
+        self.__tokens = min(
+          self.__capacity, self.__tokens + (now - self.__updated) * self.__rate
+        )
+        self.__updated = now
+        self.__tokens -= amount
+        return max(0.0, -self.__tokens / self.__rate)
+
+  def __init__(
+    self,
+    max_rate: float | None = None,
+    max_rate_per_host: float | None = None,
+    full_speed_windows: list[str] | None = None,
+    outside_windows: str = OUTSIDE_THROTTLE,
+  ):
+    """
+    CTOR for RateLimiter. Without limits
+    and windows, it only measures.
+    """
+    self.__max_rate = max_rate
+    self.__max_rate_per_host = max_rate_per_host
+    self.__windows = [self.parse_window(window) for window in full_speed_windows or []]
+    self.__outside_windows = outside_windows
+    self.__bucket = self.__create_bucket(max_rate)
+    self.__host_buckets: dict[str, RateLimiter.TokenBucket] = {}
+    self.__lock = Lock()
+    # (monotonic time, bytes) of recent reads
+    self.__transfers: deque[tuple[float, int]] = deque()
+
+  @classmethod
+  def __create_bucket(cls, rate: float | None) -> 'RateLimiter.TokenBucket | None':
+    """
+    Bucket for rate, None if unlimited.
+    """
+    if rate is None:
+      return None
+    return cls.TokenBucket(rate, rate * cls.BURST_SECONDS)
+
+  @staticmethod
+  def parse_window(window: str) -> tuple[int, int]:
+    """
+    Start and end of a 'HH:MM-HH:MM' window in
+    minutes after midnight. A window may span
+    midnight, e.g. '22:00-06:00'.
+    """
+    try:
+      start, end = (
+        datetime.strptime(part.strip(), '%H:%M') for part in window.split('-')
+      )
+    except ValueError:
+      raise PodcastCatcherError(f"Invalid time window '{window}'") from None
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+  def in_window(self, now: datetime | None = None) -> bool:
+    """
+    Return if now is within a full speed
+    window (always, if none are set).
+    """
+    if len(self.__windows) == 0:
+      return True
+    if now is None:
+      now = datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end in self.__windows:
+      if start <= end and start <= minute < end:
+        return True
+      if start > end and (minute >= start or minute < end):
+        return True
+    return False
+
+  def __full_speed(self) -> bool:
+    """
+    Return if the limits are lifted
+    by a full speed window right now.
+    """
+    return len(self.__windows) > 0 and self.in_window()
+
+  def start_delay(self, now: datetime | None = None) -> float:
+    """
+    Seconds a download has to wait before
+    it may start, 0 unless it is deferred
+    to the next full speed window.
+    """
+    if self.__outside_windows != self.OUTSIDE_DEFER or self.in_window(now):
+      return 0.0
+    if now is None:
+      now = datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    starts = []
+    for start, _ in self.__windows:
+      opens = midnight + timedelta(minutes=start)
+      if opens <= now:
+        opens += timedelta(days=1)
+      starts.append(opens)
+    return (min(starts) - now).total_seconds()
+
+  def read_size(self, buffer_size: int) -> int:
+    """
+    Size of the next read of a download, smaller
+    than buffer_size if the download is throttled.
+    """
+    rates = [
+      rate for rate in (self.__max_rate, self.__max_rate_per_host) if rate is not None
+    ]
+    if len(rates) == 0 or self.__full_speed():
+      return buffer_size
+    return min(
+      buffer_size, max(self.MIN_READ_SIZE, int(min(rates) / self.READS_PER_SECOND))
+    )
+
+  def reserve(self, host: str, amount: int) -> float:
+    """
+    Account amount bytes read from host and return
+    the seconds to wait before reading on.
+    """
+    now = monotonic()
+    with self.__lock:
+      self.__transfers.append((now, amount))
+      while self.__transfers[0][0] < now - self.THROUGHPUT_SECONDS:
+        self.__transfers.popleft()
+      if self.__max_rate_per_host is not None and host not in self.__host_buckets:
+        self.__host_buckets[host] = self.__create_bucket(self.__max_rate_per_host)
+    if self.__full_speed():
+      return 0.0
+    waits = [0.0]
+    if self.__bucket is not None:
+      waits.append(self.__bucket.reserve(amount))
+    if self.__max_rate_per_host is not None:
+      waits.append(self.__host_buckets[host].reserve(amount))
+    return max(waits)
+
+  def throughput(self) -> float:
+    """
+    Bytes per second read by all downloads
+    over the last few seconds.
+    """
+    now = monotonic()
+    with self.__lock:
+      amount = sum(
+        size for time, size in self.__transfers if time >= now - self.THROUGHPUT_SECONDS
+      )
+    return amount / self.THROUGHPUT_SECONDS
+
+  @staticmethod
+  def format_rate(rate: float) -> str:
+    """
+    Human readable rate, e.g. '1.5 MiB/s'.
+    """
+    for unit in ('B/s', 'KiB/s', 'MiB/s'):
+      if rate < 1024:
+        return f'{rate:.1f} {unit}'
+      rate /= 1024
+    return f'{rate:.1f} GiB/s'
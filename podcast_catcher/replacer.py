@@ -2,14 +2,25 @@
 Flexible string replacer class.
 """
 
+import re
 from collections.abc import Callable
+from functools import lru_cache, reduce
 from pathlib import Path
 from urllib.parse import urlparse
-from functools import reduce
 
 from exception import PodcastCatcherError
 from feed import Entry, Feed
 
+# Encloses the name of a placeholder
+PLACEHOLDER_TOKEN = '%'
+
+
+def placeholder(name: str) -> str:
+  """
+  Return the placeholder of name, e.g. %name%.
+  """
+  return f'{PLACEHOLDER_TOKEN}{name}{PLACEHOLDER_TOKEN}'
+
 
 class Replacer:
   """
@@ -17,63 +28,58 @@ class Replacer:
   properties.
   """
 
-  PLACEHOLDER_TOKEN = '%'
+  PLACEHOLDER_TOKEN = PLACEHOLDER_TOKEN
   ILLEGAL_CHARACTERS = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
   SANITIZE_TOKEN = '_'
 
   PLACEHOLDER_ITEMS: dict[str, Callable[[str, Feed, Entry], str]] = {
     # Config properties
-    f'{PLACEHOLDER_TOKEN}config_name{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: name,
+    placeholder('config_name'): lambda name, feed, entry: name,
     # Feed properties
-    f'{PLACEHOLDER_TOKEN}feed_title{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.title(),
-    f'{PLACEHOLDER_TOKEN}feed_subtitle{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.subtitle(),
-    f'{PLACEHOLDER_TOKEN}feed_description{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.description(),
-    f'{PLACEHOLDER_TOKEN}feed_link{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.link() if feed.link() is not None else '',
-    f'{PLACEHOLDER_TOKEN}feed_date{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.updated().strftime('%Y%m%d'),
-    f'{PLACEHOLDER_TOKEN}feed_datetime{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: feed.updated().strftime('%Y%m%d-%H%M%S'),
+    placeholder('feed_title'): lambda name, feed, entry: feed.title(),
+    placeholder('feed_subtitle'): lambda name, feed, entry: feed.subtitle(),
+    placeholder('feed_description'): lambda name, feed, entry: feed.description(),
+    placeholder('feed_link'): lambda name, feed, entry: (
+      feed.link() if feed.link() is not None else ''
+    ),
+    placeholder('feed_date'): lambda name, feed, entry: feed.updated().strftime(
+      '%Y%m%d'
+    ),
+    placeholder('feed_datetime'): lambda name, feed, entry: feed.updated().strftime(
+      '%Y%m%d-%H%M%S'
+    ),
     # Entry properties
-    f'{PLACEHOLDER_TOKEN}episode_date{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.published().strftime('%Y%m%d'),
-    f'{PLACEHOLDER_TOKEN}episode_datetime{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.published().strftime('%Y%m%d-%H%M%S'),
-    f'{PLACEHOLDER_TOKEN}episode_url_basename{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: Path(urlparse(entry.enclosure()).path).stem,
-    f'{PLACEHOLDER_TOKEN}episode_url_extension{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: Path(urlparse(entry.enclosure()).path).suffix,
-    f'{PLACEHOLDER_TOKEN}episode_title{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.title(),
-    f'{PLACEHOLDER_TOKEN}episode_title_safe{PLACEHOLDER_TOKEN}': lambda name, feed,
-    entry: reduce(lambda str, repl: str.replace(repl, Replacer.SANITIZE_TOKEN), [entry.title()] + Replacer.ILLEGAL_CHARACTERS).lstrip().rstrip(),
-    f'{PLACEHOLDER_TOKEN}episode_author{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.author(),
-    f'{PLACEHOLDER_TOKEN}episode_summary{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.summary(),
-    f'{PLACEHOLDER_TOKEN}episode_link{PLACEHOLDER_TOKEN}': lambda name,
-    feed,
-    entry: entry.link() if entry.link() is not None else '',
+    placeholder('episode_date'): lambda name, feed, entry: entry.published().strftime(
+      '%Y%m%d'
+    ),
+    placeholder('episode_datetime'): lambda name, feed, entry: (
+      entry.published().strftime('%Y%m%d-%H%M%S')
+    ),
+    placeholder('episode_url_basename'): lambda name, feed, entry: (
+      Path(urlparse(entry.enclosure()).path).stem
+    ),
+    placeholder('episode_url_extension'): lambda name, feed, entry: (
+      Path(urlparse(entry.enclosure()).path).suffix
+    ),
+    placeholder('episode_title'): lambda name, feed, entry: entry.title(),
+    placeholder('episode_title_safe'): lambda name, feed, entry: (
+      reduce(
+        lambda str, repl: str.replace(repl, Replacer.SANITIZE_TOKEN),
+        [entry.title()] + Replacer.ILLEGAL_CHARACTERS,
+      )
+      .lstrip()
+      .rstrip()
+    ),
+    placeholder('episode_author'): lambda name, feed, entry: entry.author(),
+    placeholder('episode_summary'): lambda name, feed, entry: entry.summary(),
+    placeholder('episode_link'): lambda name, feed, entry: (
+      entry.link() if entry.link() is not None else ''
+    ),
   }
 
+  # Matches any of the placeholders
+  PLACEHOLDER_PATTERN = re.compile(f'({"|".join(map(re.escape, PLACEHOLDER_ITEMS))})')
+
   def __init__(self):
     """
     CTOR for replacer class.
@@ -82,27 +88,57 @@ class Replacer:
     self.__name = None
     self.__feed = None
     self.__entry = None
+    # Placeholder values of the current entry
+    self.__values: dict[str, str] = {}
 
   def update_name(self, name: str) -> None:
     """
-    Update feed name.
+    Update feed name. Clears feed, entry
+    and the memoized values.
     """
     self.__name = name
     self.__feed = None
     self.__entry = None
+    self.__values = {}
 
   def update_feed(self, feed: Feed) -> None:
     """
-    Update feed properties.
+    Update feed properties. Clears entry
+    and the memoized values.
     """
     self.__feed = feed
     self.__entry = None
+    self.__values = {}
 
   def update_entry(self, entry: Entry) -> None:
     """
-    Update entry properties.
+    Update entry properties. Clears
+    the memoized values.
     """
     self.__entry = entry
+    self.__values = {}
+
+  @staticmethod
+  @lru_cache(maxsize=256)
+  def compile(template: str) -> tuple[str, ...]:
+    """
+    Split template into literal text (even
+    indexes) and placeholders (odd indexes).
+    Templates are only parsed once.
+    """
+    return tuple(Replacer.PLACEHOLDER_PATTERN.split(template))
+
+  def __value(self, placeholder: str) -> str:
+    """
+    Value of a placeholder, computed once per entry.
+    """
+    if placeholder not in self.__values:
+      self.__values[placeholder] = self.PLACEHOLDER_ITEMS[placeholder](
+        self.__name,
+        self.__feed,
+        self.__entry,
+      )
+    return self.__values[placeholder]
 
   def replace(self, input: str) -> str:
     """
@@ -115,13 +151,8 @@ class Replacer:
         f'Replacer sources not all set: Name: {self.__name}, feed: {self.__feed},'
         f'entry: {self.__entry}'
       )
-    for key, value in self.PLACEHOLDER_ITEMS.items():
-      input = input.replace(
-        key,
-        value(
-          self.__name,
-          self.__feed,
-          self.__entry,
-        ),
-      )
-    return input
+    # Only placeholders used by the template are computed
+    return ''.join(
+      part if index % 2 == 0 else self.__value(part)
+      for index, part in enumerate(self.compile(input))
+    )
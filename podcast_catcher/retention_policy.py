@@ -0,0 +1,83 @@
+"""
+Decide which downloaded episodes
+are deleted again.
+"""
+
+from datetime import datetime, timedelta
+
+
+class RetentionPolicy:
+  """
+  Limits of the episodes kept on disk: the
+  newest keep_last episodes, episodes not older
+  than max_age_days and at most max_bytes. Every
+  limit is optional, episodes are deleted if
+  they exceed any of them, oldest first.
+  """
+
+  def __init__(
+    self,
+    keep_last: int | None = None,
+    max_age_days: float | None = None,
+    max_bytes: int | None = None,
+  ):
+    """
+    CTOR for RetentionPolicy.
+    """
+    self.__keep_last = keep_last
+    self.__max_age_days = max_age_days
+    self.__max_bytes = max_bytes
+
+  def keep_last(self) -> int | None:
+    """
+    Return the number of newest episodes
+    to keep, None for all.
+    """
+    return self.__keep_last
+
+  def max_age_days(self) -> float | None:
+    """
+    Age of the oldest episode to
+    keep, None for any age.
+    """
+    return self.__max_age_days
+
+  def max_bytes(self) -> int | None:
+    """
+    Size of all episodes to keep
+    (bytes), None for any size.
+    """
+    return self.__max_bytes
+
+  def expired(self, episodes: list[tuple[datetime, int]], now: datetime) -> int:
+    """
+    Return the number of episodes to delete (the oldest) of
+    (published, size) pairs, sorted from oldest
+    to newest.
+    """
+    total = sum(size for _, size in episodes)
+    for index, (published, size) in enumerate(episodes):
+      # All limits loosen towards newer episodes,
+      # the first one to keep ends the search.
+      too_many = (
+        self.__keep_last is not None and len(episodes) - index > self.__keep_last
+      )
+      too_old = self.__max_age_days is not None and (
+        now - published > timedelta(days=self.__max_age_days)
+      )
+      too_large = self.__max_bytes is not None and total > self.__max_bytes
+      if not (too_many or too_old or too_large):
+        return index
+      total -= size
+    return len(episodes)
+
+  def __repr__(self) -> str:
+    """
+    Return string representation.
+    """
+    items = [
+      f"'keep_last': {self.keep_last()}",
+      f"'max_age_days': {self.max_age_days()}",
+      f"'max_bytes': {self.max_bytes()}",
+    ]
+    return f'{{{", ".join(items)}}}'
@@ -0,0 +1,222 @@
+"""
+Decide if and when failed HTTP
+requests are retried.
+"""
+
+import random
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import monotonic
+
+from exception import HostUnavailableError, HttpStatusError
+from metrics import Metrics
+
+
+class RetryPolicy:
+  """
+  Retry transient failures (connection errors,
+  timeouts, 408, 429 and 5xx responses) up to
+  max_attempts times. Waits grow exponentially
+  from base_delay up to max_delay, with full
+  jitter, unless the server asks for a delay
+  (Retry-After).
+
+  Each host has a circuit breaker: after
+  breaker_threshold failures in a row, requests
+  to the host fail right away for breaker_timeout
+  seconds. After that, requests are let through
+  again, the next failure opens it again. A
+  Retry-After longer than max_delay opens it
+  for that long.
+  """
+
+  RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+  # Statuses which don't tell the host is failing
+  THROTTLE_STATUSES = {429}
+
+  class CircuitBreaker:
+    """
+    Failure state of a single host.
+    """
+
+    def __init__(self):
+      """
+      CTOR for CircuitBreaker, closed.
+      """
+      self.__failures = 0
+      self.__open_until = 0.0
+
+    def failures(self) -> int:
+      """
+      Failures in a row.
+      """
+      return self.__failures
+
+    def remaining(self, now: float) -> float:
+      """
+      Seconds the breaker stays open,
+      0 if requests may pass.
+      """
+      return max(0.0, self.__open_until - now)
+
+    def succeeded(self) -> None:
+      """
+      Close the breaker.
+      """
+      self.__failures = 0
+      self.__open_until = 0.0
+
+    def failed(self) -> None:
+      """
+      Count a failure.
+      """
+      self.__failures += 1
+
+    def open(self, until: float) -> None:
+      """
+      Reject requests until the
+      given monotonic time.
+      """
+      self.__open_until = max(self.__open_until, until)
+
+  def __init__(
+    self,
+    max_attempts: int = 3,
+    base_delay: float = 1,
+    max_delay: float = 60,
+    breaker_threshold: int = 5,
+    breaker_timeout: float = 300,
+  ):
+    """
+    CTOR for RetryPolicy.
+    """
+    self.__max_attempts = max_attempts
+    self.__base_delay = base_delay
+    self.__max_delay = max_delay
+    self.__breaker_threshold = breaker_threshold
+    self.__breaker_timeout = breaker_timeout
+    self.__breakers: dict[str, RetryPolicy.CircuitBreaker] = {}
+    self.__lock = Lock()
+
+  def __remaining(self, host: str) -> float:
+    """
+    Seconds the circuit breaker of
+    host stays open, 0 if closed.
+    """
+    with self.__lock:
+      breaker = self.__breakers.get(host)
+      return breaker.remaining(monotonic()) if breaker is not None else 0.0
+
+  def available(self, host: str) -> bool:
+    """
+    Return if requests to host may pass.
+    """
+    return self.__remaining(host) == 0
+
+  def check(self, host: str) -> None:
+    """
+    Raise HostUnavailableError if the
+    circuit breaker of host is open.
+    """
+    remaining = self.__remaining(host)
+    if remaining > 0:
+      Metrics.count('http_circuit_rejected', host=host)
+      raise HostUnavailableError(
+        f'Host {host} unavailable after repeated failures, retrying in {remaining:.0f}s'
+      )
+
+  def succeeded(self, host: str) -> None:
+    """
+    Record a request which reached host.
+    """
+    with self.__lock:
+      if host in self.__breakers:
+        self.__breakers[host].succeeded()
+
+  def failed(self, host: str, error: Exception) -> None:
+    """
+    Record a failed request to host and open
+    its circuit breaker if it fails too often.
+    """
+    retry_after = error.retry_after() if isinstance(error, HttpStatusError) else None
+    throttled = (
+      isinstance(error, HttpStatusError) and error.status() in self.THROTTLE_STATUSES
+    )
+    now = monotonic()
+    with self.__lock:
+      breaker = self.__breakers.setdefault(host, self.CircuitBreaker())
+      was_open = breaker.remaining(now) > 0
+      if not throttled:
+        breaker.failed()
+        if breaker.failures() >= self.__breaker_threshold:
+          breaker.open(now + self.__breaker_timeout)
+      if retry_after is not None and retry_after > self.__max_delay:
+        # Don't wait that long, skip the host meanwhile
+        breaker.open(now + retry_after)
+      tripped = not was_open and breaker.remaining(now) > 0
+    if tripped:
+      Metrics.count('http_circuit_opened', host=host)
+
+  def delay(self, error: Exception, attempt: int) -> float | None:
+    """
+    Seconds to wait before retrying a request
+    which failed with error in its attempt-th
+    attempt (from 1), None to give up.
+    """
+    if attempt >= self.__max_attempts or not self.is_transient(error):
+      return None
+    retry_after = error.retry_after() if isinstance(error, HttpStatusError) else None
+    if retry_after is not None:
+      return retry_after if retry_after <= self.__max_delay else None
+    # Full jitter: spreads retries of many clients
+    # (and threads) hitting the same host.
+    return random.uniform(
+      0, min(self.__max_delay, self.__base_delay * 2 ** (attempt - 1))
+    )
+
+  def is_transient(self, error: Exception) -> bool:
+    """
+    Return if a request failing with
+    error may succeed when retried.
+    """
+    if isinstance(error, HttpStatusError):
+      return error.status() in self.RETRY_STATUSES
+    # requests takes long to import, it's loaded
+    # by the HttpLoader raising the error.
+    import requests
+    import urllib3
+
+    if isinstance(error, requests.exceptions.SSLError):
+      # Certificate problems don't go away
+      return False
+    return isinstance(
+      error,
+      (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        urllib3.exceptions.ProtocolError,
+        urllib3.exceptions.TimeoutError,
+      ),
+    )
+
+  @staticmethod
+  def parse_retry_after(value: str | None) -> float | None:
+    """
+    Seconds of a Retry-After header, given
+    as seconds or HTTP date. None if missing
+    or invalid.
+    """
+    if value is None:
+      return None
+    value = value.strip()
+    if value.isdigit():
+      return float(value)
+    try:
+      date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+      return None
+    if date.tzinfo is None:
+      date = date.replace(tzinfo=UTC)
+    return max(0.0, (date - datetime.now(UTC)).total_seconds())
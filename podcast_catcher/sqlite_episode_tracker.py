@@ -0,0 +1,290 @@
+"""
+Manage state which episodes were
+already downloaded in an SQLite database.
+"""
+
+import sqlite3
+from datetime import datetime
+from json import JSONDecodeError
+from pathlib import Path
+from threading import Lock
+
+from config_file import ConfigFile
+from episode_tracker import EpisodeTracker
+from feed import Entry
+from metrics import Metrics
+
+
+class SqliteEpisodeTracker:
+  """
+  Keep track of already downloaded
+  episodes per feed in one indexed
+  database for all feeds.
+
+  Offers the same interface as EpisodeTracker.
+  Completed episodes are inserted right away,
+  but save() only commits once COMMIT_BATCH_SIZE
+  of them are pending. close() commits the rest.
+  """
+
+  DATABASE_FILE = 'episodes.sqlite3'
+
+  # Completed episodes per commit
+  COMMIT_BATCH_SIZE = 50
+
+  SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS episodes ('
+    ' feed TEXT NOT NULL,'
+    ' url TEXT NOT NULL,'
+    ' title TEXT NOT NULL,'
+    ' published TEXT NOT NULL,'
+    ' path TEXT,'
+    ' size INTEGER,'
+    ' PRIMARY KEY (feed, url)'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS episodes_published ON episodes (feed, published)',
+    # Feeds whose JSON tracker file was imported
+    'CREATE TABLE IF NOT EXISTS imported (feed TEXT PRIMARY KEY) WITHOUT ROWID',
+    # Oldest episode offered but not downloaded per feed
+    'CREATE TABLE IF NOT EXISTS unfinished ('
+    ' feed TEXT PRIMARY KEY,'
+    ' published TEXT NOT NULL'
+    ') WITHOUT ROWID',
+  ]
+
+  # Columns added to databases of older versions
+  COLUMNS = {'path': 'TEXT', 'size': 'INTEGER'}
+
+  # One connection per database, shared by all
+  # trackers (and threads) of the process.
+  __connections: dict[Path, tuple[sqlite3.Connection, Lock]] = {}
+  __connections_lock = Lock()
+
+  def __init__(self, config: ConfigFile, feed_name: str):
+    """
+    CTOR for SqliteEpisodeTracker.
+    """
+    data_dir = Path(config.settings().data_dir())
+    data_dir.mkdir(parents=True, exist_ok=True)
+    self.__feed_name = feed_name
+    # Completed episodes not committed yet
+    self.__uncommitted = 0
+    # Episodes offered for download, None until offer()
+    self.__offered: list[Entry] | None = None
+    self.__connection, self.__lock = self.__connect(
+      data_dir.joinpath(self.DATABASE_FILE)
+    )
+    self.__import_json(config)
+
+  @classmethod
+  def __connect(cls, database: Path) -> tuple[sqlite3.Connection, Lock]:
+    """
+    Open (or reuse) the connection to database.
+    """
+    with cls.__connections_lock:
+      if database not in cls.__connections:
+        connection = sqlite3.connect(database, check_same_thread=False)
+        # WAL: readers don't block the writer and a
+        # commit doesn't need to rewrite the database.
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in cls.SCHEMA:
+          connection.execute(statement)
+        existing = {row[1] for row in connection.execute('PRAGMA table_info(episodes)')}
+        for column, column_type in cls.COLUMNS.items():
+          if column not in existing:
+            connection.execute(
+              f'ALTER TABLE episodes ADD COLUMN {column} {column_type}'
+            )
+        connection.commit()
+        cls.__connections[database] = (connection, Lock())
+      return cls.__connections[database]
+
+  def __import_json(self, config: ConfigFile) -> None:
+    """
+    Import the JSON tracker file of the feed,
+    including its journal, once. The files
+    are left untouched.
+    """
+    with self.__lock:
+      imported = self.__connection.execute(
+        'SELECT 1 FROM imported WHERE feed = ?', (self.__feed_name,)
+      ).fetchone()
+      if imported is not None:
+        return
+      try:
+        completed_downloads = EpisodeTracker(config, self.__feed_name).episodes()
+      except JSONDecodeError:
+        # Broken JSON file, nothing to import
+        completed_downloads = []
+      self.__connection.executemany(
+        'INSERT OR IGNORE INTO episodes VALUES (?, ?, ?, ?, ?, ?)',
+        [
+          (
+            self.__feed_name,
+            episode[EpisodeTracker.EPISODE_URL],
+            episode[EpisodeTracker.EPISODE_TITLE],
+            episode[EpisodeTracker.EPISODE_PUBLISHED],
+            episode.get(EpisodeTracker.EPISODE_PATH),
+            episode.get(EpisodeTracker.EPISODE_SIZE),
+          )
+          for episode in completed_downloads
+        ],
+      )
+      self.__connection.execute('INSERT INTO imported VALUES (?)', (self.__feed_name,))
+      self.__connection.commit()
+
+  def complete(self, entry: Entry, path: Path | None = None) -> None:
+    """
+    Register completed download of an
+    episode, stored in file path.
+    """
+    stored_path, size = None, None
+    if path is not None:
+      stored_path, size = str(path.absolute()), path.stat().st_size
+    with self.__lock:
+      self.__connection.execute(
+        'INSERT OR IGNORE INTO episodes VALUES (?, ?, ?, ?, ?, ?)',
+        (
+          self.__feed_name,
+          entry.enclosure(),
+          entry.title(),
+          str(entry.published()),
+          stored_path,
+          size,
+        ),
+      )
+      self.__uncommitted += 1
+
+  def save(self) -> None:
+    """
+    Commit completed downloads once
+    a batch of them is pending.
+    """
+    if self.__uncommitted >= self.COMMIT_BATCH_SIZE:
+      self.__commit()
+
+  def close(self) -> None:
+    """
+    Commit all completed downloads at the
+    end of a feed and remember the oldest
+    offered episode not downloaded.
+    """
+    if self.__offered is not None:
+      downloaded = self.already_downloaded_links()
+      self.__store_unfinished(
+        [entry for entry in self.__offered if entry.enclosure() not in downloaded]
+      )
+      self.__offered = None
+    self.__commit()
+
+  def offer(self, entries: list[Entry]) -> None:
+    """
+    Remember the episodes offered for download.
+    Until close(), all of them count as unfinished,
+    so an aborted run can't hide older ones.
+    """
+    self.__offered = list(entries)
+    self.__store_unfinished(self.__offered)
+    self.__commit()
+
+  def __store_unfinished(self, entries: list[Entry]) -> None:
+    """
+    Store the publish date of the oldest
+    of entries, or drop it if empty.
+    """
+    with self.__lock:
+      if len(entries) == 0:
+        self.__connection.execute(
+          'DELETE FROM unfinished WHERE feed = ?', (self.__feed_name,)
+        )
+        return
+      oldest = min(entry.published() for entry in entries)
+      self.__connection.execute(
+        'INSERT OR REPLACE INTO unfinished VALUES (?, ?)',
+        (self.__feed_name, str(oldest)),
+      )
+
+  def unfinished(self) -> datetime | None:
+    """
+    Return the publish date of the oldest
+    episode offered but not downloaded.
+    """
+    with self.__lock:
+      row = self.__connection.execute(
+        'SELECT published FROM unfinished WHERE feed = ?', (self.__feed_name,)
+      ).fetchone()
+    if row is None:
+      return None
+    return datetime.fromisoformat(row[0])
+
+  def __commit(self) -> None:
+    """
+    Commit all completed downloads.
+    """
+    with self.__lock, Metrics.timer('tracker_save', backend='sqlite'):
+      self.__connection.commit()
+      self.__uncommitted = 0
+
+  def stored_episodes(self) -> list[dict[str, str | int]]:
+    """
+    Return downloaded episodes whose file is kept,
+    sorted from oldest to newest.
+    """
+    with self.__lock:
+      rows = self.__connection.execute(
+        'SELECT title, url, published, path, size FROM episodes'
+        ' WHERE feed = ? AND path IS NOT NULL ORDER BY published',
+        (self.__feed_name,),
+      ).fetchall()
+    return [
+      {
+        EpisodeTracker.EPISODE_TITLE: title,
+        EpisodeTracker.EPISODE_URL: url,
+        EpisodeTracker.EPISODE_PUBLISHED: published,
+        EpisodeTracker.EPISODE_PATH: path,
+        EpisodeTracker.EPISODE_SIZE: size,
+      }
+      for title, url, published, path, size in rows
+    ]
+
+  def forget_files(self, urls: set[str]) -> None:
+    """
+    Drop the files of episodes (e.g. deleted by
+    retention), the episodes stay downloaded.
+    """
+    with self.__lock:
+      self.__connection.executemany(
+        'UPDATE episodes SET path = NULL, size = NULL WHERE feed = ? AND url = ?',
+        [(self.__feed_name, url) for url in urls],
+      )
+      self.__connection.commit()
+      self.__uncommitted = 0
+
+  def already_downloaded_links(self) -> set[str]:
+    """
+    Set of already downloaded episodes (URL links).
+    """
+    with self.__lock:
+      rows = self.__connection.execute(
+        'SELECT url FROM episodes WHERE feed = ?', (self.__feed_name,)
+      )
+      return {url for (url,) in rows}
+
+  def latest_entry(self) -> dict[str, str] | None:
+    """
+    Get latest published and downloaded entry.
+    """
+    with self.__lock:
+      row = self.__connection.execute(
+        'SELECT title, url, published FROM episodes WHERE feed = ?'
+        ' ORDER BY published DESC LIMIT 1',
+        (self.__feed_name,),
+      ).fetchone()
+    if row is None:
+      return None
+    return {
+      EpisodeTracker.EPISODE_TITLE: row[0],
+      EpisodeTracker.EPISODE_URL: row[1],
+      EpisodeTracker.EPISODE_PUBLISHED: row[2],
+    }
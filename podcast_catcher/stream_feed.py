@@ -0,0 +1,334 @@
+"""
+Incremental parser for RSS 2.0
+and Atom feeds.
+"""
+
+from collections.abc import Callable, Iterator
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from sys import stderr
+from xml.etree.ElementTree import Element, XMLPullParser
+
+from enclosure_policy import EnclosurePolicy
+from exception import PodcastCatcherError
+from feed import Entry, Feed
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+ITUNES = '{http://www.itunes.com/dtds/podcast-1.0.dtd}'
+DC = '{http://purl.org/dc/elements/1.1/}'
+SY = '{http://purl.org/rss/1.0/modules/syndication/}'
+
+
+class StreamFeed:
+  """
+  Feed with the same accessors as Feed, but entries
+  are parsed lazily while iterating entries().
+
+  Instead of building the whole document (like
+  feedparser), the XML is parsed incrementally and
+  each item is dropped once its Entry was created.
+  If stop_before is set, parsing stops as soon as
+  the feed is known to be sorted from newest to
+  oldest and two consecutive items are older than
+  stop_before. Items for which is_new returns True
+  lower stop_before to their date, so parsing never
+  stops above them (e.g. an older episode whose
+  download failed). Entries are not filtered,
+  that is left to the caller.
+
+  Raises PodcastCatcherError for feeds it can't
+  handle, Feed should be used as fallback then.
+  """
+
+  CHUNK_SIZE = 64 * 1024
+
+  RSS_ROOT = 'rss'
+  RSS_CHANNEL = 'channel'
+  RSS_ITEM = 'item'
+  ATOM_ROOT = f'{ATOM}feed'
+  ATOM_ENTRY = f'{ATOM}entry'
+
+  def __init__(
+    self,
+    feed_text: str,
+    stop_before: datetime | None = None,
+    enclosure_policy: EnclosurePolicy | None = None,
+    is_new: Callable[[Entry], bool] | None = None,
+  ):
+    """
+    CTOR: Parse feed header from string,
+    entries are parsed on demand. Of several
+    enclosures of an entry, the one preferred
+    by enclosure_policy is used (default:
+    the first one).
+    """
+    self.__stop_before = stop_before
+    self.__is_new = is_new
+    self.__enclosure_policy = enclosure_policy
+    self.__stopped_early = False
+    self.__title = ''
+    self.__subtitle = ''
+    self.__description = ''
+    self.__link = None
+    self.__updated = None
+    # Update hints: ttl, period and frequency
+    self.__hints: dict[str, str] = {}
+    self.__events = self.__parse(feed_text)
+    # Open elements, root first
+    self.__stack: list[Element] = []
+    self.__read_header()
+    if self.__updated is None:
+      self.__updated = datetime.now(tz=UTC)
+    self.__update_interval = Feed.to_update_interval(
+      ttl=self.__hints.get('ttl'),
+      update_period=self.__hints.get(f'{SY}updatePeriod'),
+      update_frequency=self.__hints.get(f'{SY}updateFrequency'),
+    )
+
+  def __parse(self, feed_text: str) -> Iterator[tuple[str, Element]]:
+    """
+    Feed the text chunk by chunk into the
+    parser and yield start/end events.
+    """
+    parser = XMLPullParser(events=('start', 'end'))
+    for offset in range(0, len(feed_text), self.CHUNK_SIZE):
+      parser.feed(feed_text[offset : offset + self.CHUNK_SIZE])
+      yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+  def __read_header(self) -> None:
+    """
+    Read feed metadata until the first item starts.
+    """
+    for event, element in self.__events:
+      if event == 'start':
+        self.__stack.append(element)
+        if len(self.__stack) == 1 and element.tag not in (
+          self.RSS_ROOT,
+          self.ATOM_ROOT,
+        ):
+          raise PodcastCatcherError(f"Unsupported feed format '{element.tag}'")
+        if element.tag in (self.RSS_ITEM, self.ATOM_ENTRY):
+          return
+        continue
+      self.__stack.pop()
+      parent = self.__stack[-1].tag if len(self.__stack) > 0 else None
+      if parent in (self.RSS_CHANNEL, self.ATOM_ROOT):
+        self.__read_metadata(element)
+
+  def __read_metadata(self, element: Element) -> None:
+    """
+    Take over a child element of
+    the channel (RSS) or feed (Atom).
+    """
+    text = (element.text or '').strip()
+    if element.tag in ('title', f'{ATOM}title'):
+      self.__title = text
+    elif element.tag in ('description', f'{ATOM}subtitle'):
+      self.__description = text
+      if self.__subtitle == '':
+        self.__subtitle = text
+    elif element.tag == f'{ITUNES}subtitle':
+      self.__subtitle = text
+    elif element.tag == 'link':
+      self.__link = text
+    elif (
+      element.tag == f'{ATOM}link' and element.get('rel', 'alternate') == 'alternate'
+    ):
+      self.__link = element.get('href')
+    elif element.tag in ('lastBuildDate', 'pubDate', f'{ATOM}updated'):
+      # lastBuildDate takes precedence over pubDate
+      if self.__updated is None or element.tag != 'pubDate':
+        self.__updated = self.__parse_date(text)
+    elif element.tag in ('ttl', f'{SY}updatePeriod', f'{SY}updateFrequency'):
+      self.__hints[element.tag] = text
+
+  @staticmethod
+  def __parse_date(text: str) -> datetime:
+    """
+    Parse RFC 822 (RSS) or ISO 8601 (Atom) dates,
+    converted the same way as by Feed.
+    """
+    try:
+      parsed = datetime.fromisoformat(text)
+    except ValueError:
+      try:
+        parsed = parsedate_to_datetime(text)
+      except (TypeError, ValueError) as e:
+        raise PodcastCatcherError(f"Unsupported date '{text}'") from e
+    if parsed.tzinfo is None:
+      parsed = parsed.replace(tzinfo=UTC)
+    return Feed.to_datetime(parsed.utctimetuple())
+
+  def __create_entry(self, element: Element) -> Entry | None:
+    """
+    Create Entry from an item (RSS) or entry (Atom),
+    None if the item has no enclosure.
+    """
+    if element.tag == self.RSS_ITEM:
+      title = element.findtext('title', '').strip()
+      # (url, type, length) of each enclosure
+      enclosures = [
+        (enclosure.get('url'), enclosure.get('type'), enclosure.get('length'))
+        for enclosure in element.iterfind('enclosure')
+        if enclosure.get('url') is not None
+      ]
+      link = element.findtext('link')
+      author = (
+        element.findtext('author')
+        or element.findtext(f'{ITUNES}author')
+        or element.findtext(f'{DC}creator')
+      )
+      published = element.findtext('pubDate') or element.findtext(f'{DC}date')
+      summary = element.findtext('description') or element.findtext(f'{ITUNES}summary')
+      tags = [(tag.text or '').strip() for tag in element.iterfind('category')]
+    else:
+      title = element.findtext(f'{ATOM}title', '').strip()
+      enclosures = []
+      link = None
+      for atom_link in element.iterfind(f'{ATOM}link'):
+        rel = atom_link.get('rel', 'alternate')
+        if rel == 'enclosure' and atom_link.get('href') is not None:
+          enclosures.append(
+            (atom_link.get('href'), atom_link.get('type'), atom_link.get('length'))
+          )
+        elif rel == 'alternate' and link is None:
+          link = atom_link.get('href')
+      author = element.findtext(f'{ATOM}author/{ATOM}name')
+      published = element.findtext(f'{ATOM}published') or element.findtext(
+        f'{ATOM}updated'
+      )
+      summary = element.findtext(f'{ATOM}summary') or element.findtext(f'{ATOM}content')
+      tags = [tag.get('term', '') for tag in element.iterfind(f'{ATOM}category')]
+
+    if len(enclosures) == 0:
+      print(
+        f"Feed '{self.title()}' episode '{title}' has no enclosures"
+        ' -> skipping episode.',
+        file=stderr,
+      )
+      return None
+    if published is None:
+      raise PodcastCatcherError(f"Feed '{self.title()}' episode '{title}' has no date")
+    index = 0
+    if len(enclosures) > 1 and self.__enclosure_policy is not None:
+      index = self.__enclosure_policy.select(
+        [
+          (mime_type, EnclosurePolicy.parse_length(length))
+          for _, mime_type, length in enclosures
+        ],
+        EnclosurePolicy.parse_duration(element.findtext(f'{ITUNES}duration')),
+      )
+    return Entry(
+      author=author.strip() if author is not None else title,
+      enclosure=enclosures[index][0].strip(),
+      alternatives=[
+        url.strip()
+        for position, (url, _, _) in enumerate(enclosures)
+        if position != index
+      ],
+      link=link.strip() if link is not None else None,
+      published=self.__parse_date(published.strip()),
+      summary=summary or '',
+      tags=tags,
+      title=title,
+    )
+
+  def __parse_entries(self) -> Iterator[Entry]:
+    """
+    Yield entries in document order. Each item
+    is removed from the tree once it is parsed.
+    """
+    for event, element in self.__events:
+      if event == 'start':
+        self.__stack.append(element)
+        continue
+      self.__stack.pop()
+      if element.tag not in (self.RSS_ITEM, self.ATOM_ENTRY):
+        continue
+      entry = self.__create_entry(element)
+      element.clear()
+      if len(self.__stack) > 0:
+        self.__stack[-1].remove(element)
+      if entry is not None:
+        yield entry
+
+  def entries(self, newer_than: datetime | None = None) -> Iterator[Entry]:
+    """
+    Lazily yield the entries of this feed.
+    Can only be iterated once.
+    Optional: filter result to show only
+    feeds newer than given date.
+    """
+    stop_before = self.__stop_before
+    previous: datetime | None = None
+    previous_is_old = False
+    descending = True
+    for entry in self.__parse_entries():
+      published = entry.published()
+      if previous is not None and published > previous:
+        descending = False
+      previous = published
+      if (
+        stop_before is not None
+        and published < stop_before
+        and self.__is_new is not None
+        and self.__is_new(entry)
+      ):
+        # Still needed, keep parsing below it
+        stop_before = published
+      is_old = stop_before is not None and published < stop_before
+      if descending and is_old and previous_is_old:
+        # Sorted newest first, all remaining
+        # items are older, too.
+        self.__stopped_early = True
+        return
+      previous_is_old = is_old
+      if newer_than is not None and published < newer_than:
+        continue
+      yield entry
+
+  def stopped_early(self) -> bool:
+    """
+    Return if parsing stopped before
+    the end of the document.
+    """
+    return self.__stopped_early
+
+  def title(self) -> str:
+    """
+    Return title of feed.
+    """
+    return self.__title
+
+  def subtitle(self) -> str:
+    """
+    Return subtitle of feed.
+    """
+    return self.__subtitle
+
+  def description(self) -> str:
+    """
+    Return description of feed.
+    """
+    return self.__description
+
+  def link(self) -> str | None:
+    """
+    Return link to the feed source.
+    """
+    return self.__link
+
+  def updated(self) -> datetime:
+    """
+    Last time the feed was updated.
+    """
+    return self.__updated
+
+  def update_interval(self) -> float | None:
+    """
+    Seconds between updates the feed
+    suggests, None if it has no hints.
+    """
+    return self.__update_interval
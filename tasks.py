@@ -18,6 +18,12 @@ MAIN_CLI = 'podcast_catcher/main_cli.py'
 README_RST = 'README.rst'
 README_HTML = 'README.html'
 
+BENCHMARK_DOWNLOAD = 'benchmark/download.py'
+BENCHMARK_MEMORY = 'benchmark/memory.py'
+BENCHMARK_REPLACER = 'benchmark/replacer.py'
+BENCHMARK_STARTUP = 'benchmark/startup.py'
+BENCHMARK_SUITE = 'benchmark/suite.py'
+
 
 def ctx_run(ctx: context, cmd: list[str]) -> None:
   """
@@ -147,3 +153,89 @@ def version(ctx: context) -> None:
     'version',
   ]
   ctx_run(ctx, cmd)
+
+
+@task
+def benchmark_download(ctx: context, size_mib: int = 256) -> None:
+  """
+  Benchmark memory and throughput of enclosure downloads.
+  """
+  cmd: list[str] = [
+    PYTHON_BIN,
+    BENCHMARK_DOWNLOAD,
+    '--size-mib',
+    str(size_mib),
+  ]
+  ctx_run(ctx, cmd)
+
+
+@task
+def benchmark_memory(ctx: context, items: int = 5000) -> None:
+  """
+  Benchmark memory kept by a parsed feed.
+  """
+  cmd: list[str] = [
+    PYTHON_BIN,
+    BENCHMARK_MEMORY,
+    '--items',
+    str(items),
+  ]
+  ctx_run(ctx, cmd)
+
+
+@task
+def benchmark_replacer(ctx: context, entries: int = 5000) -> None:
+  """
+  Benchmark filename/tag template expansion.
+  """
+  cmd: list[str] = [
+    PYTHON_BIN,
+    BENCHMARK_REPLACER,
+    '--entries',
+    str(entries),
+  ]
+  ctx_run(ctx, cmd)
+
+
+@task
+def benchmark_startup(ctx: context, runs: int = 5) -> None:
+  """
+  Benchmark cold-start time of the subcommands.
+  """
+  cmd: list[str] = [
+    PYTHON_BIN,
+    BENCHMARK_STARTUP,
+    '--runs',
+    str(runs),
+  ]
+  ctx_run(ctx, cmd)
+
+
+@task
+def benchmark_suite(
+  ctx: context,
+  items: int = 1000,
+  download_items: int = 20,
+  feeds: int = 2,
+  enclosure_format: str = 'mp3',
+  repeat: int = 5,
+) -> None:
+  """
+  Benchmark parse, replace, tag, list_episodes
+  and download against a local fake server.
+  """
+  cmd: list[str] = [
+    PYTHON_BIN,
+    BENCHMARK_SUITE,
+    '--items',
+    str(items),
+    '--download-items',
+    str(download_items),
+    '--feeds',
+    str(feeds),
+    '--enclosure-format',
+    enclosure_format,
+    '--repeat',
+    str(repeat),
+  ]
+  ctx_run(ctx, cmd)
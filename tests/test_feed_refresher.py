@@ -0,0 +1,123 @@
+"""
+Tests for FeedRefresher.
+"""
+
+from json import dumps
+from pathlib import Path
+
+from config_file import ConfigFile
+from config_json_factory import ConfigJsonFactory
+from feed_refresher import FeedRefresher
+
+NOT_A_FEED = '<!DOCTYPE html><html><body>Service unavailable</body></html>'
+
+
+class StaticLoader:
+  """
+  Loader serving fixed feed bodies by URL.
+  """
+
+  def __init__(self, bodies: dict[str, str]):
+    """
+    CTOR for StaticLoader.
+    """
+    self.__bodies = bodies
+
+  def get_feed(self, url: str, verify_https: bool = True) -> str:
+    """
+    Return the body served for url.
+    """
+    return self.__bodies[url]
+
+
+def rss(items: list[tuple[str, str]]) -> str:
+  """
+  Build an RSS feed of (title, pubDate) items,
+  in the given order.
+  """
+  body = ''.join(
+    f'<item><title>{title}</title><pubDate>{date}</pubDate>'
+    f'<enclosure url="http://localhost/{title}.mp3" type="audio/mpeg"/></item>'
+    for title, date in items
+  )
+  return (
+    '<?xml version="1.0"?><rss version="2.0"><channel>'
+    f'<title>Feed</title><description>Test feed</description>{body}'
+    '</channel></rss>'
+  )
+
+
+def create_config(tmp_path: Path, feeds: list[str], **settings: object) -> ConfigFile:
+  """
+  Write and load a config with one
+  feed per name in feeds.
+  """
+  config_file = tmp_path.joinpath('config.json')
+  config_file.write_text(
+    dumps(
+      {
+        'settings': {
+          'download_dir': str(tmp_path.joinpath('download')),
+          'data_dir': str(tmp_path.joinpath('data')),
+          'filename': '%episode_title%',
+          'conditional_get': False,
+          **settings,
+        },
+        'feeds': [
+          {'name': name, 'url': f'http://localhost/{name}.xml'} for name in feeds
+        ],
+      }
+    )
+  )
+  return ConfigJsonFactory(str(config_file)).create_config()
+
+
+def test_incremental_parse_retries_failed_older_episode(tmp_path: Path) -> None:
+  """
+  An older episode whose download failed is offered
+  again, although newer episodes were downloaded.
+  """
+  config = create_config(tmp_path, ['feed'], incremental_parse=True)
+  feed_text = rss(
+    [(f'E{day}', f'{day:02d} Jan 2024 00:00:00 +0000') for day in range(9, 0, -1)]
+  )
+  refresher = FeedRefresher(config, loader=None)
+  # First run: E4 fails, all others are downloaded
+  result = refresher.process(config.feeds()[0], feed_text, 0.0)
+  assert len(result.entries()) == 9
+  for entry in result.entries():
+    if entry.title() != 'E4':
+      result.episode_tracker().complete(entry)
+      result.episode_tracker().save()
+  result.episode_tracker().close()
+
+  result = refresher.process(config.feeds()[0], feed_text, 0.0)
+  assert result.error() is None
+  assert [entry.title() for entry in result.entries()] == ['E4']
+  assert result.feed().stopped_early()
+
+
+def test_broken_feed_fails_alone(tmp_path: Path) -> None:
+  """
+  A feed answering with a non-feed body fails,
+  feeds next to it are refreshed as usual.
+  """
+  config = create_config(tmp_path, ['broken', 'bare', 'good'], feed_workers=2)
+  good = rss([('E1', 'Mon, 01 Jan 2024 00:00:00 +0000')])
+  # RSS without description (or subtitle)
+  bare = good.replace('<description>Test feed</description>', '')
+  refresher = FeedRefresher(
+    config,
+    loader=StaticLoader(
+      {
+        'http://localhost/broken.xml': NOT_A_FEED,
+        'http://localhost/bare.xml': bare,
+        'http://localhost/good.xml': good,
+      }
+    ),
+  )
+  results = {result.config_feed().name(): result for result in refresher.refresh_all()}
+  assert 'Not a feed' in str(results['broken'].error())
+  for name in ('bare', 'good'):
+    assert results[name].error() is None
+    assert [entry.title() for entry in results[name].entries()] == ['E1']